@@ -0,0 +1,60 @@
+# admin.py
+import os
+from functools import wraps
+from flask import Blueprint, current_app, render_template, request, session, jsonify, redirect, url_for, flash, abort, make_response
+
+import stats
+from auth import users_store
+from main import notes_store, no_store
+
+admin = Blueprint('admin', __name__, template_folder="templates")
+
+DEFAULT_ADMINS = os.environ.get("NOTEPAD_ADMINS", "")
+MAX_DAYS = 365
+
+def admin_users():
+    admins = current_app.config.get("ADMIN_USERS", DEFAULT_ADMINS)
+    if isinstance(admins, str):
+        admins = [a.strip() for a in admins.split(',')]
+    return {a for a in admins if a}
+
+def admin_required(f):
+    @wraps(f)
+    def wrapped(*args, **kwargs):
+        # Not found rather than forbidden: the admin pages are not advertised to anyone else
+        if session.get('username') not in admin_users():
+            abort(404)
+        return f(*args, **kwargs)
+    return wrapped
+
+@admin.app_context_processor
+def inject_admin():
+    return {"is_admin": session.get('username') in admin_users()}
+
+def ensure_seeded():
+    if not stats.is_seeded():
+        stats.seed(users_store.load(), notes_store)
+
+@admin.route('/admin/stats')
+@admin_required
+def stats_page():
+    ensure_seeded()
+    days = min(max(request.args.get('days', stats.DEFAULT_DAYS, type=int), 1), MAX_DAYS)
+    return no_store(make_response(render_template('admin_stats.html', stats=stats.snapshot(days), days=days)))
+
+@admin.route('/admin/api/stats')
+@admin_required
+def stats_json():
+    ensure_seeded()
+    days = min(max(request.args.get('days', stats.DEFAULT_DAYS, type=int), 1), MAX_DAYS)
+    return no_store(jsonify({"success": True, "stats": stats.snapshot(days)}))
+
+@admin.route('/admin/stats/recount', methods=['POST'])
+@admin_required
+def recount():
+    # The one full scan, on request: repairs counters after the data files were changed by hand
+    stats.seed(users_store.load(), notes_store)
+    if request.is_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return no_store(jsonify({"success": True, "stats": stats.snapshot()}))
+    flash("Statistics recounted.", "success")
+    return redirect(url_for('admin.stats_page'))
@@ -3,30 +3,74 @@ import os
 from flask import Flask, redirect, url_for, session
 
 
-from auth import auth
-from main import main
+from auth import auth, USERS_FILE
+from main import main, NOTES_FILE, notes_store
+from assets import assets
+from compression import compression
+from health import health, warmup
+from profiling import profiling, init_app as init_profiling
+from admin import admin
+import attachments
+import drafts
+import quotas
+import jinja_cache
+import otp_delivery
+import state
 
 
-app = Flask(__name__, static_folder="static", template_folder="templates")
-app.secret_key = os.environ.get("FLASK_SECRET", "change_this_in_production_please")
-
-
-app.register_blueprint(main)
-app.register_blueprint(auth)
-
-
-@app.route('/')
 def index():
-  
+
    if session.get('username'):
        return redirect(url_for('main.home'))
    return redirect(url_for('auth.login'))
 
 
-if __name__ == '__main__':
-  
-   for fname in ['users.json', 'notes.json']:
+def ensure_data_files():
+   for fname in [USERS_FILE, NOTES_FILE]:
        if not os.path.exists(fname):
            with open(fname, 'w', encoding='utf-8') as f:
                f.write('[]')
-   app.run(debug=True)
+
+
+def create_app(config=None):
+   app = Flask(__name__, static_folder="static", template_folder="templates")
+   app.secret_key = os.environ.get("FLASK_SECRET", "change_this_in_production_please")
+   app.config["WARMUP"] = os.environ.get("NOTEPAD_WARMUP", "1") != "0"
+   # OTP delivery, the draft flusher and usage reconciliation run in background threads
+   app.config["START_WORKERS"] = True
+   if config:
+       app.config.from_mapping(config)
+
+   app.register_blueprint(main)
+   app.register_blueprint(auth)
+   app.register_blueprint(assets)
+   app.register_blueprint(compression)
+   app.register_blueprint(health)
+   app.register_blueprint(profiling)
+   app.register_blueprint(admin)
+   app.add_url_rule('/', 'index', index)
+
+   state.init_app(app)
+   jinja_cache.init_app(app)
+   otp_delivery.init_app(app)
+   attachments.init_app(app)
+   drafts.init_app(app)
+   quotas.init_app(app, notes_store)
+   init_profiling(app)
+   ensure_data_files()
+   if app.config["WARMUP"]:
+       warmup(app)
+   else:
+       app.extensions['warmup'] = {"ready": True, "skipped": True}
+   return app
+
+
+if __name__ == '__main__':
+   # The reloader runs this file twice: a watching parent that never serves, and the serving
+   # child (WERKZEUG_RUN_MAIN set). Only the child starts workers and warms up; the parent
+   # would only poll the OTP queue for nothing. Production servers load wsgi:app instead.
+   serving = os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+   config = {"START_WORKERS": serving}
+   if not serving:
+       config["WARMUP"] = False
+   create_app(config).run(debug=True)
@@ -0,0 +1,299 @@
+# assets.py
+import os
+import re
+import sys
+import json
+import hashlib
+import mimetypes
+from flask import Blueprint, url_for, send_from_directory, abort, request
+
+from compression import available_encodings, choose_encoding, compress, add_vary
+
+assets = Blueprint('assets', __name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_FILE = os.path.join(DIST_DIR, "manifest.json")
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# Build-time levels: spend the CPU once so serving never has to
+PRECOMPRESS_LEVELS = {'gzip': 9, 'br': 11}
+SIBLING_SUFFIX = {'gzip': '.gz', 'br': '.br'}
+
+# Logical bundle name -> source files under static/, concatenated in order
+BUNDLES = {
+    "style.css": ["style.css"],
+    "script.js": ["script.js"],
+    "pages/register.css": ["pages/register.css"],
+    "pages/register.js": ["pages/register.js"],
+    "pages/verify_profile_update.css": ["pages/verify_profile_update.css"],
+    "pages/verify_profile_update.js": ["pages/verify_profile_update.js"],
+    "pages/otp_reset.css": ["pages/otp_reset.css"],
+    "pages/otp_reset.js": ["pages/otp_reset.js"],
+    "pages/reset_password.css": ["pages/reset_password.css"],
+}
+
+# A / after one of these starts a regex literal; after any other word it divides
+JS_REGEX_AFTER = frozenset(('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+                            'void', 'throw', 'instanceof', 'yield', 'await'))
+JS_WORD_END = re.compile(r'[\w$]+$')
+# Strings are matched before comments starting inside them can be
+CSS_TOKEN_RE = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|/\*.*?\*/', re.S)
+
+_manifest = None
+
+def _minify_css_code(text):
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}')
+
+def minify_css(text):
+    # Comments and whitespace only go outside strings: quoted url()s and content values stay as written
+    parts, code, last = [], [], 0
+    for m in CSS_TOKEN_RE.finditer(text):
+        code.append(text[last:m.start()])
+        if m.group().startswith('/*'):
+            code.append(' ')
+        else:
+            parts += [_minify_css_code(''.join(code)), m.group()]
+            code = []
+        last = m.end()
+    code.append(text[last:])
+    parts.append(_minify_css_code(''.join(code)))
+    return ''.join(parts).strip()
+
+def _scan_quoted(text, i):
+    # -> index just past the string that opens at i (an unterminated one ends at the line)
+    quote, j = text[i], i + 1
+    while j < len(text):
+        if text[j] == '\\':
+            j += 2
+            continue
+        if text[j] in (quote, '\n'):
+            return j + 1
+        j += 1
+    return j
+
+def _scan_template(text, j):
+    # From inside a template literal: -> (index past its closing ` or past a ${, True for ${)
+    while j < len(text):
+        if text[j] == '\\':
+            j += 2
+            continue
+        if text[j] == '`':
+            return j + 1, False
+        if text.startswith('${', j):
+            return j + 2, True
+        j += 1
+    return j, False
+
+def _scan_regex(text, i):
+    # -> index past the regex literal (and its flags) that opens at i
+    j, in_class = i + 1, False
+    while j < len(text) and text[j] != '\n':
+        c = text[j]
+        if c == '\\':
+            j += 2
+            continue
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            j += 1
+            while j < len(text) and (text[j].isalnum() or text[j] in '_$'):
+                j += 1
+            return j
+        j += 1
+    return j
+
+def _regex_allowed(prev):
+    # Whether a / after the token prev opens a regex literal rather than dividing
+    if not prev:
+        return True
+    if prev[-1].isalnum() or prev[-1] in '_$':
+        return prev in JS_REGEX_AFTER
+    return prev not in ')]'
+
+def js_tokens(text):
+    # -> [(kind, text)] where kind is 'code', 'comment' or 'literal' (strings, template
+    # text and regexes). Code inside ${ } is code again; braces counts the { } open in
+    # each ${ } we are inside, so the } that closes one is told apart from a block's.
+    tokens, braces = [], []
+    prev, start, i, n = '', 0, 0, len(text)
+
+    def take(kind, begin, end, last):
+        nonlocal prev
+        code = text[start:begin]
+        if code:
+            tokens.append(('code', code))
+            stripped = code.rstrip()
+            if stripped:
+                m = JS_WORD_END.search(stripped)
+                prev = m.group() if m else stripped[-1]
+        tokens.append((kind, text[begin:end]))
+        if last is not None:
+            prev = last
+        return end
+
+    while i < n:
+        c = text[i]
+        if c in '\'"':
+            i = start = take('literal', i, _scan_quoted(text, i), ')')
+        elif c == '`' or (c == '}' and braces and braces[-1] == 0):
+            if c == '}':
+                braces.pop()
+            end, opened = _scan_template(text, i + 1)
+            if opened:
+                braces.append(0)
+            i = start = take('literal', i, end, '(' if opened else ')')
+        elif c == '/' and text.startswith('//', i):
+            end = text.find('\n', i)
+            i = start = take('comment', i, n if end < 0 else end, None)
+        elif c == '/' and text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = start = take('comment', i, n if end < 0 else end + 2, None)
+        elif c == '/':
+            code = text[start:i].rstrip()
+            last = prev
+            if code:
+                m = JS_WORD_END.search(code)
+                last = m.group() if m else code[-1]
+            if _regex_allowed(last):
+                i = start = take('literal', i, _scan_regex(text, i), ')')
+            else:
+                i += 1
+        else:
+            if c == '{' and braces:
+                braces[-1] += 1
+            elif c == '}' and braces:
+                braces[-1] -= 1
+            i += 1
+    if start < n:
+        tokens.append(('code', text[start:]))
+    return tokens
+
+def minify_js(text):
+    # Drops comments, indentation and blank lines; strings, template literals and regexes
+    # are copied as they are. Line-preserving on purpose: joining lines is unsafe without
+    # a real parser (ASI)
+    parts, code = [], []
+    for kind, chunk in js_tokens(text):
+        if kind == 'literal':
+            parts += [re.sub(r'\s*\n\s*', '\n', ''.join(code)), chunk]
+            code = []
+        elif kind == 'comment':
+            # A comment that spans lines may be what ends a statement
+            code.append('\n' if '\n' in chunk else ' ')
+        else:
+            code.append(chunk)
+    parts.append(re.sub(r'\s*\n\s*', '\n', ''.join(code)))
+    return ''.join(parts).strip() + '\n'
+
+def minify(name, text):
+    if name.endswith('.css'):
+        return minify_css(text)
+    if name.endswith('.js'):
+        return minify_js(text)
+    return text
+
+def hashed_name(name, data):
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+def write_file(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        parts = []
+        for src in sources:
+            with open(os.path.join(static_dir, src), 'r', encoding='utf-8') as f:
+                parts.append(f.read())
+        data = minify(name, '\n'.join(parts)).encode('utf-8')
+        out_name = hashed_name(name, data)
+        out_path = os.path.join(dist_dir, out_name)
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        if not os.path.exists(out_path):
+            write_file(out_path, data)
+        for encoding in available_encodings():
+            sibling = out_path + SIBLING_SUFFIX[encoding]
+            if not os.path.exists(sibling):
+                write_file(sibling, compress(data, encoding, PRECOMPRESS_LEVELS[encoding]))
+        manifest[name] = out_name
+
+    # Drop outputs from previous builds so dist/ only holds what the manifest points at
+    keep = set(manifest.values())
+    keep |= {name + suffix for name in manifest.values() for suffix in SIBLING_SUFFIX.values()}
+    for root, _, files in os.walk(dist_dir):
+        for fname in files:
+            rel = os.path.relpath(os.path.join(root, fname), dist_dir).replace(os.sep, '/')
+            if rel != 'manifest.json' and rel not in keep:
+                os.remove(os.path.join(root, fname))
+
+    tmp = os.path.join(dist_dir, "manifest.json.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(dist_dir, "manifest.json"))
+    reload_manifest()
+    return manifest
+
+def load_manifest():
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                _manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _manifest = {}
+    return _manifest
+
+def reload_manifest():
+    global _manifest
+    _manifest = None
+    return load_manifest()
+
+@assets.app_template_global()
+def asset_url(name):
+    hashed = load_manifest().get(name)
+    if hashed:
+        return url_for('assets.asset', filename=hashed)
+    # No build yet (e.g. local dev): fall back to the unfingerprinted source
+    return url_for('static', filename=name)
+
+@assets.route('/assets/<path:filename>')
+def asset(filename):
+    if filename not in set(load_manifest().values()):
+        abort(404)
+    encodings = [enc for enc in available_encodings()
+                 if os.path.exists(os.path.join(DIST_DIR, filename + SIBLING_SUFFIX[enc]))]
+    encoding = choose_encoding(request.accept_encodings, encodings) if encodings else None
+    if encoding:
+        response = send_from_directory(DIST_DIR, filename + SIBLING_SUFFIX[encoding],
+                                       mimetype=mimetypes.guess_type(filename)[0])
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(DIST_DIR, filename)
+    add_vary(response)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    return response
+
+@assets.route('/sw.js')
+def service_worker():
+    # Served from the root so its scope covers every page; must revalidate so updates roll out
+    response = send_from_directory(STATIC_DIR, 'sw.js', mimetype='text/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Service-Worker-Allowed'] = '/'
+    return response
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print("usage: python assets.py build")
+        sys.exit(2)
+    for name, out_name in build().items():
+        print(f"{name} -> dist/{out_name}")
@@ -0,0 +1,200 @@
+# attachments.py
+import os
+import re
+import sys
+import time
+import uuid
+import hashlib
+import logging
+import mimetypes
+
+import serializers
+from store import FileLock, file_signature
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DIR = os.environ.get("NOTEPAD_ATTACHMENT_DIR", os.path.join(os.path.dirname(__file__), "attachments"))
+CHUNK = 64 * 1024
+MAX_BYTES = 50 * 1024 * 1024
+MAX_PER_NOTE = 20
+MAX_NAME = 120
+# Uploads that died half way leave tmp files; gc removes the ones older than this
+STALE_TMP_SECONDS = 3600
+SHA_RE = re.compile(r'^[0-9a-f]{64}$')
+
+class AttachmentError(ValueError):
+    pass
+
+class TooLarge(AttachmentError):
+    pass
+
+def clean_name(name):
+    name = os.path.basename((name or "").replace("\\", "/")).strip()
+    name = re.sub(r'[\x00-\x1f]', '', name)[:MAX_NAME]
+    return name or "attachment"
+
+class AttachmentStore:
+    # Files live once under objects/<sha256[:2]>/<sha256>, however many notes attach them.
+    # index.json keeps a reference count per object so a removal knows when the last
+    # reference is gone; gc() recomputes the counts from the notes when they drift.
+    # Every worker process updates the same index.json: self.lock holds an flock on
+    # index.lock and the index is re-read whenever the file changed under it.
+    def __init__(self, root=DEFAULT_DIR, max_bytes=MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = FileLock(os.path.join(root, "index.lock"))
+        self._index = None
+        self._signature = None
+
+    def path(self, sha):
+        if not SHA_RE.match(sha):
+            raise AttachmentError(f"bad attachment id {sha!r}")
+        return os.path.join(self.root, "objects", sha[:2], sha)
+
+    def _index_path(self):
+        return os.path.join(self.root, "index.json")
+
+    def _load_index(self):
+        # Called under self.lock
+        path = self._index_path()
+        signature = file_signature(path)
+        if self._index is None or signature != self._signature:
+            self._index = serializers.load(path) if signature is not None else {}
+            self._signature = signature
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        try:
+            serializers.save(self._index_path(), self._index)
+        except Exception:
+            self._index = None
+            raise
+        self._signature = file_signature(self._index_path())
+
+    def put_stream(self, stream):
+        # Hashes and writes chunk by chunk: memory use does not depend on the file size.
+        # -> (sha256, size). A file that is already stored is not kept twice. The caller
+        # owns one reference to the object and must decref it if it does not keep it.
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp = os.path.join(tmp_dir, uuid.uuid4().hex)
+        digest, size = hashlib.sha256(), 0
+        try:
+            with open(tmp, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise TooLarge(f"attachments are limited to {self.max_bytes // (1024 * 1024)} MB")
+                    digest.update(chunk)
+                    out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+            sha = digest.hexdigest()
+            path = self.path(sha)
+            # Under the lock so a decref of the same content cannot delete it in between
+            with self.lock:
+                if os.path.exists(path):
+                    os.remove(tmp)
+                else:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(tmp, path)
+                index = self._load_index()
+                index.setdefault(sha, {"size": size, "refs": 0})["refs"] += 1
+                self._save_index()
+            return sha, size
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def exists(self, sha):
+        return os.path.exists(self.path(sha))
+
+    def decref(self, sha):
+        # The object is deleted with its last reference
+        with self.lock:
+            index = self._load_index()
+            entry = index.get(sha)
+            if entry is None:
+                return
+            entry["refs"] -= 1
+            if entry["refs"] <= 0:
+                del index[sha]
+                try:
+                    os.remove(self.path(sha))
+                except FileNotFoundError:
+                    pass
+            self._save_index()
+
+    def gc(self, notes):
+        # Rebuilds the counts from the notes that are actually stored and removes every
+        # object nothing points at, plus stale partial uploads. -> (objects removed, bytes freed)
+        with self.lock:
+            refs = {}
+            for n in notes:
+                for a in n.attachments:
+                    refs[a["sha256"]] = refs.get(a["sha256"], 0) + 1
+            index = {}
+            removed, freed = 0, 0
+            objects = os.path.join(self.root, "objects")
+            for prefix in (os.listdir(objects) if os.path.isdir(objects) else []):
+                for sha in os.listdir(os.path.join(objects, prefix)):
+                    path = os.path.join(objects, prefix, sha)
+                    size = os.path.getsize(path)
+                    if sha in refs:
+                        index[sha] = {"size": size, "refs": refs[sha]}
+                    else:
+                        os.remove(path)
+                        removed += 1
+                        freed += size
+            tmp_dir = os.path.join(self.root, "tmp")
+            for name in (os.listdir(tmp_dir) if os.path.isdir(tmp_dir) else []):
+                path = os.path.join(tmp_dir, name)
+                if time.time() - os.path.getmtime(path) > STALE_TMP_SECONDS:
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+            missing = set(refs) - set(index)
+            if missing:
+                log.warning("%d attachments are referenced by notes but missing on disk", len(missing))
+            self._index = index
+            self._save_index()
+            return removed, freed
+
+    def stats(self):
+        with self.lock:
+            index = self._load_index()
+            return {"objects": len(index), "bytes": sum(e["size"] for e in index.values()),
+                    "references": sum(e["refs"] for e in index.values())}
+
+def attachment_record(sha, size, name, mimetype=None):
+    name = clean_name(name)
+    mimetype = mimetype or mimetypes.guess_type(name)[0] or "application/octet-stream"
+    return {"sha256": sha, "name": name, "size": size, "type": mimetype}
+
+def init_app(app):
+    store = AttachmentStore(app.config.get("ATTACHMENT_DIR", DEFAULT_DIR),
+                            app.config.get("ATTACHMENT_MAX_BYTES", MAX_BYTES))
+    app.extensions['attachments'] = store
+    return store
+
+def main(argv):
+    if len(argv) in (1, 2) and argv[0] in ('gc', 'stats'):
+        from store import NoteStore, NOTES_FILE
+        store = AttachmentStore()
+        if argv[0] == 'stats':
+            print(store.stats())
+            return 0
+        notes_file = argv[1] if len(argv) == 2 else NOTES_FILE
+        removed, freed = store.gc(NoteStore(notes_file).load())
+        print(f"removed {removed} unreferenced objects, freed {freed} bytes")
+        return 0
+    print("usage: python attachments.py stats\n"
+          "       python attachments.py gc [NOTES_FILE]")
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
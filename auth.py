@@ -1,6 +1,5 @@
 # auth.py
 import os
-import json
 import re
 import time
 import random
@@ -8,10 +7,14 @@ from datetime import datetime, timedelta
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, jsonify, make_response
 from werkzeug.security import generate_password_hash, check_password_hash
 
+import otp_delivery
+import state
+import stats
+from store import UserStore, USERS_FILE
+
 auth = Blueprint('auth', __name__, template_folder="templates")
 
-USERS_FILE = os.path.join(os.path.dirname(__file__), "users.json")
-OTP_STORAGE_FILE = "otp_sessions.json"
+users_store = UserStore(USERS_FILE)
 
 NAME_WORD = r'[A-Z][a-z]{1,29}'
 NAME_RE = re.compile(rf'^{NAME_WORD}(?:\s{NAME_WORD})*$')
@@ -21,79 +24,54 @@ CONTACT_RE = re.compile(r'^09\d{9}$')
 PASSWORD_RE = re.compile(r'^(?=.*[a-z])(?=.*[A-Z])(?=.*\d)(?=.*\W).{8,}$')
 VALID_EMAIL_DOMAINS = {"gmail.com","yahoo.com","outlook.com","hotmail.com","icloud.com"}
 
-OTP_SESSION_KEY = "profile_otp"
-OTP_SESSION_EXPIRY = "profile_otp_expiry"
+OTP_GRACE_SECONDS = 60
+# (limit, window seconds) for the shared throttling counters
+LOGIN_FAILURE_LIMIT = (10, 900)
+OTP_REQUEST_LIMIT = (5, 900)
+OTP_ATTEMPT_LIMIT = 5
+OTP_LIFETIME_SECONDS = 180
 
-def load_otp_sessions():
-    if not os.path.exists(OTP_STORAGE_FILE):
-        return {}
+def otp_ttl(otp_data):
+    # Keep the record a minute past expiry so the "expired" message can still be shown
     try:
-        with open(OTP_STORAGE_FILE, 'r') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return {}
+        remaining = (datetime.fromisoformat(otp_data["expires_at"]) - datetime.utcnow()).total_seconds()
+    except (KeyError, TypeError, ValueError):
+        remaining = 0
+    return max(1, int(remaining) + OTP_GRACE_SECONDS)
 
-def save_otp_sessions(sessions):
-    try:
-        with open(OTP_STORAGE_FILE, 'w') as f:
-            json.dump(sessions, f, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving OTP sessions: {e}")
-        return False
+def load_otp_sessions():
+    sessions = {}
+    for name in state.backend.keys(state.key("otp", "*")):
+        data = state.get_json(name)
+        if data:
+            sessions[data.get("username") or name.rsplit(":", 1)[-1]] = data
+    return sessions
 
 def get_otp_session(username):
-    sessions = load_otp_sessions()
-    return sessions.get(username)
+    return state.get_json(state.key("otp", username))
 
 def save_otp_session(username, otp_data):
-    sessions = load_otp_sessions()
-    sessions[username] = otp_data
-    return save_otp_sessions(sessions)
+    try:
+        state.set_json(state.key("otp", username), otp_data, ttl=otp_ttl(otp_data))
+        return True
+    except Exception:
+        current_app.logger.exception("Failed to save OTP session of %s", username)
+        return False
 
 def delete_otp_session(username):
-    sessions = load_otp_sessions()
-    if username in sessions:
-        del sessions[username]
-        return save_otp_sessions(sessions)
+    state.backend.delete(state.key("otp", username))
+    state.backend.delete(state.key("otp_failures", username))
     return True
 
-def cleanup_expired_otp_sessions():
-    sessions = load_otp_sessions()
-    current_time = datetime.utcnow().isoformat()
-    
-    expired_usernames = []
-    for username, session_data in sessions.items():
-        expires_at = session_data.get("expires_at")
-        if expires_at and expires_at < current_time:
-            expired_usernames.append(username)
-    
-    for username in expired_usernames:
-        del sessions[username]
-    
-    if expired_usernames:
-        save_otp_sessions(sessions)
-    
-    return len(expired_usernames)
-
-def ensure_users_file():
-   if not os.path.exists(USERS_FILE):
-       with open(USERS_FILE, "w", encoding="utf-8") as f:
-           json.dump([], f)
+def throttled(counter, subject, limit, window):
+    return state.hit(state.key(counter, subject.lower()), window) > limit
 
 def load_users():
-   ensure_users_file()
-   try:
-       with open(USERS_FILE, "r", encoding="utf-8") as f:
-           return json.load(f) or []
-   except (json.JSONDecodeError, PermissionError):
-       return []
+   # Validated records: every user has a username, password hash and all profile fields
+   return users_store.load()
 
 def atomic_save_users(users):
-   tmp = USERS_FILE + ".tmp"
-   with open(tmp, "w", encoding="utf-8") as f:
-       json.dump(users, f, indent=2, ensure_ascii=False)
-   os.replace(tmp, USERS_FILE)
+   users_store.save(users)
 
 def gen_otp():
    return str(random.randint(100000, 999999))
@@ -385,13 +363,13 @@ def register():
                 return render_template('register.html', form_data=form_data)
 
         users = load_users()
-        if any(u.get('username','').lower() == username.lower() for u in users):
+        if any(u['username'].lower() == username.lower() for u in users):
             flash("Username already exists.", "error")
             return render_template('register.html', form_data=form_data)
-        if any(u.get('email','').lower() == email for u in users):
+        if any(u['email'] == email for u in users):
             flash("Email already registered.", "error")
             return render_template('register.html', form_data=form_data)
-        if any(u.get('contact','') == contact_clean for u in users):
+        if any(u['contact'] == contact_clean for u in users):
             flash("Contact number already registered.", "error")
             return render_template('register.html', form_data=form_data)
 
@@ -425,6 +403,7 @@ def register():
             current_app.logger.exception("Failed saving users.json")
             flash("Failed to save user data. Try again.", "error")
             return render_template('register.html', form_data=form_data)
+        stats.record_signup()
 
         flash("Registration successful — you may now log in.", "success")
         return redirect(url_for('auth.login'))
@@ -443,17 +422,20 @@ def login():
         if not identifier or not password:
             flash("Please fill in all fields.", "error")
             return redirect(url_for('auth.login'))
-        users = load_users()
-        user = next((u for u in users if u.get('username','').lower() == identifier.lower() or u.get('email','').lower() == identifier.lower()), None)
-        if not user:
-            flash("Invalid username/email or password.", "error")
+        failures = state.key("login_failures", identifier.lower())
+        if state.hits(failures) >= LOGIN_FAILURE_LIMIT[0]:
+            flash("Too many failed attempts. Please wait a few minutes and try again.", "error")
             return redirect(url_for('auth.login'))
-        if not check_password_hash(user.get('password',''), password):
+        users = load_users()
+        user = next((u for u in users if u['username'].lower() == identifier.lower() or u['email'] == identifier.lower()), None)
+        if not user or not check_password_hash(user['password'], password):
+            state.hit(failures, LOGIN_FAILURE_LIMIT[1])
             flash("Invalid username/email or password.", "error")
             return redirect(url_for('auth.login'))
+        state.backend.delete(failures)
 
-        session['username'] = user.get('username')
-        session['display_name'] = user.get('first_name') or user.get('display_username') or user.get('username')
+        session['username'] = user['username']
+        session['display_name'] = user['first_name'] or user['display_username']
         flash("Welcome back!", "success")
         
         # Create response object with cache control headers
@@ -472,8 +454,6 @@ def login():
 
 @auth.route('/forgot', methods=['GET','POST'])
 def forgot():
-   cleanup_expired_otp_sessions()
-   
    if request.method == 'POST':
        identifier = request.form.get('username','').strip()
        if not identifier:
@@ -481,12 +461,15 @@ def forgot():
            return redirect(url_for('auth.forgot'))
        
        users = load_users()
-       user = next((u for u in users if u.get('username','').lower() == identifier.lower() or u.get('email','').lower() == identifier.lower()), None)
+       user = next((u for u in users if u['username'].lower() == identifier.lower() or u['email'] == identifier.lower()), None)
        if not user:
            flash("Username/email not found.", "error")
            return redirect(url_for('auth.forgot'))
        
-       username = user.get('username')
+       username = user['username']
+       if throttled("otp_requests", username, *OTP_REQUEST_LIMIT):
+           flash("Too many OTP requests. Please wait a few minutes and try again.", "error")
+           return redirect(url_for('auth.forgot'))
        
        existing_session = get_otp_session(username)
        otp = None
@@ -511,10 +494,11 @@ def forgot():
                    "expires_at": (datetime.utcnow() + timedelta(minutes=3)).isoformat(),
                    "sent_at": datetime.utcnow().isoformat(),
                    "time_consumed": "0:00",
-                   "purpose": "password_reset"
+                   "purpose": "password_reset",
+                   "delivery_id": otp_delivery.send_otp(username, user['email'], otp, "password_reset")
                }
                save_otp_session(username, new_session)
-               flash(f"New OTP sent to your account: {otp} (Expires in 3 minutes)", "info")
+               flash("New OTP sent to the email on your account (Expires in 3 minutes)", "info")
        else:
            otp = gen_otp()
            new_session = {
@@ -523,19 +507,34 @@ def forgot():
                "expires_at": (datetime.utcnow() + timedelta(minutes=3)).isoformat(),
                "sent_at": datetime.utcnow().isoformat(),
                "time_consumed": "0:00",
-               "purpose": "password_reset"
+               "purpose": "password_reset",
+               "delivery_id": otp_delivery.send_otp(username, user['email'], otp, "password_reset")
            }
            save_otp_session(username, new_session)
-           flash(f"OTP sent to your account: {otp} (Expires in 3 minutes)", "info")
+           flash("OTP sent to the email on your account (Expires in 3 minutes)", "info")
        
+       # The only reset this browser may ask about in otp_status
+       session['otp_pending'] = username
        return redirect(url_for("auth.verify_otp", username=username))
    
    return render_template('forgot.html')
 
+@auth.route('/otp_status/<username>')
+def otp_status(username):
+   # Lets the OTP page tell the user whether their code actually went out. Only for the
+   # signed-in user or the reset this browser started; any other name, existing or not,
+   # gets the same answer, so the route cannot be used to probe for accounts.
+   if username not in (session.get('username'), session.get('otp_pending')):
+       return jsonify({"status": "unknown"})
+   existing_session = get_otp_session(username)
+   delivery = current_app.extensions.get('otp_delivery')
+   if not existing_session or not existing_session.get("delivery_id") or delivery is None:
+       return jsonify({"status": "unknown"})
+   status = delivery.status(existing_session["delivery_id"]) or {"status": "unknown"}
+   return jsonify({"status": status["status"], "attempts": status.get("attempts", 0)})
+
 @auth.route('/verify_otp', methods=['GET','POST'])
 def verify_otp():
-    cleanup_expired_otp_sessions()
-    
     current_username = None
     
     if request.method == "POST":
@@ -587,7 +586,6 @@ def verify_otp():
     existing_session["time_consumed"] = time_consumed
     save_otp_session(current_username, existing_session)
     
-    otp_display = existing_session["otp"]
     minutes = remaining_seconds // 60
     seconds = remaining_seconds % 60
     time_remaining = f"{minutes}:{seconds:02d}"
@@ -616,15 +614,18 @@ def verify_otp():
             flash("All fields are required.", "error")
             return render_template('otp_reset.html',
                                 current_username=current_username,
-                                otp_display=otp_display,
                                 time_remaining=time_remaining,
                                 time_consumed=time_consumed)
         
         if entered_otp != existing_session["otp"]:
+            # Counted across nodes; too many misses burn the code
+            if state.hit(state.key("otp_failures", current_username), OTP_LIFETIME_SECONDS) >= OTP_ATTEMPT_LIMIT:
+                delete_otp_session(current_username)
+                flash("Too many incorrect attempts. Please request a new OTP.", "error")
+                return redirect(url_for("auth.forgot"))
             flash("Incorrect OTP. Please try again.", "error")
             return render_template('otp_reset.html',
                                 current_username=current_username,
-                                otp_display=otp_display,
                                 time_remaining=time_remaining,
                                 time_consumed=time_consumed)
         
@@ -632,7 +633,6 @@ def verify_otp():
             flash("Passwords do not match.", "error")
             return render_template('otp_reset.html',
                                 current_username=current_username,
-                                otp_display=otp_display,
                                 time_remaining=time_remaining,
                                 time_consumed=time_consumed)
         
@@ -640,14 +640,13 @@ def verify_otp():
             flash("Password must be at least 8 chars and include uppercase, lowercase, number and symbol.", "error")
             return render_template('otp_reset.html',
                                 current_username=current_username,
-                                otp_display=otp_display,
                                 time_remaining=time_remaining,
                                 time_consumed=time_consumed)
         
         users = load_users()
         updated = False
         for u in users:
-            if u.get('username') == current_username:
+            if u['username'] == current_username:
                 u['password'] = generate_password_hash(new_pass)
                 u['failed_attempts'] = 0
                 u['lockout_until'] = 0
@@ -661,7 +660,6 @@ def verify_otp():
                 flash("Failed to save updated password. Try again.", "error")
                 return render_template('otp_reset.html',
                                     current_username=current_username,
-                                    otp_display=otp_display,
                                     time_remaining=time_remaining,
                                     time_consumed=time_consumed)
             
@@ -675,7 +673,6 @@ def verify_otp():
     
     return render_template('otp_reset.html',
                          current_username=current_username,
-                         otp_display=otp_display,
                          time_remaining=time_remaining,
                          time_consumed=time_consumed)
 
@@ -698,7 +695,7 @@ def reset_password():
        users = load_users()
        updated = False
        for u in users:
-           if u.get('username') == username:
+           if u['username'] == username:
                u['password'] = generate_password_hash(new_pass)
                updated = True
                break
@@ -709,6 +706,7 @@ def reset_password():
                flash("Failed to save updated password. Try again.", "error")
                return redirect(url_for('auth.reset_password'))
            session.pop('reset_user', None)
+           session.pop('otp_pending', None)
            flash("Password updated successfully.", "success")
            return redirect(url_for('auth.login'))
        flash("User for password reset not found.", "error")
@@ -731,14 +729,15 @@ def request_profile_otp():
    if 'username' not in session:
        return jsonify({"success": False, "msg": "Not logged in."}), 401
    now = time.time()
-   expiry = session.get(OTP_SESSION_EXPIRY, 0)
-   if now < expiry:
-       remaining = int(expiry - now)
-       return jsonify({"success": True, "otp": session.get(OTP_SESSION_KEY), "expiry": remaining})
+   name = state.key("profile_otp", session['username'])
+   existing = state.get_json(name)
+   if existing and now < existing["expiry"]:
+       return jsonify({"success": True, "expiry": int(existing["expiry"] - now)})
    otp = gen_otp()
-   session[OTP_SESSION_KEY] = otp
-   session[OTP_SESSION_EXPIRY] = now + 180
-   return jsonify({"success": True, "otp": otp, "expiry": 180})
+   user = users_store.get(session['username']) or {}
+   state.set_json(name, {"otp": otp, "expiry": now + OTP_LIFETIME_SECONDS}, ttl=OTP_LIFETIME_SECONDS)
+   otp_delivery.send_otp(session['username'], user.get('email'), otp, "password_change")
+   return jsonify({"success": True, "expiry": OTP_LIFETIME_SECONDS})
 
 @auth.route('/verify_profile_otp', methods=['POST'])
 def verify_profile_otp():
@@ -749,10 +748,12 @@ def verify_profile_otp():
    confirm = (request.form.get('confirm') or "").strip()
    if not otp_entered or not new_pass or not confirm:
        return jsonify({"success": False, "msg": "All fields required."})
-   if time.time() > session.get(OTP_SESSION_EXPIRY, 0):
-       session.pop(OTP_SESSION_KEY, None); session.pop(OTP_SESSION_EXPIRY, None)
+   name = state.key("profile_otp", session['username'])
+   existing = state.get_json(name)
+   if not existing or time.time() > existing["expiry"]:
+       state.backend.delete(name)
        return jsonify({"success": False, "msg": "OTP expired. Please request again."})
-   if otp_entered != session.get(OTP_SESSION_KEY):
+   if otp_entered != existing["otp"]:
        return jsonify({"success": False, "msg": "Incorrect OTP."})
    if new_pass != confirm:
        return jsonify({"success": False, "msg": "Passwords do not match."})
@@ -762,7 +763,7 @@ def verify_profile_otp():
    users = load_users()
    updated = False
    for u in users:
-       if u.get('username') == username:
+       if u['username'] == username:
            u['password'] = generate_password_hash(new_pass)
            updated = True
            break
@@ -772,6 +773,6 @@ def verify_profile_otp():
        except Exception:
            current_app.logger.exception("Failed to save users during profile password update")
            return jsonify({"success": False, "msg": "Failed saving password."})
-       session.pop(OTP_SESSION_KEY, None); session.pop(OTP_SESSION_EXPIRY, None)
+       state.backend.delete(name)
        return jsonify({"success": True})
    return jsonify({"success": False, "msg": "User not found."})
\ No newline at end of file
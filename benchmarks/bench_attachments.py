@@ -0,0 +1,54 @@
+# benchmarks/bench_attachments.py
+# Usage: python benchmarks/bench_attachments.py [--sizes 1,16,128] (MB)
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attachments import AttachmentStore
+
+class PatternStream(io.RawIOBase):
+    # size bytes of generated data without ever holding them, like a socket would deliver an upload
+    def __init__(self, size, seed):
+        self.remaining = size
+        self.block = random.Random(seed).randbytes(1 << 16)
+
+    def readable(self):
+        return True
+
+    def read(self, n=-1):
+        n = self.remaining if n < 0 else min(n, self.remaining)
+        self.remaining -= n
+        return (self.block * (n // len(self.block) + 1))[:n]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default="1,16,128", help="upload sizes in MB")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = AttachmentStore(tmp, max_bytes=1 << 40)
+        print(f"{'upload':>8} {'seconds':>8} {'MB/s':>8} {'peak KB':>8} {'dedup s':>8}")
+        for i, mb in enumerate(int(v) for v in args.sizes.split(',')):
+            size = mb << 20
+            tracemalloc.start()
+            start = time.perf_counter()
+            store.put_stream(PatternStream(size, i))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            # Same bytes again: hashed, then dropped instead of stored twice
+            start = time.perf_counter()
+            store.put_stream(PatternStream(size, i))
+            again = time.perf_counter() - start
+            print(f"{mb:>6}MB {elapsed:>8.2f} {mb / elapsed:>8.0f} {peak / 1024:>8.0f} {again:>8.2f}")
+        print(store.stats())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/bench_duplicates.py
+# Usage: python benchmarks/bench_duplicates.py [--sizes 1000,10000,50000]
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Note
+from duplicates import DuplicateIndex, similarity, SIMILARITY
+
+WORDS = [f"w{i}" for i in range(5000)]
+
+class ListStore:
+    # What the index reads from a NoteStore
+    def __init__(self, notes):
+        self.notes = notes
+        self.lock = threading.RLock()
+        self.signature = (len(notes),)
+
+    def load(self):
+        return self.notes
+
+def make_notes(count, rng):
+    notes = []
+    for i in range(1, count + 1):
+        if i > 1 and i % 20 == 0:
+            # Every 20th note is an earlier one with a word changed
+            words = notes[rng.randrange(len(notes))].content.split()
+            words[rng.randrange(len(words))] = rng.choice(WORDS)
+        else:
+            words = rng.choices(WORDS, k=60)
+        notes.append(Note(i, 'bench', f"note {i}", ' '.join(words), 'active'))
+    return notes
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default="1000,10000,50000")
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    print(f"{'notes':>7} {'build s':>8} {'lookup ms':>10} {'pairwise ms':>12} {'found':>6}")
+    for size in (int(v) for v in args.sizes.split(',')):
+        store = ListStore(make_notes(size, rng))
+        index = DuplicateIndex()
+        start = time.perf_counter()
+        index.similar(store, store.notes[0])
+        build = time.perf_counter() - start
+        probes = rng.sample(store.notes, min(args.lookups, size))
+        start = time.perf_counter()
+        found = sum(len(index.similar(store, n)) for n in probes)
+        lookup = (time.perf_counter() - start) / len(probes)
+        # What the bands avoid: comparing one fingerprint against every other
+        prints = [sig for _, sig in index._users['bench'].prints.values()]
+        start = time.perf_counter()
+        for n in probes[:20]:
+            own = index._users['bench'].prints[n.id][1]
+            sum(1 for sig in prints if similarity(own, sig) >= SIMILARITY)
+        pairwise = (time.perf_counter() - start) / min(20, len(probes))
+        print(f"{size:>7} {build:>8.2f} {lookup * 1000:>10.3f} {pairwise * 1000:>12.3f} {found:>6}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/bench_note_blobs.py
+# Usage: python benchmarks/bench_note_blobs.py [--sizes 10000,100000]
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from store import NoteStore
+from bench_serializers import make_notes
+
+def load_inline(path):
+    # What home did before: every body parsed and kept in memory
+    with open(path, 'rb') as f:
+        return json.loads(f.read())
+
+def list_inline(notes):
+    return [(n['title'], n['content'][:200]) for n in notes if n['username'] == 'user1']
+
+def list_blob(notes):
+    return [(n.title, n.preview) for n in notes if n.username == 'user1']
+
+def measure(load, listing, path):
+    tracemalloc.start()
+    notes = load(path)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = None
+    for _ in range(5):
+        start = time.perf_counter()
+        result = listing(notes)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, retained, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10000,100000')
+    args = parser.parse_args()
+
+    # "held MB" is what stays in memory once loaded; the listing then runs against that
+    print(f"{'notes':>9} {'layout':<14} {'list ms':>8} {'held MB':>8} {'file MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [int(s) for s in args.sizes.split(',')]:
+            notes = make_notes(size)
+            inline = os.path.join(tmp, f"inline{size}.json")
+            with open(inline, 'w', encoding='utf-8') as f:
+                json.dump(notes, f)
+            blob = os.path.join(tmp, f"blob{size}.json")
+            with open(blob, 'w', encoding='utf-8') as f:
+                json.dump(notes, f)
+            NoteStore(blob).load()  # moves the bodies into the blob file
+            cases = (
+                ("inline json", load_inline, list_inline, inline),
+                ("mmap blob", lambda p: NoteStore(p).load(), list_blob, blob),
+            )
+            for name, load, listing, path in cases:
+                elapsed, held, result = measure(load, listing, path)
+                assert result
+                print(f"{size:>9} {name:<14} {elapsed * 1000:>8.2f} {held / 1e6:>8.1f} {os.path.getsize(path) / 1e6:>8.1f}")
+
+if __name__ == '__main__':
+    main()
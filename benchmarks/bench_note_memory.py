@@ -0,0 +1,41 @@
+# benchmarks/bench_note_memory.py
+# Usage: python benchmarks/bench_note_memory.py [--sizes 10000,100000]
+import os
+import sys
+import json
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import note_from_dict
+from bench_serializers import make_notes
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10000,100000')
+    args = parser.parse_args()
+
+    print(f"{'notes':>9} {'representation':<16} {'bytes/note':>11} {'total MB':>9} {'peak MB':>8}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        # Round-trip through JSON so every record owns fresh strings, as after a file load
+        raw = json.dumps(make_notes(size)).encode('utf-8')
+        cases = [
+            ("dict", lambda: json.loads(raw)),
+            ("Note", lambda: [note_from_dict(d) for d in json.loads(raw)]),
+        ]
+        for name, build in cases:
+            current, peak, result = measure(build)
+            assert len(result) == size
+            print(f"{size:>9} {name:<16} {current / size:>11.0f} {current / 1e6:>9.1f} {peak / 1e6:>8.1f}")
+            del result
+
+if __name__ == '__main__':
+    main()
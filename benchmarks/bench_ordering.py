@@ -0,0 +1,78 @@
+# benchmarks/bench_ordering.py
+# Usage: python benchmarks/bench_ordering.py [--notes 200000] [--users 20] [--page 50]
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Note
+from ordering import OrderIndex, sort_notes
+
+DAY = 86400
+EPOCH = 1700000000
+
+class FakeStore:
+    signature = (0, 0)
+
+    def __init__(self, notes):
+        self.notes = notes
+
+    def load(self):
+        return self.notes
+
+def make_notes(count, users):
+    rnd = random.Random(7)
+    notes = []
+    for i in range(1, count + 1):
+        created = EPOCH + rnd.randrange(365 * DAY)
+        notes.append(Note(i, f"user{i % users}", f"note {rnd.randrange(10 ** 6)}", "", "active",
+                          updated_at=created + rnd.randrange(30 * DAY), created_at=created, pinned=rnd.random() < 0.01))
+    return notes
+
+def scan(notes, username, sort, desc, start, end, page):
+    # What home would do without the index: filter the user's notes and sort them per request
+    mine = [n for n in notes if n.username == username and n.status == 'active']
+    return sort_notes(mine, sort, desc, start, end)[:page]
+
+def best_of(fn, runs=5):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--notes', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--page', type=int, default=50)
+    args = parser.parse_args()
+
+    notes = make_notes(args.notes, args.users)
+    index = OrderIndex()
+    build, _ = best_of(lambda: index.ensure(FakeStore(notes)), runs=1)
+    print(f"{args.notes} notes, {args.users} users, page of {args.page}; index build {build * 1000:.0f} ms")
+    print(f"{'view':<30} {'sort ms':>8} {'index ms':>9}")
+    views = (("created asc", 'created', False, None, None),
+             ("updated desc", 'updated', True, None, None),
+             ("title asc", 'title', False, None, None),
+             ("created, one month", 'created', False, EPOCH + 100 * DAY, EPOCH + 130 * DAY))
+    for label, sort, desc, start, end in views:
+        scan_s, expected = best_of(lambda: scan(notes, "user3", sort, desc, start, end, args.page))
+        index_s, (found, _) = best_of(lambda: index.page("user3", ('active',), sort, desc, start, end, 0, args.page))
+        assert [n.id for n in found] == [n.id for n in expected]
+        print(f"{label:<30} {scan_s * 1000:>8.2f} {index_s * 1000:>9.3f}")
+
+    # Cost of keeping the index current after one edit, versus the rebuild it replaces
+    note = notes[len(notes) // 2]
+    note.updated_at += DAY
+    apply_s, _ = best_of(lambda: index.apply(FakeStore(notes), note))
+    print(f"apply one edit {apply_s * 1000:.3f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/bench_serializers.py
+# Usage: python benchmarks/bench_serializers.py [--sizes 10000,100000,1000000]
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import serializers
+
+def make_notes(count, users=1000):
+    rnd = random.Random(42)
+    words = ["note", "meeting", "grocery", "idea", "todo", "call", "project", "draft", "remember", "plan"]
+    return [{
+        "id": i,
+        "username": f"user{i % users}",
+        "title": " ".join(rnd.choice(words) for _ in range(3)),
+        "content": " ".join(rnd.choice(words) for _ in range(rnd.randint(5, 60))),
+        "timestamp": "2025-10-24 17:36:46",
+        "status": "active" if i % 5 else "archived",
+        "seq": i
+    } for i in range(1, count + 1)]
+
+def legacy_save(path, data):
+    with open(path, "w", encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+def legacy_load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    args = parser.parse_args()
+
+    print(f"orjson fast path: {'on' if serializers.orjson is not None else 'off'}")
+    print(f"{'notes':>9} {'format':<22} {'save s':>8} {'load s':>8} {'size MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [int(s) for s in args.sizes.split(',')]:
+            notes = make_notes(size)
+            path = os.path.join(tmp, "notes.dat")
+            cases = [
+                ("legacy json indent=2", lambda: legacy_save(path, notes), lambda: legacy_load(path)),
+                ("json-pretty", lambda: serializers.save(path, notes, 'json-pretty'), lambda: serializers.load(path)),
+                ("json (compact)", lambda: serializers.save(path, notes, 'json'), lambda: serializers.load(path)),
+                ("binary", lambda: serializers.save(path, notes, 'binary'), lambda: serializers.load(path)),
+            ]
+            for name, save, load in cases:
+                save_s, _ = timed(save)
+                load_s, loaded = timed(load)
+                assert len(loaded) == size
+                print(f"{size:>9} {name:<22} {save_s:>8.3f} {load_s:>8.3f} {os.path.getsize(path) / 1e6:>9.1f}")
+
+if __name__ == '__main__':
+    main()
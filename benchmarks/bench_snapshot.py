@@ -0,0 +1,86 @@
+# benchmarks/bench_snapshot.py
+# Usage: python benchmarks/bench_snapshot.py [--notes 20000] [--body 2000] [--seconds 3] [--interval 0.25]
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import snapshot
+from models import Note
+from store import NoteStore, blob_path
+
+def writer(store, seconds):
+    # One edit per iteration, the way edit_note does it; returns per-save latencies
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        with store.lock:
+            notes = store.load()
+            note = notes[i % len(notes)]
+            note.content = f"edit {i} " * 20
+            note.touch()
+            store.save(notes)
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    return latencies
+
+def snapshot_loop(backup_dir, data_dir, full, interval, stop, counts):
+    while not stop.is_set():
+        snapshot.create(backup_dir, data_dir, ('notes.json',), full=full)
+        counts[0] += 1
+        stop.wait(interval)
+
+def locked_copy_loop(store, data_dir, interval, stop, counts):
+    # What a backup that holds the store lock while copying would cost writers
+    target = os.path.join(data_dir, "locked-copy")
+    os.makedirs(target, exist_ok=True)
+    while not stop.is_set():
+        with store.lock:
+            shutil.copy(store.path, target)
+            shutil.copy(blob_path(store.path, store._gen), target)
+        counts[0] += 1
+        stop.wait(interval)
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--notes', type=int, default=20000)
+    parser.add_argument('--body', type=int, default=2000)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--interval', type=float, default=0.25, help="pause between backups")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = NoteStore(os.path.join(tmp, "notes.json"))
+        store.save([Note(i, f"user{i % 20}", f"note {i}", "x" * args.body, updated_at=1) for i in range(1, args.notes + 1)])
+        print(f"{args.notes} notes, blob {os.path.getsize(blob_path(store.path, 0)) / 1e6:.1f} MB, {args.seconds:.0f}s per run")
+        print(f"{'during':<22} {'saves':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'backups':>8}")
+        backups = os.path.join(tmp, "backups")
+        runs = (("nothing", None),
+                ("snapshot, full", lambda stop, counts: snapshot_loop(backups, tmp, True, args.interval, stop, counts)),
+                ("snapshot, incremental", lambda stop, counts: snapshot_loop(backups, tmp, False, args.interval, stop, counts)),
+                ("locked file copy", lambda stop, counts: locked_copy_loop(store, tmp, args.interval, stop, counts)))
+        for label, background in runs:
+            stop, counts = threading.Event(), [0]
+            thread = threading.Thread(target=background, args=(stop, counts)) if background else None
+            if thread:
+                thread.start()
+            latencies = writer(store, args.seconds)
+            stop.set()
+            if thread:
+                thread.join()
+            ms = [v * 1000 for v in latencies]
+            print(f"{label:<22} {len(ms):>6} {percentile(ms, 0.5):>8.2f} {percentile(ms, 0.99):>8.2f} {max(ms):>8.2f} {counts[0]:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/bench_startup.py
+# Usage: python benchmarks/bench_startup.py [--notes 100000] [--runs 3]
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_serializers import make_notes
+
+# Runs in a fresh interpreter so nothing is warm from a previous case
+CHILD = r'''
+import sys, time, json
+sys.path.insert(0, ROOT)
+start = time.perf_counter()
+from app import create_app
+app = create_app()
+boot = time.perf_counter() - start
+client = app.test_client()
+timings = {"boot": boot}
+for path in ('/login', '/register', '/home'):
+    if path == '/home':
+        with client.session_transaction() as s:
+            s['username'] = 'user1'
+    start = time.perf_counter()
+    assert client.get(path).status_code == 200, path
+    timings[path] = time.perf_counter() - start
+print(json.dumps(timings))
+'''
+
+def run(warm, notes_path, users_path):
+    # The stores are built at import from these, so the child never touches the repo's data files
+    env = dict(os.environ, NOTEPAD_WARMUP="1" if warm else "0", NOTEPAD_NOTES_FILE=notes_path, NOTEPAD_USERS_FILE=users_path)
+    code = f"ROOT={ROOT!r}\n" + CHILD
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--notes', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        notes_path = os.path.join(tmp, "notes.json")
+        users_path = os.path.join(tmp, "users.json")
+        with open(notes_path, 'w', encoding='utf-8') as f:
+            json.dump(make_notes(args.notes), f)
+        with open(users_path, 'w', encoding='utf-8') as f:
+            json.dump([{"username": f"user{i}"} for i in range(1000)], f)
+        run(True, notes_path, users_path)  # first run moves note bodies into the blob file
+
+        print(f"{args.notes} notes, best of {args.runs} runs (ms)")
+        print(f"{'warmup':<8} {'boot':>8} {'/login':>8} {'/home':>8} {'/register':>10}")
+        for warm in (False, True):
+            results = [run(warm, notes_path, users_path) for _ in range(args.runs)]
+            best = {k: min(r[k] for r in results) * 1000 for k in results[0]}
+            print(f"{'on' if warm else 'off':<8} {best['boot']:>8.1f} {best['/login']:>8.1f} {best['/home']:>8.1f} {best['/register']:>10.1f}")
+
+if __name__ == '__main__':
+    main()
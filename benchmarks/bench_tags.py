@@ -0,0 +1,62 @@
+# benchmarks/bench_tags.py
+# Usage: python benchmarks/bench_tags.py [--notes 200000] [--users 20]
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Note
+from tags import TagIndex
+
+TAGS = ["work", "home", "todo", "idea", "urgent", "later", "read", "call", "travel", "money"]
+
+class FakeStore:
+    signature = (0, 0)
+
+    def __init__(self, notes):
+        self.notes = notes
+
+    def load(self):
+        return self.notes
+
+def make_notes(count, users):
+    rnd = random.Random(7)
+    return [Note(i, f"user{i % users}", f"note {i}", "", "active", tags=tuple(sorted(rnd.sample(TAGS, rnd.randint(0, 3)))))
+            for i in range(1, count + 1)]
+
+def scan(notes, username, tags, mode):
+    match = all if mode == 'and' else any
+    return [n for n in notes if n.username == username and match(t in n.tags for t in tags)]
+
+def best_of(fn, runs=5):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--notes', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=20)
+    args = parser.parse_args()
+
+    notes = make_notes(args.notes, args.users)
+    index = TagIndex()
+    build, _ = best_of(lambda: index.ensure(FakeStore(notes)), runs=1)
+    print(f"{args.notes} notes, {args.users} users; index build {build * 1000:.0f} ms")
+    print(f"{'filter':<28} {'scan ms':>8} {'index ms':>9} {'matches':>8}")
+    for tags, mode in ((("urgent",), 'and'), (("work", "todo"), 'and'), (("work", "todo", "urgent"), 'and'), (("travel", "money"), 'or')):
+        scan_s, expected = best_of(lambda: scan(notes, "user3", tags, mode))
+        index_s, found = best_of(lambda: index.notes("user3", tags, mode))
+        assert [n.id for n in found] == [n.id for n in expected]
+        label = f" {mode} ".join(tags)
+        print(f"{label:<28} {scan_s * 1000:>8.2f} {index_s * 1000:>9.2f} {len(found):>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_template_cache.py
+# Usage: python benchmarks/bench_template_cache.py [--runs 5]
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fresh interpreter per run, no startup warmup: the first render pays for template loading
+CHILD = r'''
+import sys, time, json
+sys.path.insert(0, ROOT)
+from app import create_app
+app = create_app({"START_WORKERS": False})
+client = app.test_client()
+timings = {}
+for path in ('/register', '/login'):
+    start = time.perf_counter()
+    assert client.get(path).status_code == 200, path
+    timings[path] = time.perf_counter() - start
+print(json.dumps(timings))
+'''
+
+def data_env(data_dir, **extra):
+    # Scratch data files: the app never reads or migrates the repo's own
+    return dict(os.environ, NOTEPAD_WARMUP="0", NOTEPAD_NOTES_FILE=os.path.join(data_dir, "notes.json"),
+                NOTEPAD_USERS_FILE=os.path.join(data_dir, "users.json"), **extra)
+
+def run(cache_dir, data_dir):
+    env = data_env(data_dir, NOTEPAD_TEMPLATE_CACHE=cache_dir)
+    code = f"ROOT={ROOT!r}\n" + CHILD
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, tempfile.TemporaryDirectory() as data_dir:
+        subprocess.run([sys.executable, "jinja_cache.py", "warm"], env=data_env(data_dir, NOTEPAD_TEMPLATE_CACHE=tmp),
+                       cwd=ROOT, check=True, capture_output=True)
+        print(f"first-request latency, best of {args.runs} fresh processes (ms)")
+        print(f"{'bytecode cache':<16} {'/register':>10} {'/login':>8}")
+        for name, cache_dir in (("off", ""), ("warm", tmp)):
+            results = [run(cache_dir, data_dir) for _ in range(args.runs)]
+            best = {k: min(r[k] for r in results) * 1000 for k in results[0]}
+            print(f"{name:<16} {best['/register']:>10.1f} {best['/login']:>8.1f}")
+
+if __name__ == '__main__':
+    main()
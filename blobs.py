@@ -0,0 +1,99 @@
+# blobs.py
+import os
+import mmap
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: appends are only serialised within this process
+    fcntl = None
+
+PREVIEW_BYTES = 400
+
+class BlobFile:
+    # Append-only file of UTF-8 note bodies, read through mmap.
+    # Mappings are never closed explicitly: a request still holding a Note from
+    # before a remap or compaction keeps reading the old mapping until it is collected.
+    def __init__(self, path, gen):
+        self.path = path
+        self.gen = gen
+        self.lock = threading.Lock()
+        self._map = None
+        self._mapped = 0
+        self._writer = None
+
+    def _view(self, end):
+        m = self._map
+        if m is not None and end <= self._mapped:
+            return m
+        with self.lock:
+            if self._writer is not None:
+                self._writer.flush()
+            size = os.path.getsize(self.path)
+            if end > size:
+                raise ValueError(f"{self.path}: range ends at {end}, file has {size} bytes")
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapped = size
+            return self._map
+
+    def append(self, text):
+        return self.append_bytes(text.encode('utf-8'))
+
+    def append_bytes(self, data):
+        # The end of the file is reserved under an exclusive flock and the bytes are on
+        # disk before it is released, so another process appending to the same blob
+        # never gets the same offset (the thread lock alone only covers this process)
+        with self.lock:
+            if self._writer is None:
+                self._writer = open(self.path, 'ab')
+            if fcntl is not None:
+                fcntl.flock(self._writer.fileno(), fcntl.LOCK_EX)
+            try:
+                offset = self._writer.seek(0, os.SEEK_END)
+                self._writer.write(data)
+                self._writer.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._writer.fileno(), fcntl.LOCK_UN)
+        return offset, len(data)
+
+    def flush(self):
+        with self.lock:
+            if self._writer is not None:
+                self._writer.flush()
+                os.fsync(self._writer.fileno())
+
+    def read_bytes(self, offset, length):
+        if not length:
+            return b''
+        return self._view(offset + length)[offset:offset + length]
+
+    def read(self, offset, length):
+        return self.read_bytes(offset, length).decode('utf-8')
+
+    def preview(self, offset, length, limit=PREVIEW_BYTES):
+        # Only the first `limit` bytes are touched; a character split at the cut is dropped
+        if length <= limit:
+            return self.read(offset, length), False
+        return self._view(offset + limit)[offset:offset + limit].decode('utf-8', 'ignore'), True
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def close(self):
+        # The mapping stays usable after the file is removed, so only the writer goes
+        with self.lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+def copy_live(ranges, target):
+    # Copies each (blob, offset, length) into target; returns the new offsets in order
+    offsets = [target.append_bytes(blob.read_bytes(offset, length))[0] for blob, offset, length in ranges]
+    target.flush()
+    return offsets
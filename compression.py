@@ -0,0 +1,68 @@
+# compression.py
+import gzip
+from flask import Blueprint, request, current_app
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+compression = Blueprint('compression', __name__)
+
+DEFAULT_MIN_SIZE = 500
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_LEVEL = 5
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+}
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def choose_encoding(accept_encodings, encodings=None):
+    # Server preference order wins among everything the client accepts (q > 0)
+    for enc in encodings or available_encodings():
+        if accept_encodings.quality(enc) > 0:
+            return enc
+    return None
+
+def compress(data, encoding, level=None):
+    if encoding == 'br':
+        quality = DEFAULT_BROTLI_LEVEL if level is None else level
+        return brotli.compress(data, quality=quality)
+    return gzip.compress(data, compresslevel=DEFAULT_GZIP_LEVEL if level is None else level, mtime=0)
+
+def add_vary(response):
+    vary = response.headers.get('Vary', '')
+    if 'accept-encoding' not in vary.lower():
+        response.headers['Vary'] = f"{vary}, Accept-Encoding" if vary else 'Accept-Encoding'
+
+@compression.after_app_request
+def compress_response(response):
+    config = current_app.config
+    if not config.get('COMPRESS_ENABLED', True):
+        return response
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if 'Content-Encoding' in response.headers or response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    if response.mimetype not in config.get('COMPRESS_MIMETYPES', COMPRESSIBLE_MIMETYPES):
+        return response
+
+    add_vary(response)
+    data = response.get_data()
+    if len(data) < config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE):
+        return response
+
+    encoding = choose_encoding(request.accept_encodings)
+    if not encoding:
+        return response
+    if encoding == 'br':
+        level = config.get('COMPRESS_BROTLI_LEVEL', DEFAULT_BROTLI_LEVEL)
+    else:
+        level = config.get('COMPRESS_GZIP_LEVEL', DEFAULT_GZIP_LEVEL)
+
+    response.set_data(compress(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    return response
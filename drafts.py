@@ -0,0 +1,175 @@
+# drafts.py
+import os
+import re
+import sys
+import time
+import atexit
+import hashlib
+import logging
+import threading
+
+import serializers
+
+log = logging.getLogger(__name__)
+
+DRAFTS_DIR = os.environ.get("NOTEPAD_DRAFTS_DIR", os.path.join(os.path.dirname(__file__), "drafts"))
+DEFAULT_FLUSH_SECONDS = 2.0
+MAX_DRAFTS = 50
+MAX_TITLE = 500
+MAX_CONTENT = 2_000_000
+# Drafts nobody came back to are dropped after this long
+DRAFT_TTL = 30 * 24 * 3600
+# "new" for the add form, the note id for an edit
+KEY_RE = re.compile(r'^(new|[1-9][0-9]{0,17})$')
+
+class DraftError(ValueError):
+    pass
+
+def parse_draft(data):
+    # Request body -> draft record; raises DraftError
+    if not isinstance(data, dict):
+        raise DraftError("draft must be an object")
+    title, content, tags = data.get('title', ''), data.get('content', ''), data.get('tags', '')
+    if not all(isinstance(v, str) for v in (title, content, tags)):
+        raise DraftError("title, content and tags must be strings")
+    if len(title) > MAX_TITLE or len(content) > MAX_CONTENT:
+        raise DraftError("draft is too large")
+    base_seq, client_ts = data.get('base_seq'), data.get('client_ts', 0)
+    for value in (base_seq, client_ts):
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+            raise DraftError("base_seq and client_ts must be non-negative integers")
+    return {"title": title, "content": content, "tags": tags, "base_seq": base_seq,
+            "client_ts": client_ts or 0, "saved_at": int(time.time())}
+
+class DraftStore:
+    # Autosaves never touch notes.json. put() only replaces the draft in memory and marks the
+    # user dirty; a flusher thread writes each dirty user's file at most once per interval,
+    # so a burst of keystroke saves costs one small write. Within a user, the draft with
+    # the newest client timestamp wins, whatever order the requests arrive in.
+    def __init__(self, directory=DRAFTS_DIR, interval=DEFAULT_FLUSH_SECONDS):
+        self.directory = directory
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._drafts = {}
+        self._dirty = set()
+        self._thread = None
+        self._stopping = False
+
+    def _path(self, username):
+        # Usernames may contain dots; hash them instead of trusting them as file names
+        return os.path.join(self.directory, hashlib.sha1(username.encode('utf-8')).hexdigest() + ".json")
+
+    def _user(self, username):
+        # Called with the condition held
+        drafts = self._drafts.get(username)
+        if drafts is None:
+            path = self._path(username)
+            try:
+                data = serializers.load(path) if os.path.exists(path) else {}
+            except (serializers.SerializationError, PermissionError):
+                log.exception("Failed to read drafts of %s", username)
+                data = {}
+            cutoff = time.time() - DRAFT_TTL
+            drafts = self._drafts[username] = {k: d for k, d in data.get("drafts", {}).items() if d.get("saved_at", 0) > cutoff}
+        return drafts
+
+    def get(self, username, key):
+        with self._cond:
+            return self._user(username).get(key)
+
+    def all(self, username):
+        with self._cond:
+            return dict(self._user(username))
+
+    def put(self, username, key, draft):
+        # -> False when a newer draft (by client timestamp) is already held
+        if not KEY_RE.match(key):
+            raise DraftError(f"bad draft key {key!r}")
+        with self._cond:
+            drafts = self._user(username)
+            current = drafts.get(key)
+            if current is not None and current["client_ts"] > draft["client_ts"]:
+                return False
+            if current is None and len(drafts) >= MAX_DRAFTS:
+                raise DraftError(f"at most {MAX_DRAFTS} drafts")
+            drafts[key] = draft
+            self._dirty.add(username)
+            return True
+
+    def discard(self, username, key):
+        with self._cond:
+            if self._user(username).pop(key, None) is not None:
+                self._dirty.add(username)
+
+    def flush(self):
+        # Copies under the lock, writes outside it: a slow disk never blocks put()
+        with self._cond:
+            pending = {u: dict(self._drafts.get(u, {})) for u in self._dirty}
+            self._dirty.clear()
+        for username, drafts in pending.items():
+            path = self._path(username)
+            try:
+                if drafts:
+                    os.makedirs(self.directory, exist_ok=True)
+                    serializers.save(path, {"username": username, "drafts": drafts})
+                elif os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                log.exception("Failed to write drafts of %s", username)
+                with self._cond:
+                    self._dirty.add(username)
+        return len(pending)
+
+    def start(self):
+        with self._cond:
+            if self._thread:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="draft-flusher", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=5):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait(self.interval)
+                if self._stopping:
+                    return
+            self.flush()
+
+    def counts(self):
+        with self._cond:
+            return {"users": len(self._drafts), "drafts": sum(len(d) for d in self._drafts.values()), "dirty": len(self._dirty)}
+
+def init_app(app):
+    store = DraftStore(app.config.get("DRAFTS_DIR", DRAFTS_DIR),
+                       app.config.get("DRAFTS_FLUSH_SECONDS", DEFAULT_FLUSH_SECONDS))
+    if app.config.get("START_WORKERS", True):
+        store.start()
+    app.extensions['drafts'] = store
+    return store
+
+def main(argv):
+    if argv == ['status']:
+        files = [n for n in os.listdir(DRAFTS_DIR) if n.endswith(".json")] if os.path.isdir(DRAFTS_DIR) else []
+        total = 0
+        for name in files:
+            data = serializers.load(os.path.join(DRAFTS_DIR, name))
+            total += len(data.get("drafts", {}))
+            print(f"{data.get('username', name):<24} {len(data.get('drafts', {}))}")
+        print(f"{len(files)} users, {total} drafts")
+        return 0
+    print("usage: python drafts.py status")
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,212 @@
+# duplicates.py
+import re
+import hashlib
+
+from store import StoreIndex
+
+# MinHash over word shingles, LSH-banded: the signature is cut into BANDS bands of ROWS
+# values, and only notes that agree on a whole band are ever compared. Notes whose
+# shingle sets overlap by SIMILARITY or more share a band with probability
+# 1 - (1 - s**ROWS)**BANDS (89% at 0.6, 99% at 0.7); unrelated notes practically never do.
+BANDS = 16
+ROWS = 4
+SLOTS = BANDS * ROWS
+SIMILARITY = 0.6
+SHINGLE_WORDS = 3
+# Shorter texts only get the exact check: a few common words say nothing about similarity
+MIN_WORDS = 8
+MEMO_SIZE = 100_000
+WORD_RE = re.compile(r'\w+')
+
+def content_digest(text):
+    # Same text up to whitespace and case
+    return hashlib.blake2b(' '.join(text.split()).lower().encode('utf-8'), digest_size=16).digest()
+
+def shingle_hash(shingle):
+    # Not hash(): str hashes are salted per process, and the same notes must compare the same way everywhere
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def minhash(text):
+    words = WORD_RE.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    # One permutation hashing: each shingle is hashed once and lands in one of SLOTS bins,
+    # so the cost is linear in the text rather than SLOTS hashes per shingle.
+    mins = [None] * SLOTS
+    for i in range(len(words) - SHINGLE_WORDS + 1):
+        h = shingle_hash(' '.join(words[i:i + SHINGLE_WORDS]))
+        slot, value = h % SLOTS, h // SLOTS
+        if mins[slot] is None or value < mins[slot]:
+            mins[slot] = value
+    # Empty bins borrow from the next filled one, tagged with how far it is, the same way
+    # for every text, so two signatures still agree slot by slot as often as the sets overlap
+    sig = list(mins)
+    for slot in range(SLOTS):
+        if mins[slot] is None:
+            step = 1
+            while mins[(slot + step) % SLOTS] is None:
+                step += 1
+            sig[slot] = mins[(slot + step) % SLOTS] + (step << 64)
+    return tuple(sig)
+
+def bands(sig):
+    # The band's values themselves are the key: no hash collisions, nothing salted
+    return [sig[i:i + ROWS] for i in range(0, SLOTS, ROWS)]
+
+def similarity(a, b):
+    # Estimated Jaccard similarity of the two shingle sets
+    return sum(x == y for x, y in zip(a, b)) / SLOTS
+
+class _UserPrints:
+    __slots__ = ('prints', 'exact', 'bands')
+
+    def __init__(self):
+        self.prints = {}
+        self.exact = {}
+        self.bands = [{} for _ in range(BANDS)]
+
+    def add(self, note_id, digest, sig):
+        self.prints[note_id] = (digest, sig)
+        self.exact.setdefault(digest, set()).add(note_id)
+        if sig is not None:
+            for table, value in zip(self.bands, bands(sig)):
+                table.setdefault(value, set()).add(note_id)
+
+    def remove(self, note_id):
+        old = self.prints.pop(note_id, None)
+        if old is None:
+            return
+        digest, sig = old
+        ids = self.exact[digest]
+        ids.discard(note_id)
+        if not ids:
+            del self.exact[digest]
+        if sig is not None:
+            for table, value in zip(self.bands, bands(sig)):
+                ids = table[value]
+                ids.discard(note_id)
+                if not ids:
+                    del table[value]
+
+    def candidates(self, digest, sig):
+        exact = set(self.exact.get(digest, ()))
+        near = set()
+        if sig is not None:
+            for table, value in zip(self.bands, bands(sig)):
+                near.update(table.get(value, ()))
+        return exact, near - exact
+
+class DuplicateIndex(StoreIndex):
+    # Per user: content digest -> note ids for exact copies, band value -> note ids for
+    # near copies. A rebuild only buckets the notes by user; a user's prints are built
+    # from their own bucket the first time that user is looked up, and patched after our
+    # own saves. A change on disk drops them all (the signature memo survives, keyed by
+    # digest, so unchanged notes are not shingled again).
+    def __init__(self):
+        super().__init__()
+        self._users = {}
+        self._memo = {}
+        self._notes = {}
+        self._by_user = {}
+
+    def _fingerprint(self, text):
+        digest = content_digest(text)
+        if digest in self._memo:
+            return digest, self._memo[digest]
+        sig = minhash(text)
+        if len(self._memo) >= MEMO_SIZE:
+            # Oldest entries first: dicts keep insertion order
+            for key in list(self._memo)[:MEMO_SIZE // 10]:
+                del self._memo[key]
+        self._memo[digest] = sig
+        return digest, sig
+
+    def _user(self, username):
+        # Called with self._lock held; costs the user's own notes, never the whole store
+        user = self._users.get(username)
+        if user is None:
+            user = self._users[username] = _UserPrints()
+            for note_id in self._by_user.get(username, ()):
+                user.add(note_id, *self._fingerprint(self._notes[note_id].content))
+        return user
+
+    def _rebuild(self, notes):
+        self._users, self._notes, self._by_user = {}, {}, {}
+        for n in notes:
+            if not n.is_tombstone:
+                self._notes[n.id] = n
+                self._by_user.setdefault(n.username, set()).add(n.id)
+
+    def _patch(self, note):
+        user = self._users.get(note.username)
+        ids = self._by_user.setdefault(note.username, set())
+        ids.discard(note.id)
+        self._notes.pop(note.id, None)
+        if user is not None:
+            user.remove(note.id)
+        if not note.is_tombstone:
+            ids.add(note.id)
+            self._notes[note.id] = note
+            if user is not None:
+                user.add(note.id, *self._fingerprint(note.content))
+
+    def similar(self, store, note):
+        # -> [(other note, 'exact' | 'near', estimated similarity)] closest first
+        self.ensure(store)
+        with self._lock:
+            user = self._user(note.username)
+            own = user.prints.get(note.id)
+            if own is None:
+                return []
+            exact, near = user.candidates(*own)
+            found = [(i, 'exact', 1.0) for i in exact if i != note.id]
+            if own[1] is not None:
+                for i in near:
+                    score = similarity(own[1], user.prints[i][1])
+                    if i != note.id and score >= SIMILARITY:
+                        found.append((i, 'near', score))
+            found.sort(key=lambda f: (-f[2], f[0]))
+            return [(self._notes[i], kind, d) for i, kind, d in found if i in self._notes]
+
+    def groups(self, store, username):
+        # Clusters of notes that are copies of each other (linked through any close pair).
+        # Only notes sharing a digest or a band are ever compared.
+        self.ensure(store)
+        with self._lock:
+            user = self._user(username)
+            parent = {}
+
+            def find(i):
+                while parent.get(i, i) != i:
+                    parent[i] = parent.get(parent[i], parent[i])
+                    i = parent[i]
+                return i
+
+            def union(a, b):
+                ra, rb = find(a), find(b)
+                if ra != rb:
+                    # Both roots go in parent: clusters are read back from its keys
+                    parent.setdefault(ra, ra)
+                    parent.setdefault(rb, rb)
+                    parent[max(ra, rb)] = min(ra, rb)
+
+            for ids in user.exact.values():
+                first, *rest = sorted(ids)
+                for i in rest:
+                    union(first, i)
+            for table in user.bands:
+                for ids in table.values():
+                    if len(ids) < 2:
+                        continue
+                    ids = sorted(ids)
+                    for x, a in enumerate(ids):
+                        for b in ids[x + 1:]:
+                            if find(a) != find(b) and similarity(user.prints[a][1], user.prints[b][1]) >= SIMILARITY:
+                                union(a, b)
+            clusters = {}
+            for i in parent:
+                clusters.setdefault(find(i), []).append(i)
+            return [[self._notes[i] for i in sorted(ids) if i in self._notes]
+                    for _, ids in sorted(clusters.items()) if len(ids) > 1]
+
+duplicate_index = DuplicateIndex()
@@ -0,0 +1,61 @@
+# events.py
+import json
+import queue
+import itertools
+import threading
+
+MAX_QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 15
+
+_subscribers = {}
+_lock = threading.Lock()
+_event_ids = itertools.count(1)
+
+def subscribe(username):
+    q = queue.Queue(maxsize=MAX_QUEUE_SIZE)
+    with _lock:
+        _subscribers.setdefault(username, set()).add(q)
+    return q
+
+def unsubscribe(username, q):
+    with _lock:
+        subs = _subscribers.get(username)
+        if subs is not None:
+            subs.discard(q)
+            if not subs:
+                del _subscribers[username]
+
+def has_subscribers(username):
+    return bool(_subscribers.get(username))
+
+def publish(username, event_type, payload):
+    with _lock:
+        subs = list(_subscribers.get(username, ()))
+    if not subs:
+        return 0
+    event = (next(_event_ids), event_type, payload)
+    for q in subs:
+        try:
+            q.put_nowait(event)
+        except queue.Full:
+            # Slow consumer: drop its backlog and tell it to reload instead of blocking the writer
+            with q.mutex:
+                q.queue.clear()
+            q.put_nowait((event[0], 'resync', {}))
+    return len(subs)
+
+def format_sse(event_id, event_type, payload):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def stream(username, q, heartbeat=HEARTBEAT_SECONDS):
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = q.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(*event)
+    finally:
+        unsubscribe(username, q)
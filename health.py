@@ -0,0 +1,61 @@
+# health.py
+import time
+import logging
+from flask import Blueprint, current_app, jsonify
+
+import assets
+import auth
+import main
+import stats
+import state
+import sync
+
+health = Blueprint('health', __name__)
+log = logging.getLogger(__name__)
+
+def warmup(app):
+    # Pay the first-request costs up front: parse the data files, build the seq
+    # index, load the asset manifest and compile every template
+    status = app.extensions.setdefault('warmup', {"ready": False})
+    start = time.perf_counter()
+    try:
+        status["stores"] = {"users": len(auth.load_users()), "notes": len(main.notes_store.load())}
+        sync.seq_index.ensure(main.notes_store)
+        main.tag_index.ensure(main.notes_store)
+        main.order_index.ensure(main.notes_store)
+        main.usage_index.ensure(main.notes_store)
+        main.share_index.ensure(main.notes_store)
+        if not stats.is_seeded():
+            stats.seed(auth.load_users(), main.notes_store)
+        status["assets"] = len(assets.load_manifest())
+        templates = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+        for name in templates:
+            app.jinja_env.get_template(name)
+        status["templates"] = len(templates)
+    except Exception:
+        log.exception("Warmup failed")
+        status["error"] = "warmup failed"
+        return status
+    status["took_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    status["ready"] = True
+    return status
+
+@health.route('/healthz')
+def healthz():
+    # Liveness only: the process is up and serving
+    return jsonify({"status": "ok"})
+
+@health.route('/readyz')
+def readyz():
+    status = current_app.extensions.get('warmup', {"ready": False})
+    body = dict(status)
+    if status.get("ready"):
+        # The note store is cached in memory, so its size is cheap to report live
+        body["stores"] = dict(status.get("stores", {}), notes=len(main.notes_store))
+    # Nodes share OTP state and seq counters through the backend: no backend, no traffic
+    body["state_backend"] = {"name": state.backend.name, "ok": state.backend.ping()}
+    body["ready"] = bool(status.get("ready")) and body["state_backend"]["ok"]
+    response = jsonify(body)
+    response.status_code = 200 if body["ready"] else 503
+    response.headers['Cache-Control'] = 'no-store'
+    return response
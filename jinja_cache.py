@@ -0,0 +1,74 @@
+# jinja_cache.py
+import os
+import sys
+import fnmatch
+from hashlib import sha1
+from jinja2 import FileSystemBytecodeCache
+
+DEFAULT_CACHE_DIR = os.environ.get("NOTEPAD_TEMPLATE_CACHE", os.path.join(os.path.dirname(__file__), ".jinja_cache"))
+CACHE_PATTERN = "__jinja2_%s.cache"
+
+class MtimeBytecodeCache(FileSystemBytecodeCache):
+    # Compiled templates shared across worker processes. The template's mtime is
+    # part of the key, so editing a template points every worker at a fresh entry
+    def get_cache_key(self, name, filename=None):
+        key = sha1(name.encode("utf-8"))
+        if filename is not None:
+            try:
+                mtime = os.stat(filename).st_mtime_ns
+            except OSError:
+                mtime = 0
+            key.update(f"|{filename}|{mtime}".encode())
+        return key.hexdigest()
+
+def init_app(app):
+    cache_dir = app.config.get("TEMPLATE_CACHE_DIR", DEFAULT_CACHE_DIR)
+    if not cache_dir:
+        return None
+    os.makedirs(cache_dir, exist_ok=True)
+    # The main and auth blueprints render through the app's environment, so one cache covers both
+    app.jinja_env.bytecode_cache = MtimeBytecodeCache(cache_dir, CACHE_PATTERN)
+    return app.jinja_env.bytecode_cache
+
+def warm(app):
+    # Compile every template into the cache, then drop entries for older template versions
+    cache = app.jinja_env.bytecode_cache
+    if cache is None:
+        return 0, 0
+    env = app.jinja_env
+    keep = set()
+    names = [name for name in env.list_templates() if name.endswith('.html')]
+    for name in names:
+        _, filename, _ = env.loader.get_source(env, name)
+        keep.add(CACHE_PATTERN % cache.get_cache_key(name, filename))
+        env.get_template(name)
+    removed = 0
+    for entry in os.listdir(cache.directory):
+        if fnmatch.fnmatch(entry, CACHE_PATTERN % "*") and entry not in keep:
+            try:
+                os.remove(os.path.join(cache.directory, entry))
+                removed += 1
+            except OSError:
+                pass
+    return len(names), removed
+
+def main(argv):
+    if argv in (['warm'], ['clear']):
+        from app import create_app
+        app = create_app({"WARMUP": False, "START_WORKERS": False})
+        cache = app.jinja_env.bytecode_cache
+        if cache is None:
+            print("template cache is disabled (TEMPLATE_CACHE_DIR is empty)")
+            return 1
+        if argv == ['clear']:
+            cache.clear()
+            print(f"{cache.directory}: cleared")
+            return 0
+        compiled, removed = warm(app)
+        print(f"{cache.directory}: {compiled} templates cached, {removed} stale entries removed")
+        return 0
+    print("usage: python jinja_cache.py {warm,clear}")
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,273 +1,753 @@
 # main.py
 import os
-import json
 import re
 import random
 from datetime import datetime, timedelta
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, make_response
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, make_response, jsonify, Response, stream_with_context, send_file
+
+import events
+import sync
+import otp_delivery
+import state
+import stats
+from auth import get_otp_session, save_otp_session, delete_otp_session, OTP_ATTEMPT_LIMIT, OTP_LIFETIME_SECONDS, users_store
+from models import Note, InvalidNote, now_epoch, parse_tags
+from store import NoteStore, NOTES_FILE
+from tags import tag_index, parse_filter
+from ordering import order_index, parse_order, sort_notes
+from patches import PatchError, parse_patches, apply_patches
+from drafts import DraftError, parse_draft
+from quotas import usage_index, quota_error, usage_summary, note_bytes
+from attachments import AttachmentError, TooLarge, MAX_PER_NOTE, attachment_record
+from duplicates import duplicate_index
+from sharing import ShareError, share_index, set_share
 
 main = Blueprint('main', __name__, template_folder="templates")
 
-USERS_FILE = os.path.join(os.path.dirname(__file__), "users.json")
-NOTES_FILE = os.path.join(os.path.dirname(__file__), "notes.json")
-OTP_STORAGE_FILE = "otp_sessions.json"
+# A save warns about at most this many look-alike notes
+MAX_DUPLICATES_SHOWN = 5
+# Notes per page in each of the home page's lists
+HOME_PAGE_SIZE = 50
 
-def ensure_file(path):
-   if not os.path.exists(path):
-       with open(path, 'w', encoding='utf-8') as f:
-           json.dump([], f)
+notes_store = NoteStore(NOTES_FILE)
 
-def load_data(path):
-   ensure_file(path)
-   try:
-       with open(path, 'r', encoding='utf-8') as f:
-           data = json.load(f)
-           if isinstance(data, list):
-               return data
-           else:
-               return []
-   except (json.JSONDecodeError, PermissionError, TypeError):
-       return []
-
-def atomic_save(path, data):
-   tmp = path + ".tmp"
-   with open(tmp, "w", encoding='utf-8') as f:
-       json.dump(data, f, indent=2, ensure_ascii=False)
-   os.replace(tmp, path)
+def api_login_required(f):
+   from functools import wraps
+   @wraps(f)
+   def wrapped(*args, **kwargs):
+       if 'username' not in session:
+           return jsonify({"success": False, "msg": "Not logged in."}), 401
+       return f(*args, **kwargs)
+   return wrapped
 
 def login_required(f):
    from functools import wraps
    @wraps(f)
    def wrapped(*args, **kwargs):
        if 'username' not in session:
+           if wants_json():
+               return jsonify({"success": False, "msg": "Not logged in."}), 401
            flash("Please log in first.", "error")
            return redirect(url_for('auth.login'))
        return f(*args, **kwargs)
    return wrapped
 
-def load_otp_sessions():
-    if not os.path.exists(OTP_STORAGE_FILE):
-        return {}
-    try:
-        with open(OTP_STORAGE_FILE, 'r') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return {}
-
-def save_otp_sessions(sessions):
-    try:
-        with open(OTP_STORAGE_FILE, 'w') as f:
-            json.dump(sessions, f, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving OTP sessions: {e}")
-        return False
-
-def get_otp_session(username):
-    sessions = load_otp_sessions()
-    return sessions.get(username)
-
-def save_otp_session(username, otp_data):
-    sessions = load_otp_sessions()
-    sessions[username] = otp_data
-    return save_otp_sessions(sessions)
-
-def delete_otp_session(username):
-    sessions = load_otp_sessions()
-    if username in sessions:
-        del sessions[username]
-        return save_otp_sessions(sessions)
-    return True
-
 def gen_otp():
    return str(random.randint(100000, 999999))
 
+def wants_json():
+   return request.is_json or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+def note_form():
+   # JSON clients send a body, the plain form flow sends form fields.
+   # tags is None when the client did not send the field at all (keep the note's tags);
+   # raises InvalidNote for malformed tags
+   if request.is_json:
+       data = request.get_json(silent=True) or {}
+       try:
+           base_seq = int(data['base_seq']) if data.get('base_seq') not in (None, '') else None
+       except (TypeError, ValueError):
+           base_seq = None
+       tags = parse_tags(data['tags']) if 'tags' in data else None
+       return str(data.get('title') or '').strip(), str(data.get('content') or '').strip(), tags, base_seq
+   tags = parse_tags(request.form['tags']) if 'tags' in request.form else None
+   return request.form.get('title','').strip(), request.form.get('content','').strip(), tags, request.form.get('base_seq', type=int)
+
+def drop_draft(key):
+   drafts = current_app.extensions.get('drafts')
+   if drafts is not None:
+       drafts.discard(session['username'], key)
+
+def index_note(note):
+   # Every in-memory index follows our own saves without a rebuild
+   sync.seq_index.apply(notes_store, note)
+   tag_index.apply(notes_store, note)
+   order_index.apply(notes_store, note)
+   usage_index.apply(notes_store, note)
+   duplicate_index.apply(notes_store, note)
+   share_index.apply(notes_store, note)
+
+def no_store(response):
+   response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+   response.headers['Pragma'] = 'no-cache'
+   response.headers['Expires'] = '0'
+   return response
+
+def render_note_card(note):
+   return render_template('_note_card.html', note=note)
+
+def publish_note_event(event_type, note):
+   # To the owner's feed, also when a user the note is shared with made the change
+   username = note.username
+   if not events.has_subscribers(username):
+       return
+   payload = {"note": sync.change_record(note)}
+   if event_type != 'deleted':
+       payload["html"] = render_note_card(note)
+   events.publish(username, event_type, payload)
+
+def find_duplicates(note):
+   # The user's other notes that look like copies of this one, from band lookups rather than a scan
+   if not is_owner(note):
+       # Someone else's note shared with us: their other notes are none of our business
+       return []
+   return [{"id": other.id, "title": other.title, "kind": kind}
+           for other, kind, _ in duplicate_index.similar(notes_store, note)[:MAX_DUPLICATES_SHOWN]]
+
+def duplicate_warning(message, duplicates):
+   if not duplicates:
+       return message
+   more = f" and {len(duplicates) - 1} other note(s)" if len(duplicates) > 1 else ""
+   return f"{message} It looks like a copy of “{duplicates[0]['title']}”{more}."
+
+def shared_record(note, permission, content=True):
+   # Other grantees are the owner's business
+   data = note.to_dict(content)
+   data.pop("shares", None)
+   data["seq"] = note.seq
+   data["permission"] = permission
+   return data
+
+def is_owner(note):
+   return note.username == session['username']
+
+def note_record(note, content=True):
+   # The note as the signed-in user may see it: only the owner gets its shares
+   if not is_owner(note):
+       return shared_record(note, share_index.permission(session['username'], note.id), content)
+   return sync.change_record(note) if content else note.to_dict(content=False)
+
+def note_result(event_type, note, message, category, duplicates=None):
+   if duplicates:
+       message, category = duplicate_warning(message, duplicates), "info"
+   if wants_json():
+       payload = {"success": True, "event": event_type, "note": note_record(note), "msg": message, "category": category}
+       # The card lists the shares, and a grantee's page has no card for the note anyway
+       if event_type != 'deleted' and is_owner(note):
+           payload["html"] = render_note_card(note)
+       if duplicates is not None:
+           payload["duplicates"] = duplicates
+       return no_store(jsonify(payload))
+   flash(message, category)
+   return no_store(redirect(url_for('main.home')))
+
+def note_error(message, status, endpoint='main.home', **values):
+   if wants_json():
+       return jsonify({"success": False, "msg": message}), status
+   flash(message, "error")
+   return no_store(redirect(url_for(endpoint, **values)))
+
+def is_stale(note, base_seq):
+   return base_seq is not None and note.seq != base_seq
+
+def conflict_response(note):
+   if wants_json():
+       payload = {"success": False, "msg": "Note was changed elsewhere.", "note": note_record(note)}
+       if is_owner(note):
+           payload["html"] = render_note_card(note)
+       return jsonify(payload), 409
+   flash("This note was changed in another tab or device. Review it and try again.", "error")
+   return redirect(url_for('main.home'))
+
+def find_note_index(notes, note_id):
+   username = session['username']
+   return next((i for i, n in enumerate(notes) if n.id == note_id and n.username == username and not n.is_tombstone), None)
+
+def find_note(notes, note_id):
+   idx = find_note_index(notes, note_id)
+   return notes[idx] if idx is not None else None
+
+def find_shared(note_id, need):
+   # A note another user shared with this one, if the grant covers need: an index lookup, not a scan.
+   # Under notes_store.lock after load() it is the same object as in the loaded list: callers that save hold the lock across both.
+   share_index.ensure(notes_store)
+   return share_index.note(session['username'], note_id, need)
+
+@main.route('/events')
+@login_required
+def note_events():
+   username = session['username']
+   q = events.subscribe(username)
+   response = Response(stream_with_context(events.stream(username, q)), mimetype='text/event-stream')
+   response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+   response.headers['X-Accel-Buffering'] = 'no'
+   return response
+
+def home_pager(arg, page, total):
+   # Previous/next links for one of the home page's lists, keeping every other query arg
+   args = request.args.to_dict(flat=False)
+   pages = max(1, -(-total // HOME_PAGE_SIZE))
+   def link(n):
+       return url_for('main.home', **dict(args, **{arg: n}))
+   return {"page": page, "pages": pages, "total": total,
+           "prev": link(page - 1) if page > 1 else None, "next": link(page + 1) if page < pages else None}
+
 @main.route('/home')
 @login_required
 def home():
    username = session['username']
-   notes = load_data(NOTES_FILE)
-   
-   active_notes = []
-   archived_notes = []
-   
-   for note in notes:
-       if isinstance(note, dict):
-           if note.get('username') == username:
-               if note.get('status') == 'active':
-                   active_notes.append(note)
-               elif note.get('status') == 'archived':
-                   archived_notes.append(note)
-   
+   tags, mode = parse_filter(request.args)
+   sort, desc, start, end = parse_order(request.args)
+   pages = {status: max(request.args.get(arg, 1, type=int), 1) for status, arg in (('active', 'page'), ('archived', 'archived_page'))}
+   tag_index.ensure(notes_store)
+   usage_index.ensure(notes_store)
+   share_index.ensure(notes_store)
+   lists = {}
+   if tags:
+       # Answered from the tag sets; only the matching notes are touched
+       matched = tag_index.notes(username, tags, mode)
+       for status, page in pages.items():
+           ordered = sort_notes([n for n in matched if n.status == status], sort, desc, start, end)
+           lists[status] = ordered[(page - 1) * HOME_PAGE_SIZE:page * HOME_PAGE_SIZE], len(ordered)
+   else:
+       # One page per list straight from the ordering index: the page, not the user's whole history
+       order_index.ensure(notes_store)
+       for status, page in pages.items():
+           lists[status] = order_index.page(username, (status,), sort, desc, start, end, (page - 1) * HOME_PAGE_SIZE, HOME_PAGE_SIZE)
+   (active_notes, active_total), (archived_notes, archived_total) = lists['active'], lists['archived']
+
    # Add cache control headers to prevent back button access after logout
-   response = make_response(render_template('home.html', active_notes=active_notes, archived_notes=archived_notes))
+   response = make_response(render_template('home.html', active_notes=active_notes, archived_notes=archived_notes,
+                                            active_pager=home_pager('page', pages['active'], active_total),
+                                            archived_pager=home_pager('archived_page', pages['archived'], archived_total),
+                                            tag_counts=tag_index.counts(username), tag_filter=tags, tag_mode=mode,
+                                            usage=usage_summary(username), shared_notes=share_index.shared_with(username),
+                                            sort=sort, order='desc' if desc else 'asc',
+                                            date_from=request.args.get('from', ''), date_to=request.args.get('to', '')))
    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
    response.headers['Pragma'] = 'no-cache'
    response.headers['Expires'] = '0'
    return response
 
+@main.route('/home/shell')
+def home_shell():
+   # The page the service worker shows offline: home.html without a single note or user detail,
+   # so a cached copy can never show anyone's data. The notes are drawn from IndexedDB.
+   empty = home_pager('page', 1, 0)
+   return no_store(make_response(render_template('home.html', shell=True, active_notes=(), archived_notes=(),
+                                                 active_pager=empty, archived_pager=empty, tag_counts={}, tag_filter=(),
+                                                 tag_mode='and', sort='created', order='asc', date_from='', date_to='')))
+
 @main.route('/add_note', methods=['POST'])
 @login_required
 def add_note():
-   if not request.form:
-       flash("Invalid request.", "error")
-       return redirect(url_for('main.home'))
-   title = request.form.get('title','').strip()
-   content = request.form.get('content','').strip()
-   if not title:
-       flash("Title is required.", "error")
-       return redirect(url_for('main.home'))
-   notes = load_data(NOTES_FILE)
-   new_id = max((n.get('id',0) for n in notes if isinstance(n, dict)), default=0) + 1
-   note = {
-       "id": new_id,
-       "username": session['username'],
-       "title": title,
-       "content": content,
-       "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-       "status": "active"
-   }
-   notes.append(note)
+   if not request.form and not request.is_json:
+       return note_error("Invalid request.", 400)
    try:
-       atomic_save(NOTES_FILE, notes)
-   except Exception:
-       current_app.logger.exception("Failed to save note")
-       flash("Failed to save note.", "error")
-       return redirect(url_for('main.home'))
-   flash("Note added.", "success")
-   
-   # Add cache control for redirect
-   response = redirect(url_for('main.home'))
-   response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-   response.headers['Pragma'] = 'no-cache'
-   response.headers['Expires'] = '0'
-   return response
+       title, content, tags, _ = note_form()
+   except InvalidNote as e:
+       return note_error(str(e), 400)
+   if not title:
+       return note_error("Title is required.", 400)
+   with notes_store.lock:
+       usage_index.ensure(notes_store)
+       error = quota_error(session['username'], 1, len(title.encode('utf-8')) + len(content.encode('utf-8')))
+       if error:
+           return note_error(error, 403)
+       notes = list(notes_store.load())
+       new_id = notes_store.max_id() + 1
+       note = Note(new_id, session['username'], title, content, 'active', updated_at=now_epoch(), tags=tags or ())
+       sync.stamp(note, notes, session['username'])
+       notes.append(note)
+       try:
+           notes_store.save(notes)
+       except Exception:
+           current_app.logger.exception("Failed to save note")
+           return note_error("Failed to save note.", 500)
+       index_note(note)
+   # The note is saved: its autosaved draft has been promoted
+   drop_draft('new')
+   stats.note_event('added', note.username, None, note.status)
+   publish_note_event('added', note)
+   return note_result('added', note, "Note added.", "success", find_duplicates(note))
 
 @main.route('/edit_note/<int:note_id>', methods=['GET','POST'])
 @login_required
 def edit_note(note_id):
-   notes = load_data(NOTES_FILE)
-   note = next((n for n in notes if isinstance(n, dict) and n.get('id') == note_id and n.get('username') == session['username']), None)
-   if not note:
-       flash("Note not found.", "error")
-       return redirect(url_for('main.home'))
    if request.method == 'POST':
-       title = request.form.get('title','').strip()
-       content = request.form.get('content','').strip()
-       if not title:
-           flash("Title required.", "error")
-           return redirect(url_for('main.edit_note', note_id=note_id))
-       note['title'] = title
-       note['content'] = content
-       note['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
        try:
-           atomic_save(NOTES_FILE, notes)
-       except Exception:
-           current_app.logger.exception("Failed saving notes")
-           flash("Failed to save changes.", "error")
-           return redirect(url_for('main.edit_note', note_id=note_id))
-       flash("Note updated.", "success")
-       
-       # Add cache control for redirect
-       response = redirect(url_for('main.home'))
-       response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-       response.headers['Pragma'] = 'no-cache'
-       response.headers['Expires'] = '0'
-       return response
-   
-   active_notes = [n for n in notes if isinstance(n, dict) and n.get('username') == session['username'] and n.get('status') == 'active']
-   archived_notes = [n for n in notes if isinstance(n, dict) and n.get('username') == session['username'] and n.get('status') == 'archived']
+           title, content, tags, base_seq = note_form()
+       except InvalidNote as e:
+           return note_error(str(e), 400, 'main.edit_note', note_id=note_id)
+       with notes_store.lock:
+           notes = notes_store.load()
+           note = find_note(notes, note_id) or find_shared(note_id, 'edit')
+           if not note:
+               return note_error("Note not found.", 404)
+           if is_stale(note, base_seq):
+               return conflict_response(note)
+           if not title:
+               return note_error("Title required.", 400, 'main.edit_note', note_id=note_id)
+           usage_index.ensure(notes_store)
+           grown = len(title.encode('utf-8')) + len(content.encode('utf-8')) + sum(a['size'] for a in note.attachments) - note_bytes(note)
+           # Counted against the owner, whoever edits
+           error = quota_error(note.username, 0, grown)
+           if error:
+               return note_error(error, 403, 'main.edit_note', note_id=note_id)
+           note.title = title
+           note.content = content
+           if tags is not None:
+               note.tags = tags
+           note.touch()
+           sync.stamp(note, notes, note.username)
+           try:
+               notes_store.save(notes)
+           except Exception:
+               current_app.logger.exception("Failed saving notes")
+               return note_error("Failed to save changes.", 500, 'main.edit_note', note_id=note_id)
+           index_note(note)
+       drop_draft(str(note_id))
+       stats.note_event('edited', note.username, note.status, note.status)
+       publish_note_event('edited', note)
+       return note_result('edited', note, "Note updated.", "success", find_duplicates(note))
+
+   with notes_store.lock:
+       note = find_note(notes_store.load(), note_id) or find_shared(note_id, 'edit')
+   if not note:
+       return note_error("Note not found.", 404)
+
+   # The edit form only needs this one note; skip rendering the whole list
+   if wants_json():
+       return no_store(jsonify({"success": True, "note": note_record(note)}))
+
+   order_index.ensure(notes_store)
+   active_notes, active_total = order_index.page(session['username'], ('active',), limit=HOME_PAGE_SIZE)
+   archived_notes, archived_total = order_index.page(session['username'], ('archived',), limit=HOME_PAGE_SIZE)
    
    # Add cache control for GET request
-   response = make_response(render_template('home.html', active_notes=active_notes, archived_notes=archived_notes, edit_note=note))
-   response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-   response.headers['Pragma'] = 'no-cache'
-   response.headers['Expires'] = '0'
-   return response
-
-@main.route('/delete_note/<int:note_id>')
+   tag_index.ensure(notes_store)
+   response = make_response(render_template('home.html', active_notes=active_notes, archived_notes=archived_notes, edit_note=note,
+                                            active_pager=home_pager('page', 1, active_total),
+                                            archived_pager=home_pager('archived_page', 1, archived_total),
+                                            tag_counts=tag_index.counts(session['username']), tag_filter=(), tag_mode='and',
+                                            sort='created', order='asc', date_from='', date_to=''))
+   return no_store(response)
+
+@main.route('/patch_note/<int:note_id>', methods=['POST'])
 @login_required
-def delete_note(note_id):
-   notes = load_data(NOTES_FILE)
-   changed = False
-   for n in notes:
-       if isinstance(n, dict) and n.get('id') == note_id and n.get('username') == session['username']:
-           n['status'] = 'archived'
-           changed = True
-   if changed:
+def patch_note(note_id):
+   # JSON {"base_seq", "length", "patches": [[start, end, text], ...], "title"?, "tags"?}: only the
+   # changed ranges of the content travel, as code point offsets into the version at base_seq
+   data = request.get_json(silent=True)
+   if not isinstance(data, dict):
+       return note_error("Invalid request.", 400)
+   base_seq, length = data.get('base_seq'), data.get('length')
+   if not isinstance(base_seq, int) or isinstance(base_seq, bool):
+       return note_error("base_seq is required.", 400)
+   if length is not None and (not isinstance(length, int) or isinstance(length, bool)):
+       return note_error("Invalid request.", 400)
+   title = str(data['title']).strip() if data.get('title') is not None else None
+   if title == '':
+       return note_error("Title required.", 400)
+   try:
+       patches = parse_patches(data.get('patches'))
+       tags = parse_tags(data['tags']) if 'tags' in data else None
+   except InvalidNote as e:
+       return note_error(str(e), 400)
+   with notes_store.lock:
+       notes = notes_store.load()
+       note = find_note(notes, note_id) or find_shared(note_id, 'edit')
+       if not note:
+           return note_error("Note not found.", 404)
+       if is_stale(note, base_seq):
+           return conflict_response(note)
+       try:
+           content = apply_patches(note.content, patches, length)
+       except PatchError as e:
+           # Same version but the patch does not fit it: the client resends the whole note
+           return note_error(str(e), 422)
+       usage_index.ensure(notes_store)
+       new_title = note.title if title is None else title
+       grown = len(new_title.encode('utf-8')) + len(content.encode('utf-8')) + sum(a['size'] for a in note.attachments) - note_bytes(note)
+       error = quota_error(note.username, 0, grown)
+       if error:
+           return note_error(error, 403)
+       note.content = content
+       if title is not None:
+           note.title = title
+       if tags is not None:
+           note.tags = tags
+       note.touch()
+       sync.stamp(note, notes, note.username)
+       try:
+           notes_store.save(notes)
+       except Exception:
+           current_app.logger.exception("Failed saving notes")
+           return note_error("Failed to save changes.", 500)
+       index_note(note)
+   drop_draft(str(note_id))
+   stats.note_event('edited', note.username, note.status, note.status)
+   publish_note_event('edited', note)
+   duplicates = find_duplicates(note)
+   # The client already has the content it patched; answer without echoing it back
+   payload = {"success": True, "event": "edited", "note": note_record(note, content=False),
+              "msg": duplicate_warning("Note updated.", duplicates), "category": "info" if duplicates else "success",
+              "duplicates": duplicates}
+   if is_owner(note):
+       payload["html"] = render_note_card(note)
+   return no_store(jsonify(payload))
+
+def set_note_status(note_id, status, event_type, message, category, failure):
+   with notes_store.lock:
+       notes = notes_store.load()
+       note = find_note(notes, note_id)
+       if not note:
+           return note_error("Note not found.", 404)
+       if is_stale(note, request.args.get('base_seq', type=int)):
+           return conflict_response(note)
+       previous = note.status
+       note.status = status
+       sync.stamp(note, notes, session['username'])
+       try:
+           notes_store.save(notes)
+       except Exception:
+           current_app.logger.exception(failure)
+           return note_error(failure + ".", 500)
+       index_note(note)
+   stats.note_event(event_type, note.username, previous, status)
+   publish_note_event(event_type, note)
+   return note_result(event_type, note, message, category)
+
+@main.route('/pin_note/<int:note_id>')
+@login_required
+def pin_note(note_id):
+   with notes_store.lock:
+       notes = notes_store.load()
+       note = find_note(notes, note_id)
+       if not note:
+           return note_error("Note not found.", 404)
+       if is_stale(note, request.args.get('base_seq', type=int)):
+           return conflict_response(note)
+       note.pinned = not note.pinned
+       sync.stamp(note, notes, session['username'])
        try:
-           atomic_save(NOTES_FILE, notes)
+           notes_store.save(notes)
        except Exception:
-           current_app.logger.exception("Failed to archive note")
-           flash("Failed to archive note.", "error")
-           return redirect(url_for('main.home'))
-       flash("Note archived.", "info")
+           current_app.logger.exception("Failed to pin note")
+           return note_error("Failed to pin note.", 500)
+       index_note(note)
+   publish_note_event('edited', note)
+   return note_result('edited', note, "Note pinned." if note.pinned else "Note unpinned.", "info")
+
+def attachment_store():
+   return current_app.extensions['attachments']
+
+@main.route('/add_attachment/<int:note_id>', methods=['POST'])
+@login_required
+def add_attachment(note_id):
+   # Either a multipart form with a "file" field, or the raw file as the request body
+   # (name in ?name=). Both are copied to the store in chunks, never held in memory whole.
+   store = attachment_store()
+   if request.content_length is not None and request.content_length > store.max_bytes + 64 * 1024:
+       return note_error(f"Attachments are limited to {store.max_bytes // (1024 * 1024)} MB.", 413)
+   usage_index.ensure(notes_store)
+   error = quota_error(session['username'], 0, request.content_length or 0)
+   if error:
+       return note_error(error, 403)
+   if request.mimetype == 'multipart/form-data':
+       upload = request.files.get('file')
+       if not upload or not upload.filename:
+           return note_error("Choose a file to attach.", 400)
+       name, mimetype, stream = upload.filename, upload.mimetype, upload.stream
    else:
-       flash("Note not found.", "error")
-   
-   # Add cache control for redirect
-   response = redirect(url_for('main.home'))
-   response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-   response.headers['Pragma'] = 'no-cache'
-   response.headers['Expires'] = '0'
+       name = request.args.get('name', '')
+       mimetype, stream = request.mimetype, request.stream
+   if mimetype in ('', 'application/octet-stream', 'application/x-www-form-urlencoded'):
+       mimetype = None
+   try:
+       # Outside the notes lock: a slow upload must not hold up everyone else's saves
+       sha, size = store.put_stream(stream)
+   except TooLarge as e:
+       return note_error(str(e).capitalize() + ".", 413)
+   except OSError:
+       current_app.logger.exception("Failed to store attachment")
+       return note_error("Failed to store attachment.", 500)
+   # The upload holds one reference; it is handed to the note or given back
+   with notes_store.lock:
+       notes = notes_store.load()
+       note = find_note(notes, note_id)
+       if not note:
+           store.decref(sha)
+           return note_error("Note not found.", 404)
+       if any(a['sha256'] == sha for a in note.attachments):
+           store.decref(sha)
+           return note_error("This file is already attached.", 409)
+       if len(note.attachments) >= MAX_PER_NOTE:
+           store.decref(sha)
+           return note_error(f"At most {MAX_PER_NOTE} attachments per note.", 400)
+       usage_index.ensure(notes_store)
+       error = quota_error(session['username'], 0, size)
+       if error:
+           store.decref(sha)
+           return note_error(error, 403)
+       note.attachments = note.attachments + (attachment_record(sha, size, name, mimetype),)
+       note.touch()
+       sync.stamp(note, notes, session['username'])
+       try:
+           notes_store.save(notes)
+       except Exception:
+           store.decref(sha)
+           current_app.logger.exception("Failed to attach file")
+           return note_error("Failed to attach file.", 500)
+       index_note(note)
+   publish_note_event('edited', note)
+   return note_result('edited', note, "File attached.", "success")
+
+@main.route('/attachment/<int:note_id>/<sha>')
+@login_required
+def download_attachment(note_id, sha):
+   with notes_store.lock:
+       note = find_note(notes_store.load(), note_id) or find_shared(note_id, 'read')
+   attachment = next((a for a in note.attachments if a['sha256'] == sha), None) if note else None
+   if not attachment:
+       return note_error("Attachment not found.", 404)
+   try:
+       path = attachment_store().path(sha)
+   except AttachmentError:
+       return note_error("Attachment not found.", 404)
+   # send_file answers Range and conditional requests and hands the open file to the
+   # server's file wrapper (sendfile where available); the content never changes, so the hash is the ETag
+   try:
+       response = send_file(path, mimetype=attachment['type'], as_attachment=True, download_name=attachment['name'],
+                            conditional=True, etag=sha, max_age=0)
+   except FileNotFoundError:
+       current_app.logger.error("Attachment %s of note %s is missing", sha, note_id)
+       return note_error("Attachment not found.", 404)
+   response.headers['Cache-Control'] = 'private, no-cache'
    return response
 
-@main.route('/restore_note/<int:note_id>')
+@main.route('/remove_attachment/<int:note_id>/<sha>')
 @login_required
-def restore_note(note_id):
-   notes = load_data(NOTES_FILE)
-   changed = False
-   for n in notes:
-       if isinstance(n, dict) and n.get('id') == note_id and n.get('username') == session['username']:
-           n['status'] = 'active'
-           changed = True
-   if changed:
+def remove_attachment(note_id, sha):
+   with notes_store.lock:
+       notes = notes_store.load()
+       note = find_note(notes, note_id)
+       if not note or not any(a['sha256'] == sha for a in note.attachments):
+           return note_error("Attachment not found.", 404)
+       if is_stale(note, request.args.get('base_seq', type=int)):
+           return conflict_response(note)
+       note.attachments = tuple(a for a in note.attachments if a['sha256'] != sha)
+       note.touch()
+       sync.stamp(note, notes, session['username'])
        try:
-           atomic_save(NOTES_FILE, notes)
+           notes_store.save(notes)
        except Exception:
-           current_app.logger.exception("Failed to restore note")
-           flash("Failed to restore note.", "error")
-           return redirect(url_for('main.home'))
-       flash("Note restored.", "success")
-   else:
-       flash("Note not found.", "error")
-   
-   # Add cache control for redirect
-   response = redirect(url_for('main.home'))
-   response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-   response.headers['Pragma'] = 'no-cache'
-   response.headers['Expires'] = '0'
-   return response
+           current_app.logger.exception("Failed to remove attachment")
+           return note_error("Failed to remove attachment.", 500)
+       index_note(note)
+   # Only once no saved note points at it any more
+   attachment_store().decref(sha)
+   publish_note_event('edited', note)
+   return note_result('edited', note, "Attachment removed.", "info")
+
+def change_share(note_id, grantee, permission, message):
+   # Owner only; permission None takes the grant away
+   with notes_store.lock:
+       notes = notes_store.load()
+       note = find_note(notes, note_id)
+       if not note or note.status != 'active':
+           return note_error("Note not found.", 404)
+       if is_stale(note, request.args.get('base_seq', type=int)):
+           return conflict_response(note)
+       try:
+           shares = set_share(note.shares, grantee, permission)
+       except ShareError as e:
+           return note_error(str(e), 400)
+       if shares == note.shares:
+           return note_result('edited', note, message, "info")
+       note.shares = shares
+       sync.stamp(note, notes, session['username'])
+       try:
+           notes_store.save(notes)
+       except Exception:
+           current_app.logger.exception("Failed to update sharing")
+           return note_error("Failed to update sharing.", 500)
+       index_note(note)
+   publish_note_event('edited', note)
+   return note_result('edited', note, message, "success")
+
+@main.route('/share_note/<int:note_id>', methods=['POST'])
+@login_required
+def share_note(note_id):
+   grantee = (request.form.get('username') or '').strip()
+   permission = request.form.get('permission', 'read')
+   if not grantee:
+       return note_error("Username is required.", 400)
+   if grantee == session['username']:
+       return note_error("You cannot share a note with yourself.", 400)
+   if not users_store.get(grantee):
+       return note_error("User not found.", 404)
+   return change_share(note_id, grantee, permission, f"Note shared with {grantee} ({permission}).")
+
+@main.route('/unshare_note/<int:note_id>/<grantee>')
+@login_required
+def unshare_note(note_id, grantee):
+   return change_share(note_id, grantee, None, f"Stopped sharing with {grantee}.")
+
+@main.route('/shared/<int:note_id>')
+@login_required
+def shared_note(note_id):
+   note = find_shared(note_id, 'read')
+   if not note:
+       return note_error("Note not found.", 404)
+   permission = share_index.permission(session['username'], note_id)
+   if wants_json():
+       return no_store(jsonify({"success": True, "note": shared_record(note, permission)}))
+   return no_store(make_response(render_template('shared_note.html', note=note, permission=permission)))
+
+@main.route('/delete_note/<int:note_id>')
+@login_required
+def delete_note(note_id):
+   return set_note_status(note_id, 'archived', 'archived', "Note archived.", "info", "Failed to archive note")
+
+@main.route('/restore_note/<int:note_id>')
+@login_required
+def restore_note(note_id):
+   return set_note_status(note_id, 'active', 'restored', "Note restored.", "success", "Failed to restore note")
 
 @main.route('/permanent_delete/<int:note_id>')
 @login_required
 def permanent_delete(note_id):
-   notes = load_data(NOTES_FILE)
-   new_notes = [n for n in notes if not (isinstance(n, dict) and n.get('id') == note_id and n.get('username') == session['username'])]
-   if len(new_notes) < len(notes):
+   with notes_store.lock:
+       notes = list(notes_store.load())
+       idx = find_note_index(notes, note_id)
+       if idx is None:
+           return note_error("Note not found.", 404)
+       if is_stale(notes[idx], request.args.get('base_seq', type=int)):
+           return conflict_response(notes[idx])
+       # Keep a tombstone so delta sync clients learn about the delete
+       attachments, previous = notes[idx].attachments, notes[idx].status
+       tombstone = sync.make_tombstone(notes[idx], sync.next_seq(notes, session['username']))
+       notes[idx] = tombstone
        try:
-           atomic_save(NOTES_FILE, new_notes)
+           notes_store.save(notes)
        except Exception:
            current_app.logger.exception("Failed deleting note")
-           flash("Failed to delete note.", "error")
-           return redirect(url_for('main.home'))
-       flash("Note permanently deleted.", "error")
-   else:
-       flash("Note not found.", "error")
-   
-   # Add cache control for redirect
-   response = redirect(url_for('main.home'))
+           return note_error("Failed to delete note.", 500)
+       index_note(tombstone)
+   for attachment in attachments:
+       attachment_store().decref(attachment['sha256'])
+   drop_draft(str(note_id))
+   stats.note_event('deleted', tombstone.username, previous, tombstone.status)
+   publish_note_event('deleted', tombstone)
+   return note_result('deleted', tombstone, "Note permanently deleted.", "error")
+
+@main.route('/api/notes/changes')
+@api_login_required
+def note_changes():
+   since = request.args.get('since', type=int)
+   limit = min(max(request.args.get('limit', sync.DEFAULT_PAGE_SIZE, type=int), 1), sync.MAX_PAGE_SIZE)
+   sync.seq_index.ensure(notes_store)
+   changes, latest, has_more = sync.seq_index.changes_since(session['username'], since, limit)
+   response = jsonify({
+       "success": True,
+       "changes": changes,
+       "latest": latest,
+       "next": changes[-1]['seq'] if changes else since,
+       "has_more": has_more
+   })
    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-   response.headers['Pragma'] = 'no-cache'
-   response.headers['Expires'] = '0'
    return response
 
+@main.route('/api/notes')
+@api_login_required
+def list_notes():
+   username = session['username']
+   tags, mode = parse_filter(request.args)
+   sort, desc, start, end = parse_order(request.args)
+   status = request.args.get('status')
+   statuses = (status,) if status else ('active', 'archived')
+   offset = max(request.args.get('offset', 0, type=int), 0)
+   limit = request.args.get('limit', type=int)
+   if limit is not None:
+       limit = min(max(limit, 1), sync.MAX_PAGE_SIZE)
+   tag_index.ensure(notes_store)
+   if tags:
+       matched = tag_index.notes(username, tags, mode)
+       ordered = [n for st in statuses for n in sort_notes([n for n in matched if n.status == st], sort, desc, start, end)]
+       total = len(ordered)
+       notes = ordered[offset:offset + limit if limit is not None else None]
+   else:
+       order_index.ensure(notes_store)
+       notes, total = order_index.page(username, statuses, sort, desc, start, end, offset, limit)
+   return no_store(jsonify({"success": True, "notes": [n.to_dict() for n in notes], "tags": list(tags), "mode": mode,
+                            "sort": sort, "order": 'desc' if desc else 'asc', "total": total,
+                            "next_offset": offset + len(notes) if offset + len(notes) < total else None}))
+
+@main.route('/api/notes/shared')
+@api_login_required
+def list_shared_notes():
+   share_index.ensure(notes_store)
+   return no_store(jsonify({"success": True, "notes": [shared_record(n, p) for n, p in share_index.shared_with(session['username'])]}))
+
+@main.route('/api/drafts')
+@api_login_required
+def list_drafts():
+   return no_store(jsonify({"success": True, "drafts": current_app.extensions['drafts'].all(session['username'])}))
+
+@main.route('/api/drafts/<key>', methods=['PUT', 'POST', 'DELETE'])
+@api_login_required
+def save_draft(key):
+   # Autosave target: memory only, written out by the draft flusher. POST is for sendBeacon on page hide.
+   drafts = current_app.extensions['drafts']
+   if request.method == 'DELETE':
+       drafts.discard(session['username'], key)
+       return no_store(jsonify({"success": True}))
+   try:
+       kept = drafts.put(session['username'], key, parse_draft(request.get_json(silent=True)))
+   except DraftError as e:
+       return jsonify({"success": False, "msg": str(e)}), 400
+   return no_store(jsonify({"success": True, "stale": not kept}))
+
+@main.route('/api/usage')
+@api_login_required
+def note_usage():
+   usage_index.ensure(notes_store)
+   return no_store(jsonify({"success": True, "usage": usage_summary(session['username'])}))
+
+@main.route('/duplicates')
+@login_required
+def duplicates():
+   groups = duplicate_index.groups(notes_store, session['username'])
+   return no_store(make_response(render_template('duplicates.html', groups=groups)))
+
+@main.route('/api/duplicates')
+@api_login_required
+def duplicate_groups():
+   groups = duplicate_index.groups(notes_store, session['username'])
+   return no_store(jsonify({"success": True, "groups": [[{"id": n.id, "title": n.title, "status": n.status} for n in group] for group in groups]}))
+
+@main.route('/api/tags')
+@api_login_required
+def tag_counts():
+   tag_index.ensure(notes_store)
+   return no_store(jsonify({"success": True, "tags": tag_index.counts(session['username'])}))
+
 @main.route('/profile', methods=['GET','POST'])
 @login_required
 def profile():
-    users = load_data(USERS_FILE)
     username = session['username']
-    user = next((u for u in users if isinstance(u, dict) and u.get('username') == username), None)
+    user = users_store.get(username)
     if not user:
         flash("User not found.", "error")
         return redirect(url_for('auth.logout'))
@@ -329,12 +809,12 @@ def profile():
             flash("Invalid email format.", "error")
             return render_template('profile.html', user=user)
 
-        users = load_data(USERS_FILE)
-        if any(u.get('email') == email and u.get('username') != username for u in users):
+        users = users_store.load()
+        if any(u['email'] == email and u['username'] != username for u in users):
             flash("Email already registered by another user.", "error")
             return render_template('profile.html', user=user)
 
-        if any(u.get('contact') == contact and u.get('username') != username for u in users):
+        if any(u['contact'] == contact and u['username'] != username for u in users):
             flash("Contact number already registered by another user.", "error")
             return render_template('profile.html', user=user)
 
@@ -376,17 +856,20 @@ def verify_profile_update():
 
     if not existing_session:
         otp = gen_otp()
+        # The code goes to the address on file, not the one being changed to
+        user = users_store.get(username) or {}
         new_session = {
             "username": username,
             "otp": otp,
             "expires_at": (datetime.utcnow() + timedelta(minutes=3)).isoformat(),
             "sent_at": datetime.utcnow().isoformat(),
             "time_consumed": "0:00",
-            "purpose": "profile_update"
+            "purpose": "profile_update",
+            "delivery_id": otp_delivery.send_otp(username, user.get('email'), otp, "profile_update")
         }
         save_otp_session(username, new_session)
         existing_session = new_session
-        flash(f"OTP sent for verification: {otp} (Expires in 3 minutes)", "info")
+        flash("OTP sent to the email on your account (Expires in 3 minutes)", "info")
 
     expires_at = existing_session["expires_at"]
     current_time = datetime.utcnow().isoformat()
@@ -409,7 +892,6 @@ def verify_profile_update():
     existing_session["time_consumed"] = time_consumed
     save_otp_session(username, existing_session)
     
-    otp_display = existing_session["otp"]
     minutes = remaining_seconds // 60
     seconds = remaining_seconds % 60
     time_remaining = f"{minutes}:{seconds:02d}"
@@ -428,23 +910,26 @@ def verify_profile_update():
             flash("OTP is required.", "error")
             return render_template('verify_profile_update.html',
                                 current_username=username,
-                                otp_display=otp_display,
                                 time_remaining=time_remaining,
                                 time_consumed=time_consumed)
         
         if otp_entered != existing_session["otp"]:
+            if state.hit(state.key("otp_failures", username), OTP_LIFETIME_SECONDS) >= OTP_ATTEMPT_LIMIT:
+                delete_otp_session(username)
+                session.pop('profile_update_data', None)
+                flash("Too many incorrect attempts. Please try updating your profile again.", "error")
+                return redirect(url_for('main.profile'))
             flash("Incorrect OTP. Please try again.", "error")
             return render_template('verify_profile_update.html',
                                 current_username=username,
-                                otp_display=otp_display,
                                 time_remaining=time_remaining,
                                 time_consumed=time_consumed)
 
-        users = load_data(USERS_FILE)
+        users = users_store.load()
         user_updated = False
         
         for user in users:
-            if isinstance(user, dict) and user.get('username') == username:
+            if user['username'] == username:
                 user.update({
                     "first_name": profile_data['first_name'],
                     "middle_name": profile_data['middle_name'],
@@ -465,7 +950,7 @@ def verify_profile_update():
 
         if user_updated:
             try:
-                atomic_save(USERS_FILE, users)
+                users_store.save(users)
                 session['display_name'] = profile_data['first_name']
                 delete_otp_session(username)
                 session.pop('profile_update_data', None)
@@ -483,7 +968,6 @@ def verify_profile_update():
                 flash("Failed to save profile changes. Please try again.", "error")
                 return render_template('verify_profile_update.html',
                                     current_username=username,
-                                    otp_display=otp_display,
                                     time_remaining=time_remaining,
                                     time_consumed=time_consumed)
         else:
@@ -493,7 +977,6 @@ def verify_profile_update():
     # Add cache control for GET request
     response = make_response(render_template('verify_profile_update.html',
                          current_username=username,
-                         otp_display=otp_display,
                          time_remaining=time_remaining,
                          time_consumed=time_consumed))
     response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
@@ -0,0 +1,262 @@
+# models.py
+import re
+import sys
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+STATUSES = {sys.intern(s): sys.intern(s) for s in ('active', 'archived', 'deleted')}
+KNOWN_KEYS = frozenset(('id', 'username', 'title', 'content', 'body', 'timestamp', 'status', 'seq', 'deleted_at', 'tags',
+                        'created_at', 'updated_at', 'pinned', 'attachments', 'shares'))
+PREVIEW_CHARS = 200
+MAX_TAGS = 10
+MAX_SHARES = 50
+PERMISSIONS = ('read', 'edit')
+TAG_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,31}$')
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+USER_TEXT_FIELDS = ('display_username', 'first_name', 'middle_name', 'last_name', 'dob', 'contact', 'province',
+                    'city', 'barangay', 'zipcode', 'street', 'email')
+
+class InvalidRecord(ValueError):
+    pass
+
+class InvalidNote(InvalidRecord):
+    pass
+
+class InvalidUser(InvalidRecord):
+    pass
+
+def parse_timestamp(value):
+    if value is None or value == '':
+        return 0
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    try:
+        # fromisoformat is an order of magnitude faster than strptime; the length
+        # check keeps it to exactly TIMESTAMP_FORMAT
+        if len(value) != 19:
+            raise ValueError(value)
+        return int(datetime.fromisoformat(value).timestamp())
+    except (TypeError, ValueError):
+        raise InvalidNote(f"bad timestamp {value!r}")
+
+def format_timestamp(epoch):
+    return datetime.fromtimestamp(epoch).isoformat(' ') if epoch else ''
+
+def now_epoch():
+    return int(datetime.now().timestamp())
+
+def parse_tags(value):
+    # "Work, #todo  ideas" or a list -> ('ideas', 'todo', 'work'); raises InvalidNote on bad input
+    if value is None or value == '':
+        return ()
+    if isinstance(value, str):
+        value = re.split(r'[,\s]+', value)
+    if not isinstance(value, (list, tuple)):
+        raise InvalidNote("tags must be a list or a comma separated string")
+    tags = set()
+    for tag in value:
+        if not isinstance(tag, str):
+            raise InvalidNote(f"bad tag {tag!r}")
+        tag = tag.strip().lstrip('#').lower()
+        if not tag:
+            continue
+        if not TAG_RE.match(tag):
+            raise InvalidNote(f"bad tag {tag!r}: use letters, digits, - and _ (max 32)")
+        tags.add(sys.intern(tag))
+    if len(tags) > MAX_TAGS:
+        raise InvalidNote(f"at most {MAX_TAGS} tags per note")
+    return tuple(sorted(tags))
+
+class Note:
+    # One object per note instead of a dict: no per-record key table, interned
+    # username/status, and epoch ints instead of 19-char timestamp strings.
+    # Stored bodies live in a BlobFile and are only read when asked for;
+    # _content holds a body that has not been written to the blob file yet.
+    __slots__ = ('id', 'username', 'title', '_content', 'blob', 'offset', 'length', 'status', 'seq',
+                 'created_at', 'updated_at', 'pinned', 'tags', 'attachments', 'shares', 'extra')
+
+    def __init__(self, id, username, title='', content='', status='active', seq=0, updated_at=0, extra=None, tags=(),
+                 created_at=None, pinned=False, attachments=(), shares=()):
+        self.id = id
+        self.username = sys.intern(username)
+        self.title = title
+        self._content = content
+        self.blob = None
+        self.offset = 0
+        self.length = 0
+        self.status = STATUSES[status]
+        self.seq = seq
+        self.updated_at = updated_at
+        self.created_at = updated_at if created_at is None else created_at
+        self.pinned = pinned
+        self.tags = tags
+        # ({"sha256", "name", "size", "type"}, ...): the files themselves live in the attachment store
+        self.attachments = attachments
+        # ((username, 'read' | 'edit'), ...) sorted by username: who else may open the note
+        self.shares = shares
+        self.extra = extra
+
+    @property
+    def content(self):
+        if self._content is not None:
+            return self._content
+        return self.blob.read(self.offset, self.length)
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+
+    @property
+    def preview(self):
+        if self._content is not None:
+            text, cut = self._content[:PREVIEW_CHARS], len(self._content) > PREVIEW_CHARS
+        else:
+            text, cut = self.blob.preview(self.offset, self.length)
+            if len(text) > PREVIEW_CHARS:
+                text, cut = text[:PREVIEW_CHARS], True
+        return text.rstrip() + "\u2026" if cut else text
+
+    @property
+    def is_stored(self):
+        return self._content is None
+
+    def set_body(self, blob, offset, length):
+        self.blob, self.offset, self.length = blob, offset, length
+        self._content = None
+
+    @property
+    def timestamp(self):
+        return format_timestamp(self.updated_at)
+
+    @property
+    def is_tombstone(self):
+        return self.status == 'deleted'
+
+    def touch(self):
+        self.updated_at = now_epoch()
+
+    def to_dict(self, content=True):
+        if self.is_tombstone:
+            data = {"id": self.id, "username": self.username, "status": self.status, "seq": self.seq,
+                    "deleted_at": format_timestamp(self.updated_at)}
+        else:
+            data = {"id": self.id, "username": self.username, "title": self.title,
+                    "timestamp": format_timestamp(self.updated_at), "status": self.status,
+                    "created_at": self.created_at, "updated_at": self.updated_at}
+            if content:
+                data["content"] = self.content
+            if self.pinned:
+                data["pinned"] = True
+            if self.seq:
+                data["seq"] = self.seq
+            if self.tags:
+                data["tags"] = list(self.tags)
+            if self.attachments:
+                data["attachments"] = [dict(a) for a in self.attachments]
+            if self.shares:
+                data["shares"] = dict(self.shares)
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def to_record(self):
+        # What the metadata file holds: epochs only, and the body as a [gen, offset, length] reference
+        # Stored bodies are never read back just to be dropped again
+        data = self.to_dict(content=not self.is_stored)
+        data.pop("timestamp", None)
+        if self.is_tombstone:
+            data["updated_at"] = self.updated_at
+            del data["deleted_at"]
+        elif self.is_stored:
+            data["body"] = [self.blob.gen, self.offset, self.length]
+        return data
+
+    def __repr__(self):
+        return f"Note(id={self.id!r}, username={self.username!r}, status={self.status!r}, seq={self.seq!r})"
+
+def parse_attachments(note_id, value):
+    if not value:
+        return ()
+    if not isinstance(value, list):
+        raise InvalidNote(f"note {note_id}: attachments must be a list")
+    for a in value:
+        if (not isinstance(a, dict) or not isinstance(a.get('sha256'), str) or not SHA256_RE.match(a['sha256'])
+                or not isinstance(a.get('name'), str) or not isinstance(a.get('type'), str)
+                or not isinstance(a.get('size'), int) or isinstance(a['size'], bool) or a['size'] < 0):
+            raise InvalidNote(f"note {note_id}: bad attachment {a!r}")
+    return tuple({"sha256": a['sha256'], "name": a['name'], "size": a['size'], "type": a['type']} for a in value)
+
+def parse_shares(note_id, value):
+    # {"username": "read" | "edit", ...} -> sorted pairs
+    if not value:
+        return ()
+    if not isinstance(value, dict) or len(value) > MAX_SHARES:
+        raise InvalidNote(f"note {note_id}: shares must be an object of at most {MAX_SHARES} users")
+    for username, permission in value.items():
+        if not username or permission not in PERMISSIONS:
+            raise InvalidNote(f"note {note_id}: bad share {username!r}: {permission!r}")
+    return tuple((sys.intern(u), sys.intern(p)) for u, p in sorted(value.items()))
+
+def note_from_dict(data, blobs=None):
+    if not isinstance(data, dict):
+        raise InvalidNote("note is not an object")
+    note_id = data.get('id')
+    if not isinstance(note_id, int) or isinstance(note_id, bool):
+        raise InvalidNote(f"bad id {note_id!r}")
+    username = data.get('username')
+    if not isinstance(username, str) or not username:
+        raise InvalidNote(f"note {note_id}: missing username")
+    status = data.get('status', 'active')
+    if status not in STATUSES:
+        raise InvalidNote(f"note {note_id}: bad status {status!r}")
+    seq = data.get('seq', 0)
+    if not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+        raise InvalidNote(f"note {note_id}: bad seq {seq!r}")
+    title = data.get('title', '')
+    content = data.get('content', '')
+    if not isinstance(title, str) or not isinstance(content, str):
+        raise InvalidNote(f"note {note_id}: title and content must be strings")
+    body = data.get('body')
+    if body is not None:
+        if (not isinstance(body, list) or len(body) != 3 or not all(isinstance(v, int) and v >= 0 for v in body)
+                or blobs is None or body[0] not in blobs):
+            raise InvalidNote(f"note {note_id}: bad body reference {body!r}")
+    # Formatted timestamps were turned into epochs by the schema migration
+    updated_at = data.get('updated_at', 0)
+    created_at = data.get('created_at', updated_at)
+    for value in (updated_at, created_at):
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise InvalidNote(f"note {note_id}: bad epoch {value!r}")
+    pinned = data.get('pinned', False)
+    if not isinstance(pinned, bool):
+        raise InvalidNote(f"note {note_id}: pinned must be true or false")
+    tags = parse_tags(data.get('tags'))
+    attachments = parse_attachments(note_id, data.get('attachments'))
+    shares = parse_shares(note_id, data.get('shares'))
+    extra = {k: v for k, v in data.items() if k not in KNOWN_KEYS} or None
+    note = Note(note_id, username, title, content, status, seq, updated_at, extra, tags, created_at, pinned, attachments, shares)
+    if body is not None:
+        note.set_body(blobs[body[0]], body[1], body[2])
+    return note
+
+def user_from_dict(data):
+    # Checked once when users.json is read, so handlers can index fields directly
+    if not isinstance(data, dict):
+        raise InvalidUser("user is not an object")
+    username = data.get('username')
+    if not isinstance(username, str) or not username:
+        raise InvalidUser("missing username")
+    if not isinstance(data.get('password'), str) or not data['password']:
+        raise InvalidUser(f"user {username}: missing password hash")
+    user = dict(data)
+    for field in USER_TEXT_FIELDS:
+        value = user.get(field)
+        if value is None:
+            user[field] = username if field == 'display_username' else ''
+        elif not isinstance(value, str):
+            raise InvalidUser(f"user {username}: {field} must be a string")
+    age = user.get('age')
+    if age is not None and (not isinstance(age, int) or isinstance(age, bool)):
+        raise InvalidUser(f"user {username}: bad age {age!r}")
+    return user
@@ -0,0 +1,134 @@
+# ordering.py
+import bisect
+from datetime import datetime, timedelta
+
+from store import StoreIndex
+
+SORTS = ('created', 'updated', 'title')
+DATE_SORTS = ('created', 'updated')
+DEFAULT_SORT = 'created'
+
+def sort_key(note, sort):
+    if sort == 'title':
+        return (note.title.casefold(), note.id)
+    return (note.created_at if sort == 'created' else note.updated_at, note.id)
+
+class OrderIndex(StoreIndex):
+    # Per (user, status, pinned): one sorted key list per sort order, kept with
+    # bisect.insort. A page is two bisects per list plus the slice it returns, so
+    # nothing re-sorts the user's notes per request. Kept in step with the store
+    # by StoreIndex, like sync.SeqIndex and tags.TagIndex.
+    def __init__(self):
+        super().__init__()
+        self._lists = {}
+        self._notes = {}
+        self._entry = {}
+
+    def _add(self, note):
+        group = (note.username, note.status, note.pinned)
+        lists = self._lists.setdefault(group, {s: [] for s in SORTS})
+        keys = tuple(sort_key(note, sort) for sort in SORTS)
+        for sort, key in zip(SORTS, keys):
+            bisect.insort(lists[sort], key)
+        self._notes[note.id] = note
+        self._entry[note.id] = (group, keys)
+
+    def _remove(self, note_id):
+        entry = self._entry.pop(note_id, None)
+        self._notes.pop(note_id, None)
+        if entry is None:
+            return
+        group, keys = entry
+        lists = self._lists[group]
+        for sort, key in zip(SORTS, keys):
+            keyed = lists[sort]
+            i = bisect.bisect_left(keyed, key)
+            if i < len(keyed) and keyed[i] == key:
+                del keyed[i]
+        if not lists[SORTS[0]]:
+            del self._lists[group]
+
+    def _rebuild(self, notes):
+        self._lists, self._notes, self._entry = {}, {}, {}
+        groups = {}
+        for n in notes:
+            if not n.is_tombstone:
+                groups.setdefault((n.username, n.status, n.pinned), []).append(n)
+        # One sort per list on a rebuild instead of n insorts
+        for group, members in groups.items():
+            keys = [((n.created_at, n.id), (n.updated_at, n.id), (n.title.casefold(), n.id)) for n in members]
+            self._lists[group] = {sort: sorted(k[i] for k in keys) for i, sort in enumerate(SORTS)}
+            for n, k in zip(members, keys):
+                self._notes[n.id] = n
+                self._entry[n.id] = (group, k)
+
+    def _patch(self, note):
+        self._remove(note.id)
+        if not note.is_tombstone:
+            self._add(note)
+
+    def page(self, username, statuses, sort=DEFAULT_SORT, desc=False, start=None, end=None, offset=0, limit=None):
+        # Status by status, pinned notes first, each group in the requested order.
+        # start/end bound the sort field ([start, end) epochs) and only apply to the
+        # date sorts. Returns (notes, total matching).
+        with self._lock:
+            ranges = []
+            for status, pinned in ((s, p) for s in statuses for p in (True, False)):
+                keyed = self._lists.get((username, status, pinned), {}).get(sort, [])
+                lo, hi = 0, len(keyed)
+                if sort in DATE_SORTS:
+                    if start is not None:
+                        lo = bisect.bisect_left(keyed, (start,))
+                    if end is not None:
+                        hi = bisect.bisect_left(keyed, (end,))
+                ranges.append((keyed, lo, max(lo, hi)))
+            total = sum(hi - lo for _, lo, hi in ranges)
+            found = []
+            for keyed, lo, hi in ranges:
+                count = hi - lo
+                if offset >= count:
+                    offset -= count
+                    continue
+                take = count - offset if limit is None else min(count - offset, limit - len(found))
+                if desc:
+                    picked = keyed[hi - offset - take:hi - offset][::-1]
+                else:
+                    picked = keyed[lo + offset:lo + offset + take]
+                found.extend(self._notes[key[-1]] for key in picked)
+                offset = 0
+                if limit is not None and len(found) >= limit:
+                    break
+            return found, total
+
+order_index = OrderIndex()
+
+def sort_notes(notes, sort=DEFAULT_SORT, desc=False, start=None, end=None):
+    # Same ordering and range rules as OrderIndex.page, for small candidate sets
+    # (e.g. the notes a tag filter matched)
+    if sort in DATE_SORTS:
+        field = 'created_at' if sort == 'created' else 'updated_at'
+        notes = [n for n in notes if (start is None or getattr(n, field) >= start) and (end is None or getattr(n, field) < end)]
+    pinned = sorted((n for n in notes if n.pinned), key=lambda n: sort_key(n, sort), reverse=desc)
+    rest = sorted((n for n in notes if not n.pinned), key=lambda n: sort_key(n, sort), reverse=desc)
+    return pinned + rest
+
+def parse_day(value, end=False):
+    # YYYY-MM-DD -> epoch of that local midnight; the end of a range is exclusive,
+    # so "to" days are pushed to the next midnight to include the whole day
+    try:
+        day = datetime.strptime(value, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+    if end:
+        day += timedelta(days=1)
+    return int(day.timestamp())
+
+def parse_order(args):
+    # ?sort=created|updated|title&order=asc|desc&from=YYYY-MM-DD&to=YYYY-MM-DD
+    sort = args.get('sort', DEFAULT_SORT).lower()
+    if sort not in SORTS:
+        sort = DEFAULT_SORT
+    desc = args.get('order', 'asc').lower() == 'desc'
+    start = parse_day(args.get('from'))
+    end = parse_day(args.get('to'), end=True)
+    return sort, desc, start, end
@@ -0,0 +1,41 @@
+# patches.py
+from models import InvalidNote
+
+MAX_PATCHES = 200
+
+class PatchError(ValueError):
+    pass
+
+def parse_patches(value):
+    # [[start, end, text], ...] -> [(start, end, text), ...]; offsets are code points into the
+    # base content, ranges sorted and not overlapping. Raises InvalidNote on malformed input.
+    if not isinstance(value, list) or not value:
+        raise InvalidNote("patches must be a non-empty list")
+    if len(value) > MAX_PATCHES:
+        raise InvalidNote(f"at most {MAX_PATCHES} patches per save")
+    patches, last = [], 0
+    for p in value:
+        if (not isinstance(p, list) or len(p) != 3 or not isinstance(p[2], str)
+                or not all(isinstance(v, int) and not isinstance(v, bool) for v in p[:2])):
+            raise InvalidNote(f"bad patch {p!r}")
+        start, end, text = p
+        if not last <= start <= end:
+            raise InvalidNote(f"patch ranges must be sorted and must not overlap ({start}, {end})")
+        patches.append((start, end, text))
+        last = end
+    return patches
+
+def apply_patches(text, patches, length=None):
+    # length is the size of the content the client diffed against; a mismatch means the
+    # patch was made against something else and must not be applied
+    if length is not None and length != len(text):
+        raise PatchError(f"patch was made against {length} characters, the note has {len(text)}")
+    if patches[-1][1] > len(text):
+        raise PatchError("patch reaches past the end of the note")
+    parts, pos = [], 0
+    for start, end, new in patches:
+        parts.append(text[pos:start])
+        parts.append(new)
+        pos = end
+    parts.append(text[pos:])
+    return ''.join(parts)
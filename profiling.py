@@ -0,0 +1,204 @@
+# profiling.py
+import os
+import re
+import sys
+import time
+import random
+import pstats
+import cProfile
+import logging
+import threading
+
+from flask import Blueprint, current_app, request, jsonify
+from itsdangerous import TimestampSigner, BadSignature, SignatureExpired
+
+import state
+
+profiling = Blueprint('profiling', __name__)
+log = logging.getLogger(__name__)
+
+DEFAULT_DIR = os.environ.get("NOTEPAD_PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles"))
+DEFAULT_RATE = float(os.environ.get("NOTEPAD_PROFILE_RATE", "0"))
+DEFAULT_KEEP = 500
+TOKEN_HEADER = "X-Profile-Token"
+TOKEN_SALT = "notepad-profile"
+TOKEN_MAX_AGE = 3600
+# How often a process looks up the shared runtime toggle
+TOGGLE_POLL_SECONDS = 1.0
+TOGGLE_MAX_SECONDS = 3600
+
+def signer(secret):
+    return TimestampSigner(secret, salt=TOKEN_SALT)
+
+def make_token(secret):
+    return signer(secret).sign("profile").decode('ascii')
+
+def valid_token(secret, token, max_age=TOKEN_MAX_AGE):
+    try:
+        return signer(secret).unsign(token, max_age=max_age) == b"profile"
+    except (BadSignature, SignatureExpired):
+        return False
+
+class ProfilerMiddleware:
+    # Wraps the WSGI app. A request is profiled when it carries a valid signed token,
+    # or when it is sampled at the configured rate (or the rate switched on at runtime
+    # through /debug/profile). Unsampled requests pay one header lookup and a compare.
+    def __init__(self, wsgi_app, secret, directory=DEFAULT_DIR, rate=0.0, keep=DEFAULT_KEEP):
+        self.wsgi_app = wsgi_app
+        self.secret = secret
+        self.directory = directory
+        self.rate = rate
+        self.keep = keep
+        self._busy = threading.Lock()
+        self._override = None
+        self._override_checked = 0.0
+        self._dumps = 0
+
+    def current_rate(self):
+        now = time.monotonic()
+        if now - self._override_checked >= TOGGLE_POLL_SECONDS:
+            self._override_checked = now
+            try:
+                raw = state.backend.get(state.key("profile", "rate"))
+                self._override = float(raw) if raw is not None else None
+            except Exception:
+                self._override = None
+        return self.rate if self._override is None else self._override
+
+    def wanted(self, environ):
+        token = environ.get("HTTP_X_PROFILE_TOKEN")
+        if token is not None:
+            return valid_token(self.secret, token)
+        rate = self.current_rate()
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, environ, start_response):
+        if not self.wanted(environ) or not self._busy.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        # One profiled request at a time: profilers in concurrent threads would skew each other
+        name = None
+        started = time.perf_counter()
+        profiler = cProfile.Profile()
+
+        def profiled_start_response(status, headers, exc_info=None):
+            headers.append(("X-Profile-Id", name))
+            return start_response(status, headers, exc_info)
+
+        try:
+            name = self.dump_name(environ)
+            profiler.enable()
+            try:
+                body = self.wsgi_app(environ, profiled_start_response)
+            finally:
+                profiler.disable()
+            elapsed = time.perf_counter() - started
+            self.dump(profiler, name, elapsed)
+            return body
+        finally:
+            self._busy.release()
+
+    def dump_name(self, environ):
+        path = re.sub(r'[^A-Za-z0-9]+', '_', environ.get("PATH_INFO", "/")).strip('_') or "root"
+        return f"{int(time.time() * 1000)}-{environ.get('REQUEST_METHOD', 'GET')}-{path[:60]}"
+
+    def dump(self, profiler, name, elapsed):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.directory, f"{name}-{elapsed * 1000:.0f}ms.prof"))
+            self._dumps += 1
+            if self._dumps % 50 == 0:
+                prune(self.directory, self.keep)
+        except OSError:
+            log.exception("Failed to write profile %s", name)
+
+def profile_files(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(".prof"))
+
+def prune(directory, keep):
+    # Names start with a millisecond timestamp, so sorting by name is oldest first
+    files = profile_files(directory)
+    for path in files[:max(0, len(files) - keep)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def endpoint_of(path):
+    # 1700000000000-GET-home-123ms.prof -> ('GET home', 123)
+    parts = os.path.basename(path)[:-len(".prof")].split('-')
+    return f"{parts[1]} {'-'.join(parts[2:-1])}", int(parts[-1][:-2])
+
+def report(directory, top=25, match=None, stream=None):
+    # Aggregates every dump (optionally only endpoints containing `match`) per endpoint
+    stream = stream or sys.stdout
+    groups = {}
+    for path in profile_files(directory):
+        try:
+            endpoint, ms = endpoint_of(path)
+        except (IndexError, ValueError):
+            continue
+        if match and match not in endpoint:
+            continue
+        groups.setdefault(endpoint, []).append((path, ms))
+    for endpoint, dumps in sorted(groups.items()):
+        times = sorted(ms for _, ms in dumps)
+        stream.write(f"\n=== {endpoint}: {len(times)} requests, median {times[len(times) // 2]} ms, max {times[-1]} ms\n")
+        stats = pstats.Stats(*[p for p, _ in dumps], stream=stream)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(top)
+    return groups
+
+@profiling.route('/debug/profile', methods=['GET', 'POST'])
+def toggle():
+    # Runtime switch shared by every node: POST ?rate=0.05&seconds=600 turns sampling on for a while,
+    # rate=0 turns it off. Needs the same signed token as per-request profiling.
+    if not valid_token(current_app.secret_key, request.headers.get(TOKEN_HEADER, "")):
+        return jsonify({"success": False, "msg": "Profiling token missing or invalid."}), 403
+    name = state.key("profile", "rate")
+    if request.method == 'POST':
+        rate = min(max(request.args.get('rate', 1.0, type=float), 0.0), 1.0)
+        seconds = min(max(request.args.get('seconds', 300, type=int), 1), TOGGLE_MAX_SECONDS)
+        if rate:
+            state.backend.set(name, str(rate), ttl=seconds)
+        else:
+            state.backend.delete(name)
+    middleware = current_app.extensions.get('profiling')
+    override = state.backend.get(name)
+    return jsonify({"success": True, "rate": float(override) if override is not None else (middleware.rate if middleware else 0.0),
+                    "override": override is not None, "directory": middleware.directory if middleware else None})
+
+def init_app(app):
+    middleware = ProfilerMiddleware(app.wsgi_app, app.secret_key,
+                                    directory=app.config.get("PROFILE_DIR", DEFAULT_DIR),
+                                    rate=float(app.config.get("PROFILE_SAMPLE_RATE", DEFAULT_RATE)),
+                                    keep=app.config.get("PROFILE_KEEP", DEFAULT_KEEP))
+    app.wsgi_app = middleware
+    app.extensions['profiling'] = middleware
+    return middleware
+
+def main(argv):
+    if argv == ['token']:
+        # Same secret as the app (FLASK_SECRET); valid for an hour
+        print(make_token(os.environ.get("FLASK_SECRET", "change_this_in_production_please")))
+        return 0
+    if argv and argv[0] == 'report':
+        args = argv[1:]
+        top = 25
+        if '--top' in args:
+            i = args.index('--top')
+            top = int(args[i + 1])
+            del args[i:i + 2]
+        directory = args[0] if args else DEFAULT_DIR
+        match = args[1] if len(args) > 1 else None
+        with open(os.path.join(directory, "report.txt"), 'w', encoding='utf-8') as out:
+            report(directory, top, match, out)
+        with open(os.path.join(directory, "report.txt"), encoding='utf-8') as f:
+            sys.stdout.write(f.read())
+        return 0
+    print("usage: python profiling.py token\n"
+          "       python profiling.py report [DIR] [ENDPOINT_SUBSTRING] [--top N]")
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
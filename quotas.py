@@ -0,0 +1,158 @@
+# quotas.py
+import os
+import sys
+import logging
+import threading
+
+from flask import current_app
+
+from store import StoreIndex
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_NOTES = int(os.environ.get("NOTEPAD_QUOTA_NOTES", "5000"))
+DEFAULT_MAX_BYTES = int(os.environ.get("NOTEPAD_QUOTA_BYTES", str(100 * 1024 * 1024)))
+DEFAULT_RECONCILE_SECONDS = 600
+
+def note_bytes(note):
+    # What a note costs its owner: title and body as UTF-8 plus its attachments
+    if note.is_tombstone:
+        return 0
+    body = note.length if note.is_stored else len(note.content.encode('utf-8'))
+    return body + len(note.title.encode('utf-8')) + sum(a['size'] for a in note.attachments)
+
+def format_bytes(n):
+    for unit in ('bytes', 'KB', 'MB'):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == 'bytes' else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+class UsageIndex(StoreIndex):
+    # Per user: [note count, bytes] over every note that is not a tombstone. Same
+    # lifecycle as the other indexes, and apply() only moves the changed note's own
+    # contribution, so a save never rescans anything. reconcile() recounts from
+    # scratch and repairs whatever drifted.
+    def __init__(self):
+        super().__init__()
+        self._usage = {}
+        self._entry = {}
+
+    @staticmethod
+    def _count(notes):
+        usage, entry = {}, {}
+        for n in notes:
+            if n.is_tombstone:
+                continue
+            size = note_bytes(n)
+            u = usage.get(n.username)
+            if u is None:
+                u = usage[n.username] = [0, 0]
+            u[0] += 1
+            u[1] += size
+            entry[n.id] = (n.username, size)
+        return usage, entry
+
+    def _add(self, note):
+        if note.is_tombstone:
+            return
+        size = note_bytes(note)
+        u = self._usage.setdefault(note.username, [0, 0])
+        u[0] += 1
+        u[1] += size
+        self._entry[note.id] = (note.username, size)
+
+    def _remove(self, note_id):
+        old = self._entry.pop(note_id, None)
+        if old is None:
+            return
+        u = self._usage[old[0]]
+        u[0] -= 1
+        u[1] -= old[1]
+        if not u[0]:
+            del self._usage[old[0]]
+
+    def _rebuild(self, notes):
+        self._usage, self._entry = self._count(notes)
+
+    def _patch(self, note):
+        self._remove(note.id)
+        self._add(note)
+
+    def usage(self, username):
+        with self._lock:
+            count, size = self._usage.get(username, (0, 0))
+            return count, size
+
+    def reconcile(self, store):
+        # Under the store lock so no save lands between the recount and the swap.
+        # -> {username: (counted before, counted now)} for every user that had drifted
+        with store.lock:
+            notes, signature = self._current(store)
+            with self._lock:
+                if self._signature is None:
+                    return {}
+                usage, entry = self._count(notes)
+                drift = {}
+                for username in set(usage) | set(self._usage):
+                    before, now = tuple(self._usage.get(username, (0, 0))), tuple(usage.get(username, (0, 0)))
+                    if before != now:
+                        drift[username] = (before, now)
+                self._usage, self._entry = usage, entry
+                self._signature = signature
+        for username, (before, now) in drift.items():
+            log.warning("Usage of %s drifted: %s notes/%s bytes counted, %s notes/%s bytes stored",
+                        username, before[0], before[1], now[0], now[1])
+        return drift
+
+usage_index = UsageIndex()
+
+def limits():
+    config = current_app.config
+    return config.get("QUOTA_MAX_NOTES", DEFAULT_MAX_NOTES), config.get("QUOTA_MAX_BYTES", DEFAULT_MAX_BYTES)
+
+def quota_error(username, add_notes=0, add_bytes=0):
+    # -> a message when the change would take the user past a limit, else None. Changes
+    # that do not grow usage always pass, so a user over quota can still clean up.
+    max_notes, max_bytes = limits()
+    count, used = usage_index.usage(username)
+    if add_notes > 0 and max_notes and count + add_notes > max_notes:
+        return f"Note limit reached ({max_notes} notes). Delete some notes to add more."
+    if add_bytes > 0 and max_bytes and used + add_bytes > max_bytes:
+        return f"Storage limit reached ({format_bytes(used)} of {format_bytes(max_bytes)} used)."
+    return None
+
+def usage_summary(username):
+    max_notes, max_bytes = limits()
+    count, used = usage_index.usage(username)
+    return {"notes": count, "bytes": used, "max_notes": max_notes, "max_bytes": max_bytes}
+
+def reconcile_loop(store, interval, stop):
+    while not stop.wait(interval):
+        try:
+            usage_index.reconcile(store)
+        except Exception:
+            log.exception("Usage reconciliation failed")
+
+def init_app(app, store):
+    interval = app.config.get("QUOTA_RECONCILE_SECONDS", DEFAULT_RECONCILE_SECONDS)
+    stop = threading.Event()
+    if interval and app.config.get("START_WORKERS", True):
+        threading.Thread(target=reconcile_loop, args=(store, interval, stop), name="usage-reconcile", daemon=True).start()
+    app.extensions['quotas'] = {"reconcile_seconds": interval, "stop": stop}
+    return stop
+
+def main(argv):
+    # Offline view: python quotas.py usage [NOTES_FILE] recounts usage per user from the file
+    if len(argv) in (1, 2) and argv[0] == 'usage':
+        from store import NoteStore
+        store = NoteStore(argv[1] if len(argv) == 2 else os.path.join(os.path.dirname(__file__), "notes.json"))
+        usage, _ = UsageIndex._count(store.load())
+        for username, (count, size) in sorted(usage.items(), key=lambda kv: -kv[1][1]):
+            print(f"{username:<24} {count:>7} notes {format_bytes(size):>12}")
+        return 0
+    print("usage: python quotas.py usage [NOTES_FILE]")
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,118 @@
+# schema.py
+import re
+import sys
+import logging
+
+import serializers
+from models import parse_timestamp, InvalidRecord
+
+log = logging.getLogger(__name__)
+
+# Current schema version of each data file; files written before versioning are version 0
+VERSIONS = {'notes': 2, 'users': 1}
+MIGRATIONS = {kind: {} for kind in VERSIONS}
+
+class SchemaError(ValueError):
+    pass
+
+def migration(kind, version, whole=False):
+    # Registers fn(record) -> record that upgrades one record from version - 1 to version,
+    # or with whole=True fn(records) -> records for a step that needs the entire file
+    def register(fn):
+        MIGRATIONS[kind][version] = (fn, whole)
+        return fn
+    return register
+
+def upgrade(kind, version, records):
+    # -> records at the current version. Records a step cannot handle are passed on
+    # unchanged, so validation sets them aside instead of the whole file failing.
+    current = VERSIONS[kind]
+    if version > current:
+        raise SchemaError(f"{kind} schema {version} is newer than this code ({current})")
+    for v in range(version + 1, current + 1):
+        step, whole = MIGRATIONS[kind][v]
+        if whole:
+            records = step(records)
+            continue
+        upgraded = []
+        for record in records:
+            try:
+                upgraded.append(step(record) if isinstance(record, dict) else record)
+            except (InvalidRecord, KeyError, TypeError, ValueError) as e:
+                log.warning("%s migration %d left a record as is: %s", kind, v, e)
+                upgraded.append(record)
+        records = upgraded
+    return records
+
+def read(path, kind):
+    # -> (records at the current version, True if they were migrated and should be written back)
+    version, records = serializers.load_records(path)
+    if version == VERSIONS[kind]:
+        return records, False
+    log.info("Migrating %s from schema %d to %d", path, version, VERSIONS[kind])
+    return upgrade(kind, version, records), True
+
+@migration('notes', 1)
+def note_epochs(record):
+    # Formatted timestamp strings -> created_at/updated_at epochs
+    record = dict(record)
+    stamp = record.pop('deleted_at' if record.get('status') == 'deleted' else 'timestamp', None)
+    record.pop('timestamp', None)
+    record.pop('deleted_at', None)
+    if 'updated_at' not in record:
+        record['updated_at'] = parse_timestamp(stamp)
+    record.setdefault('created_at', record['updated_at'])
+    return record
+
+@migration('notes', 2, whole=True)
+def note_seqs(records):
+    # Notes from before delta sync all sat at seq 0, where since/next paging cannot tell
+    # them apart: number each user's above that user's highest seq, oldest first, so
+    # clients that are already caught up still receive them as new changes
+    top, pending = {}, []
+    for i, record in enumerate(records):
+        if not isinstance(record, dict) or not isinstance(record.get('username'), str):
+            continue
+        seq = record.get('seq', 0)
+        if seq == 0:
+            pending.append(i)
+        elif isinstance(seq, int) and not isinstance(seq, bool):
+            top[record['username']] = max(top.get(record['username'], 0), seq)
+
+    def age(i):
+        updated, note_id = records[i].get('updated_at'), records[i].get('id')
+        return (updated if isinstance(updated, int) else 0, note_id if isinstance(note_id, int) else 0)
+
+    records = list(records)
+    for i in sorted(pending, key=age):
+        username = records[i]['username']
+        top[username] = top.get(username, 0) + 1
+        records[i] = dict(records[i], seq=top[username])
+    return records
+
+@migration('users', 1)
+def user_lookup_fields(record):
+    # Lookups compare email and contact as stored: normalise them once here
+    record = dict(record)
+    if isinstance(record.get('email'), str):
+        record['email'] = record['email'].strip().lower()
+    if isinstance(record.get('contact'), str):
+        record['contact'] = re.sub(r'\D', '', record['contact'])
+    if isinstance(record.get('username'), str):
+        record.setdefault('display_username', record['username'])
+    return record
+
+def main(argv):
+    # Offline pass: python schema.py migrate notes notes.json
+    if len(argv) == 3 and argv[0] == 'migrate' and argv[1] in VERSIONS:
+        kind, path = argv[1], argv[2]
+        records, migrated = read(path, kind)
+        if migrated:
+            serializers.save(path, records, serializers.file_format(path), VERSIONS[kind])
+        print(f"{path}: {kind} schema {VERSIONS[kind]}{' (migrated)' if migrated else ''}, {len(records)} records")
+        return 0
+    print("usage: python schema.py migrate {notes,users} FILE")
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,161 @@
+# serializers.py
+import os
+import sys
+import json
+import struct
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Binary layout: MAGIC, u8 version, u32 schema version, u32 record count, then per record
+# a u32 length + compact JSON bytes. Version 1 files have no schema field.
+MAGIC = b'JANB'
+VERSION = 2
+HEADER_V1 = struct.Struct('<4sBI')
+HEADER = struct.Struct('<4sBII')
+LENGTH = struct.Struct('<I')
+
+FORMATS = ('json', 'json-pretty', 'binary')
+DEFAULT_FORMAT = os.environ.get("NOTEPAD_STORE_FORMAT", "json")
+
+class SerializationError(ValueError):
+    pass
+
+def json_dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def json_loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    if isinstance(raw, memoryview):
+        raw = raw.tobytes()
+    return json.loads(raw)
+
+def dump_binary(records, schema=0):
+    parts = [HEADER.pack(MAGIC, VERSION, schema, len(records))]
+    for record in records:
+        payload = json_dumps(record)
+        parts.append(LENGTH.pack(len(payload)))
+        parts.append(payload)
+    return b''.join(parts)
+
+def binary_header(raw):
+    # -> (schema, record count, offset of the first record)
+    if len(raw) < HEADER_V1.size:
+        raise SerializationError("truncated binary header")
+    magic, version, count = HEADER_V1.unpack_from(raw, 0)
+    if magic != MAGIC:
+        raise SerializationError("not a binary record file")
+    if version == 1:
+        return 0, count, HEADER_V1.size
+    if version != VERSION:
+        raise SerializationError(f"unsupported binary version {version}")
+    if len(raw) < HEADER.size:
+        raise SerializationError("truncated binary header")
+    _, _, schema, count = HEADER.unpack_from(raw, 0)
+    return schema, count, HEADER.size
+
+def iter_binary(raw):
+    _, count, offset = binary_header(raw)
+    view = memoryview(raw)
+    for _ in range(count):
+        if offset + LENGTH.size > len(raw):
+            raise SerializationError("truncated binary record")
+        (length,) = LENGTH.unpack_from(raw, offset)
+        offset += LENGTH.size
+        if offset + length > len(raw):
+            raise SerializationError("truncated binary record")
+        yield json_loads(view[offset:offset + length])
+        offset += length
+
+def detect_format(raw):
+    if raw[:len(MAGIC)] == MAGIC:
+        return 'binary'
+    # indent=2 breaks the line right after the opening bracket; compact JSON never does
+    if raw[:1] in (b'[', b'{') and raw[1:2] == b'\n':
+        return 'json-pretty'
+    return 'json'
+
+def dumps(data, fmt=None, schema=None):
+    # With a schema version, JSON files hold {"schema": N, "records": [...]} instead of a bare list
+    fmt = fmt or DEFAULT_FORMAT
+    if fmt == 'binary':
+        if not isinstance(data, list):
+            raise SerializationError("binary format stores a list of records")
+        return dump_binary(data, schema or 0)
+    if schema is not None:
+        data = {"schema": schema, "records": data}
+    if fmt == 'json-pretty':
+        return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+    if fmt == 'json':
+        return json_dumps(data)
+    raise SerializationError(f"unknown format {fmt!r}")
+
+def loads(raw):
+    if detect_format(raw) == 'binary':
+        return list(iter_binary(raw))
+    try:
+        return json_loads(raw)
+    except ValueError as e:
+        raise SerializationError(str(e)) from e
+
+def loads_records(raw):
+    # -> (schema version, list of records); bare lists from before versioning are schema 0
+    if detect_format(raw) == 'binary':
+        return binary_header(raw)[0], list(iter_binary(raw))
+    data = loads(raw)
+    if isinstance(data, dict) and isinstance(data.get("schema"), int) and isinstance(data.get("records"), list):
+        return data["schema"], data["records"]
+    if not isinstance(data, list):
+        raise SerializationError("expected a list of records")
+    return 0, data
+
+def load(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+def load_records(path):
+    with open(path, 'rb') as f:
+        return loads_records(f.read())
+
+def save(path, data, fmt=None, schema=None):
+    # Without an explicit fmt an existing file keeps its format: DEFAULT_FORMAT only picks
+    # the format of new files, and converting one is `python serializers.py convert`
+    if fmt is None:
+        try:
+            fmt = file_format(path)
+        except FileNotFoundError:
+            pass
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(dumps(data, fmt, schema))
+    os.replace(tmp, path)
+
+def file_format(path):
+    with open(path, 'rb') as f:
+        return detect_format(f.read(len(MAGIC)))
+
+def main(argv):
+    if len(argv) >= 2 and argv[0] == 'info':
+        for path in argv[1:]:
+            schema, data = load_records(path)
+            print(f"{path}: {file_format(path)}, schema {schema}, {len(data)} records, {os.path.getsize(path)} bytes")
+        return 0
+    if len(argv) >= 3 and argv[0] == 'convert' and argv[2] in FORMATS:
+        path, fmt = argv[1], argv[2]
+        out = argv[3] if len(argv) > 3 else path
+        before = os.path.getsize(path)
+        schema, data = load_records(path)
+        save(out, data, fmt, schema or None)
+        print(f"{path} -> {out}: {fmt}, {before} -> {os.path.getsize(out)} bytes")
+        return 0
+    print("usage: python serializers.py info FILE...\n"
+          "       python serializers.py convert FILE {json,json-pretty,binary} [OUT]")
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,83 @@
+# sharing.py
+from models import PERMISSIONS, MAX_SHARES
+from store import StoreIndex
+
+class ShareError(ValueError):
+    pass
+
+def allows(permission, need):
+    # 'edit' includes 'read'
+    return permission == need or permission == 'edit'
+
+def set_share(shares, username, permission):
+    # -> the note's new shares with username granted permission, or dropped for None
+    current = dict(shares)
+    if permission is None:
+        current.pop(username, None)
+    elif permission not in PERMISSIONS:
+        raise ShareError(f"Permission must be one of: {', '.join(PERMISSIONS)}.")
+    else:
+        current[username] = permission
+        if len(current) > MAX_SHARES:
+            raise ShareError(f"A note can be shared with at most {MAX_SHARES} users.")
+    return tuple(sorted(current.items()))
+
+class ShareIndex(StoreIndex):
+    # The ACL lives on the notes themselves (note.shares: note -> grantees). This is the
+    # reverse side, grantee -> {note id: permission}, plus the shared notes by id, so
+    # "shared with me" and a permission check are dict lookups instead of a scan over
+    # every user's notes. Same lifecycle as the other indexes. Only active notes are
+    # shared: archiving a note suspends its shares until it is restored.
+    def __init__(self):
+        super().__init__()
+        self._shared_with = {}
+        self._notes = {}
+        self._grantees = {}
+
+    def _add(self, note):
+        if note.status != 'active' or not note.shares:
+            return
+        for username, permission in note.shares:
+            self._shared_with.setdefault(username, {})[note.id] = permission
+        self._notes[note.id] = note
+        self._grantees[note.id] = tuple(username for username, _ in note.shares)
+
+    def _remove(self, note_id):
+        self._notes.pop(note_id, None)
+        for username in self._grantees.pop(note_id, ()):
+            granted = self._shared_with.get(username)
+            if granted is not None:
+                granted.pop(note_id, None)
+                if not granted:
+                    del self._shared_with[username]
+
+    def _rebuild(self, notes):
+        self._shared_with, self._notes, self._grantees = {}, {}, {}
+        for n in notes:
+            self._add(n)
+
+    def _patch(self, note):
+        self._remove(note.id)
+        self._add(note)
+
+    def permission(self, username, note_id):
+        with self._lock:
+            return self._shared_with.get(username, {}).get(note_id)
+
+    def note(self, username, note_id, need='read'):
+        # The note shared with username when the grant covers need, else None
+        with self._lock:
+            permission = self._shared_with.get(username, {}).get(note_id)
+            if permission is None or not allows(permission, need):
+                return None
+            return self._notes.get(note_id)
+
+    def shared_with(self, username):
+        # -> [(note, permission)] most recently updated first
+        with self._lock:
+            granted = self._shared_with.get(username, {})
+            shared = [(self._notes[i], permission) for i, permission in granted.items() if i in self._notes]
+        shared.sort(key=lambda s: (-s[0].updated_at, s[0].id))
+        return shared
+
+share_index = ShareIndex()
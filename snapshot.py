@@ -0,0 +1,297 @@
+# snapshot.py
+import os
+import sys
+import time
+import uuid
+import shutil
+import re
+import hashlib
+import logging
+
+import serializers
+from attachments import DEFAULT_DIR as ATTACHMENT_DIR
+from store import NOTES_FILE, USERS_FILE, blob_path
+
+log = logging.getLogger(__name__)
+
+BACKUP_DIR = os.environ.get("NOTEPAD_BACKUP_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "backups"))
+ATTACHMENT_INDEX = "attachments/index.json"
+SOURCES = ("users.json", "notes.json", ATTACHMENT_INDEX)
+CAPTURE_RETRIES = 5
+CHUNK = 1 << 20
+# Body references as the JSON and binary formats both write them: "body":[gen,offset,length]
+BODY_GEN_RE = re.compile(rb'"body":\s*\[\s*(\d+)\s*,')
+# Attachment references in the notes metadata, same for both formats
+ATTACHMENT_SHA_RE = re.compile(rb'"sha256":\s*"([0-9a-f]{64})"')
+SHA_RE = re.compile(r'^[0-9a-f]{64}$')
+
+class SnapshotError(Exception):
+    pass
+
+# A snapshot never takes the store locks. Metadata files are only ever swapped in whole
+# with os.replace, so one read gives one consistent version, and blob files are
+# append-only with bodies fsynced before the metadata that points at them is written.
+# Reading the metadata and then opening the blobs it references therefore pins a
+# consistent state: later appends land past the referenced ranges, and a compaction
+# that removes a blob file cannot take it away from a descriptor that is already open.
+#
+# Attachment objects never change once written (they are named by their sha256) and are
+# only deleted after the last note dropped them, so they are pinned the same way: every
+# object the captured notes or attachment index name is opened after those were read.
+#
+# Layout under BACKUP_DIR:
+#   objects/<sha256>               metadata files and attachments, content addressed (unchanged ones are not copied again)
+#   <id>/manifest.json             what the snapshot holds
+#   <id>/<name>-<gen>.blob.<start> blob bytes [start, end) that were new in this snapshot
+#
+# Files are named in a snapshot by the names in SOURCES, wherever they live on disk, so a
+# snapshot of one deployment restores into any other layout.
+
+def layout(data_dir=None):
+    # -> ({name in SOURCES: path}, attachment directory). Without data_dir, the live files, taken
+    # from the same settings as the stores (NOTEPAD_NOTES_FILE, _USERS_FILE, _ATTACHMENT_DIR);
+    # with it, the default layout under data_dir.
+    if data_dir is None:
+        return ({"users.json": USERS_FILE, "notes.json": NOTES_FILE,
+                 ATTACHMENT_INDEX: os.path.join(ATTACHMENT_DIR, "index.json")}, ATTACHMENT_DIR)
+    return {name: os.path.join(data_dir, name) for name in SOURCES}, os.path.join(data_dir, os.path.dirname(ATTACHMENT_INDEX))
+
+def attachment_path(attachment_dir, sha):
+    return os.path.join(attachment_dir, "objects", sha[:2], sha)
+
+def blob_source(manifest, name, info):
+    # Snapshots from before "source" was recorded named blobs after the file next to them
+    if "source" in info:
+        return info["source"]
+    return next((s for s in manifest["files"] if os.path.basename(blob_path(s, info["gen"])) == name), "notes.json")
+
+def _attachment_shas(files):
+    shas = set()
+    for raw in files.values():
+        shas.update(m.decode('ascii') for m in ATTACHMENT_SHA_RE.findall(raw))
+    if ATTACHMENT_INDEX in files:
+        shas.update(serializers.loads(files[ATTACHMENT_INDEX]))
+    return {sha for sha in shas if SHA_RE.match(sha)}
+
+def _capture(paths, attachment_dir):
+    # -> ({name: bytes}, {blob name: (source name, gen, file object, size when opened)}, {attachment sha256: file object})
+    for attempt in range(CAPTURE_RETRIES):
+        files, blobs, attachments = {}, {}, {}
+        try:
+            for name, path in paths.items():
+                if not os.path.exists(path):
+                    continue
+                with open(path, 'rb') as f:
+                    raw = f.read()
+                files[name] = raw
+                # Only the generations are needed, not a parse: every body the metadata points
+                # at was appended before it was written, so the size at open covers them all
+                for gen in {int(g) for g in BODY_GEN_RE.findall(raw)}:
+                    f = open(blob_path(path, gen), 'rb')
+                    blobs[os.path.basename(blob_path(name, gen))] = (name, gen, f, os.fstat(f.fileno()).st_size)
+            missing = []
+            for sha in sorted(_attachment_shas(files)):
+                try:
+                    attachments[sha] = open(attachment_path(attachment_dir, sha), 'rb')
+                except FileNotFoundError:
+                    missing.append(sha)
+            if missing and attempt + 1 < CAPTURE_RETRIES:
+                # Removed since the metadata was read: take it again
+                raise FileNotFoundError(missing[0])
+            if missing:
+                # Still gone: referenced but lost before this snapshot, nothing to keep
+                log.warning("%d attachments are referenced but missing on disk", len(missing))
+            return files, blobs, attachments
+        except FileNotFoundError:
+            # A compaction swapped generations between the two reads: take it again
+            for _, _, f, _ in blobs.values():
+                f.close()
+            for f in attachments.values():
+                f.close()
+    raise SnapshotError("data files kept changing during capture, try again")
+
+def _copy_range(src, start, end, path):
+    src.seek(start)
+    remaining = end - start
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as out:
+        while remaining:
+            chunk = src.read(min(CHUNK, remaining))
+            if not chunk:
+                raise SnapshotError(f"{path}: source ended {remaining} bytes early")
+            out.write(chunk)
+            remaining -= len(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+
+def _store_object(backup_dir, raw):
+    # -> (digest, bytes written: 0 when an earlier snapshot already holds this content)
+    digest = hashlib.sha256(raw).hexdigest()
+    path = os.path.join(backup_dir, "objects", digest)
+    if os.path.exists(path):
+        return digest, 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", 'wb') as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+    return digest, len(raw)
+
+def _store_file(backup_dir, digest, src):
+    # _store_object for an attachment already named by its sha256: streamed and checked on the way
+    path = os.path.join(backup_dir, "objects", digest)
+    if os.path.exists(path):
+        return 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    h, size = hashlib.sha256(), 0
+    with open(path + ".tmp", 'wb') as out:
+        while True:
+            chunk = src.read(CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+    if h.hexdigest() != digest:
+        os.remove(path + ".tmp")
+        raise SnapshotError(f"attachment {digest} does not match its content")
+    os.replace(path + ".tmp", path)
+    return size
+
+def list_snapshots(backup_dir=BACKUP_DIR):
+    if not os.path.isdir(backup_dir):
+        return []
+    found = []
+    for name in os.listdir(backup_dir):
+        path = os.path.join(backup_dir, name, "manifest.json")
+        if os.path.exists(path):
+            found.append(serializers.load(path))
+    return sorted(found, key=lambda m: m["created_at"])
+
+def latest(backup_dir=BACKUP_DIR):
+    try:
+        with open(os.path.join(backup_dir, "LATEST"), encoding='utf-8') as f:
+            snap_id = f.read().strip()
+        return serializers.load(os.path.join(backup_dir, snap_id, "manifest.json"))
+    except (FileNotFoundError, serializers.SerializationError):
+        return next(reversed(list_snapshots(backup_dir)), None)
+
+def create(backup_dir=BACKUP_DIR, data_dir=None, sources=SOURCES, full=False):
+    # Incremental by default: blob bytes the previous snapshot already holds are referenced, not copied
+    parent = None if full else latest(backup_dir)
+    snap_id = time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    snap_dir = os.path.join(backup_dir, snap_id)
+    paths, attachment_dir = layout(data_dir)
+    files, blobs, attachments = _capture({name: paths[name] for name in sources}, attachment_dir)
+    manifest = {"id": snap_id, "created_at": time.time(), "parent": parent["id"] if parent else None,
+                "files": {}, "blobs": {}, "attachments": [], "copied_bytes": 0}
+    try:
+        os.makedirs(snap_dir)
+        for name, raw in files.items():
+            manifest["files"][name], written = _store_object(backup_dir, raw)
+            manifest["copied_bytes"] += written
+        for sha, f in attachments.items():
+            manifest["copied_bytes"] += _store_file(backup_dir, sha, f)
+            manifest["attachments"].append(sha)
+        for name, (source, gen, f, end) in blobs.items():
+            previous = parent["blobs"].get(name) if parent else None
+            inode = os.fstat(f.fileno()).st_ino
+            segments, start = [], 0
+            if previous and previous.get("inode") == inode:
+                # Same append-only file seen before: only the tail is new
+                segments, start = list(previous["segments"]), previous["size"]
+            if end > start:
+                _copy_range(f, start, end, os.path.join(snap_dir, f"{name}.{start}"))
+                segments.append([snap_id, start, end])
+                manifest["copied_bytes"] += end - start
+            manifest["blobs"][name] = {"source": source, "gen": gen, "size": end, "inode": inode, "segments": segments}
+        serializers.save(os.path.join(snap_dir, "manifest.json"), manifest, 'json-pretty')
+        with open(os.path.join(backup_dir, "LATEST.tmp"), 'w', encoding='utf-8') as f:
+            f.write(snap_id)
+        os.replace(os.path.join(backup_dir, "LATEST.tmp"), os.path.join(backup_dir, "LATEST"))
+    except BaseException:
+        shutil.rmtree(snap_dir, ignore_errors=True)
+        raise
+    finally:
+        for _, _, f, _ in blobs.values():
+            f.close()
+        for f in attachments.values():
+            f.close()
+    log.info("Snapshot %s: %d files, %d blobs, %d attachments, %d bytes copied",
+             snap_id, len(files), len(blobs), len(attachments), manifest["copied_bytes"])
+    return manifest
+
+def restore(snap_id, target=None, backup_dir=BACKUP_DIR):
+    # Writes the snapshot's files into target, or over the live files without one (stop the app first).
+    # Blobs and attachments are put back before the metadata that references them is swapped in.
+    manifest_path = os.path.join(backup_dir, snap_id, "manifest.json")
+    if not os.path.exists(manifest_path):
+        raise SnapshotError(f"no snapshot {snap_id!r} in {backup_dir}")
+    manifest = serializers.load(manifest_path)
+    paths, attachment_dir = layout(target)
+    for name, info in manifest["blobs"].items():
+        dest = blob_path(paths[blob_source(manifest, name, info)], info["gen"])
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp = dest + ".tmp"
+        with open(tmp, 'wb') as out:
+            for seg_id, start, end in info["segments"]:
+                if out.tell() != start:
+                    raise SnapshotError(f"{name}: segment chain broken at {start}")
+                with open(os.path.join(backup_dir, seg_id, f"{name}.{start}"), 'rb') as src:
+                    shutil.copyfileobj(src, out, CHUNK)
+            if out.tell() != info["size"]:
+                raise SnapshotError(f"{name}: rebuilt {out.tell()} bytes, expected {info['size']}")
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, dest)
+    # Snapshots from before attachments were captured have no list
+    for sha in manifest.get("attachments", ()):
+        path = attachment_path(attachment_dir, sha)
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(os.path.join(backup_dir, "objects", sha), 'rb') as src, open(path + ".tmp", 'wb') as out:
+            shutil.copyfileobj(src, out, CHUNK)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(path + ".tmp", path)
+    for name, digest in manifest["files"].items():
+        with open(os.path.join(backup_dir, "objects", digest), 'rb') as f:
+            raw = f.read()
+        if hashlib.sha256(raw).hexdigest() != digest:
+            raise SnapshotError(f"{name}: object {digest} is corrupt")
+        dest = paths[name]
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest + ".tmp", 'wb') as f:
+            f.write(raw)
+        os.replace(dest + ".tmp", dest)
+    return manifest
+
+def main(argv):
+    if argv and argv[0] == 'create' and set(argv[1:]) <= {'--full'}:
+        manifest = create(full='--full' in argv)
+        kind = "incremental" if manifest["parent"] else "full"
+        print(f"{manifest['id']}: {kind}, {manifest['copied_bytes']} bytes copied")
+        return 0
+    if argv == ['list']:
+        for m in list_snapshots():
+            size = sum(b["size"] for b in m["blobs"].values())
+            print(f"{m['id']}  parent={m['parent'] or '-'}  blobs={size}B  copied={m['copied_bytes']}B")
+        return 0
+    if len(argv) in (2, 3) and argv[0] == 'restore':
+        target = argv[2] if len(argv) == 3 else None
+        manifest = restore(argv[1], target)
+        print(f"restored {manifest['id']} into {target or 'the live data files'}: {', '.join(list(manifest['files']) + list(manifest['blobs']))}"
+              f", {len(manifest.get('attachments', ()))} attachments")
+        return 0
+    print("usage: python snapshot.py create [--full]\n"
+          "       python snapshot.py list\n"
+          "       python snapshot.py restore ID [TARGET_DIR]")
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,290 @@
+# state.py
+import os
+import time
+import socket
+import fnmatch
+import threading
+from urllib.parse import urlparse, unquote
+
+import serializers
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+DEFAULT_URL = os.environ.get("NOTEPAD_STATE_URL", "memory://")
+KEY_PREFIX = "notepad:"
+
+class StateError(Exception):
+    pass
+
+class MemoryBackend:
+    # Per-process state: fine for a single node, not shared between workers
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= now:
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key, time.time())
+            return item[0] if item else None
+
+    def get_many(self, keys):
+        with self._lock:
+            now = time.time()
+            return [item[0] if item else None for item in (self._live(k, now) for k in keys)]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=None):
+        with self._lock:
+            now = time.time()
+            item = self._live(key, now)
+            if item is None:
+                item = (0, now + ttl if ttl else None)
+            value = int(item[0]) + amount
+            self._data[key] = (value, item[1])
+            return value
+
+    def keys(self, pattern):
+        with self._lock:
+            now = time.time()
+            return [k for k in list(self._data) if fnmatch.fnmatchcase(k, pattern) and self._live(k, now)]
+
+    def ping(self):
+        return True
+
+class RespClient:
+    # Just enough of the Redis protocol (RESP2) for RedisBackend when redis-py is not installed.
+    # One connection per thread; commands are sent and answered one at a time.
+    def __init__(self, host="localhost", port=6379, db=0, password=None, timeout=5):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url):
+        parsed = urlparse(url)
+        db = int(parsed.path.lstrip('/') or 0)
+        return cls(parsed.hostname or "localhost", parsed.port or 6379, db,
+                   unquote(parsed.password) if parsed.password else None)
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile('rb'))
+        self._local.conn = conn
+        if self.password:
+            self._call(conn, ('AUTH', self.password))
+        if self.db:
+            self._call(conn, ('SELECT', self.db))
+        return conn
+
+    def _close(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn[1].close()
+                conn[0].close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _encode(args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode('utf-8')
+            elif isinstance(arg, int):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read(self, f):
+        line = f.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by state server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise StateError(rest.decode('utf-8', 'replace'))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = f.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [self._read(f) for _ in range(count)]
+        raise StateError(f"unexpected reply {line!r}")
+
+    def _call(self, conn, args):
+        conn[0].sendall(self._encode(args))
+        return self._read(conn[1])
+
+    def _call_many(self, conn, commands):
+        # Every reply is read even after an error one, so the connection stays in step
+        conn[0].sendall(b"".join(self._encode(args) for args in commands))
+        replies, error = [], None
+        for _ in commands:
+            try:
+                replies.append(self._read(conn[1]))
+            except StateError as e:
+                replies.append(None)
+                error = error or e
+        if error is not None:
+            raise error
+        return replies
+
+    def _run(self, call):
+        conn = getattr(self._local, 'conn', None)
+        try:
+            return call(conn or self._connect())
+        except (OSError, ConnectionError):
+            # Stale pooled connection: reconnect once, then give up
+            self._close()
+            if conn is None:
+                raise
+            try:
+                return call(self._connect())
+            except (OSError, ConnectionError):
+                self._close()
+                raise
+
+    def execute_command(self, *args):
+        return self._run(lambda conn: self._call(conn, args))
+
+    def execute_many(self, commands):
+        # Pipelined: one write for all the commands, then their replies in order
+        return self._run(lambda conn: self._call_many(conn, commands))
+
+class RedisBackend:
+    # Works with anything that has redis-py's execute_command and pipeline(): redis.Redis,
+    # fakeredis.FakeRedis, or the bundled RespClient with its execute_many
+    name = "redis"
+    # Keys per MGET: large enough for any stats read in one round trip, small enough not to stall the server
+    MGET_BATCH = 5000
+
+    def __init__(self, client):
+        self.client = client
+
+    def _text(self, value):
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def _pipeline(self, *commands):
+        # Several commands in one round trip
+        if hasattr(self.client, 'execute_many'):
+            return self.client.execute_many(commands)
+        pipe = self.client.pipeline(transaction=False)
+        for args in commands:
+            pipe.execute_command(*args)
+        return pipe.execute()
+
+    def get(self, key):
+        return self._text(self.client.execute_command('GET', key))
+
+    def get_many(self, keys):
+        keys, values = list(keys), []
+        for i in range(0, len(keys), self.MGET_BATCH):
+            values.extend(self._text(v) for v in self.client.execute_command('MGET', *keys[i:i + self.MGET_BATCH]))
+        return values
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self.client.execute_command('SET', key, value, 'EX', max(1, int(ttl)))
+        else:
+            self.client.execute_command('SET', key, value)
+
+    def delete(self, key):
+        self.client.execute_command('DEL', key)
+
+    def incr(self, key, amount=1, ttl=None):
+        if ttl:
+            # Starts the window on first use; INCRBY keeps the expiry afterwards
+            _, value = self._pipeline(('SET', key, 0, 'EX', max(1, int(ttl)), 'NX'), ('INCRBY', key, amount))
+            return int(value)
+        return int(self.client.execute_command('INCRBY', key, amount))
+
+    def keys(self, pattern):
+        found, cursor = [], 0
+        while True:
+            cursor, batch = self.client.execute_command('SCAN', cursor, 'MATCH', pattern, 'COUNT', 500)
+            cursor = int(cursor)
+            found.extend(self._text(k) for k in batch)
+            if cursor == 0:
+                return found
+
+    def ping(self):
+        try:
+            self.client.execute_command('PING')
+            return True
+        except (OSError, ConnectionError, StateError):
+            return False
+
+def backend_from_url(url):
+    if url.startswith("memory:"):
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        if redis is not None:
+            return RedisBackend(redis.Redis.from_url(url))
+        if url.startswith("redis://"):
+            return RedisBackend(RespClient.from_url(url))
+        raise StateError(f"{url.split(':')[0]} URLs need the redis package")
+    raise StateError(f"unknown state backend {url!r}")
+
+backend = MemoryBackend()
+
+def init_app(app):
+    global backend
+    configured = app.config.get("STATE_BACKEND", DEFAULT_URL)
+    backend = backend_from_url(configured) if isinstance(configured, str) else configured
+    app.extensions['state'] = backend
+    return backend
+
+def key(*parts):
+    return KEY_PREFIX + ":".join(str(p) for p in parts)
+
+def get_json(name):
+    raw = backend.get(name)
+    return serializers.json_loads(raw) if raw is not None else None
+
+def set_json(name, value, ttl=None):
+    backend.set(name, serializers.json_dumps(value).decode('utf-8'), ttl)
+
+def hit(name, window):
+    # Fixed-window counter: returns how many hits the current window has seen
+    return backend.incr(name, 1, ttl=window)
+
+def hits(name):
+    return int(backend.get(name) or 0)
+
+def next_version(name, floor=0):
+    # Shared counter that never goes below floor + 1, even if the backend was emptied
+    value = backend.incr(name)
+    if value <= floor:
+        value = backend.incr(name, floor + 1 - value)
+    return value
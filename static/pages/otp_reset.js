@@ -0,0 +1,76 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const timeConsumedElement = document.getElementById('time-consumed');
+    const timeRemainingElement = document.getElementById('time-remaining');
+    const otpInput = document.getElementById('otp');
+    
+    const otpForm = document.getElementById('otp-form');
+    
+    const initialTimeRemaining = otpForm.dataset.timeRemaining;
+    const initialTimeConsumed = otpForm.dataset.timeConsumed;
+    
+    function timeToSeconds(timeStr) {
+        if (!timeStr) return 180;
+        const [minutes, seconds] = timeStr.split(':').map(Number);
+        return minutes * 60 + seconds;
+    }
+    
+    let remainingSeconds = timeToSeconds(initialTimeRemaining);
+    const totalSeconds = 180;
+    
+    function updateTimer() {
+        if (remainingSeconds <= 0) {
+            timeConsumedElement.textContent = '03:00';
+            timeRemainingElement.textContent = '00:00';
+            timeRemainingElement.style.color = '#dc3545';
+            
+            setTimeout(function() {
+                window.location.href = otpForm.dataset.expiredUrl;
+            }, 1000);
+            return;
+        }
+        
+        const timeConsumedSeconds = totalSeconds - remainingSeconds;
+        
+        const consumedMinutes = Math.floor(timeConsumedSeconds / 60);
+        const consumedSeconds = timeConsumedSeconds % 60;
+        timeConsumedElement.textContent = 
+            `${consumedMinutes.toString().padStart(2, '0')}:${consumedSeconds.toString().padStart(2, '0')}`;
+        
+        const remainingMinutes = Math.floor(remainingSeconds / 60);
+        const remainingSecs = remainingSeconds % 60;
+        timeRemainingElement.textContent = 
+            `${remainingMinutes.toString().padStart(2, '0')}:${remainingSecs.toString().padStart(2, '0')}`;
+
+        if (remainingSeconds < 60) {
+            timeRemainingElement.style.color = '#dc3545';
+        } else if (remainingSeconds < 120) {
+            timeRemainingElement.style.color = '#ffc107';
+        } else {
+            timeRemainingElement.style.color = '';
+        }
+        
+        remainingSeconds--;
+    }
+    
+    function initialize() {
+        timeConsumedElement.textContent = initialTimeConsumed;
+        timeRemainingElement.textContent = initialTimeRemaining;
+        
+        updateTimer();
+        const timerInterval = setInterval(updateTimer, 1000);
+
+        otpInput.addEventListener('input', function() {
+            this.value = this.value.replace(/[^0-9]/g, '');
+        });
+
+        otpInput.focus();
+        
+        otpInput.addEventListener('input', function(e) {
+            if (this.value.length === 6) {
+                document.getElementById('new_pass').focus();
+            }
+        });
+    }
+    
+    initialize();
+});
@@ -1,11 +1,92 @@
 // static/script.js
+// Offline note cache: the user's notes, a sync cursor and an outbox of offline edits in IndexedDB
+const NoteCache = (() => {
+  const supported = !!window.indexedDB;
+  let dbPromise = null;
+
+  const open = () => dbPromise || (dbPromise = new Promise((resolve, reject) => {
+    const req = indexedDB.open("notepad", 1);
+    req.onupgradeneeded = () => {
+      const db = req.result;
+      db.createObjectStore("notes", { keyPath: "id" });
+      db.createObjectStore("meta");
+      db.createObjectStore("outbox", { keyPath: "key", autoIncrement: true });
+    };
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  }));
+
+  // Run fn against the named stores in one transaction; resolves with fn's IDBRequest result (if any)
+  const tx = (stores, mode, fn) => open().then(db => new Promise((resolve, reject) => {
+    const t = db.transaction(stores, mode);
+    const req = fn(...[].concat(stores).map(name => t.objectStore(name)));
+    t.oncomplete = () => resolve(req && req instanceof IDBRequest ? req.result : undefined);
+    t.onerror = () => reject(t.error);
+    t.onabort = () => reject(t.error);
+  }));
+
+  const getMeta = (key) => tx("meta", "readonly", m => m.get(key));
+  const setMeta = (key, value) => tx("meta", "readwrite", m => m.put(value, key));
+
+  const applyChanges = (changes, reset) => tx("notes", "readwrite", notes => {
+    if (reset) notes.clear();
+    changes.forEach(c => { if (c.deleted) notes.delete(c.id); else notes.put(c); });
+  });
+
+  const sync = async (changesUrl) => {
+    let since = await getMeta("cursor");
+    let first = since === undefined || since === null;
+    let more = true;
+    while (more) {
+      const url = first ? changesUrl : `${changesUrl}?since=${since}`;
+      const res = await fetch(url, { headers: { "X-Requested-With": "XMLHttpRequest" }, cache: "no-store" });
+      if (!res.ok) throw new Error(`sync failed: ${res.status}`);
+      const data = await res.json();
+      await applyChanges(data.changes, first);
+      since = data.next;
+      more = data.has_more;
+      first = false;
+      await setMeta("cursor", since);
+    }
+  };
+
+  const outbox = () => tx("outbox", "readonly", o => o.getAll()).then(ops => ops.sort((a, b) => a.key - b.key));
+
+  const findQueuedAdd = (tempId) => outbox().then(ops => ops.find(op => op.type === "add" && op.id === tempId));
+
+  return {
+    supported,
+    sync,
+    allNotes: () => tx("notes", "readonly", n => n.getAll()),
+    getNote: (id) => tx("notes", "readonly", n => n.get(id)),
+    putNote: (note) => supported ? tx("notes", "readwrite", n => n.put(note)) : Promise.resolve(),
+    deleteNote: (id) => supported ? tx("notes", "readwrite", n => n.delete(id)) : Promise.resolve(),
+    outbox,
+    queueOp: (op) => op ? tx("outbox", "readwrite", o => o.add(op)) : Promise.resolve(),
+    dropOp: (key) => tx("outbox", "readwrite", o => o.delete(key)),
+    updateQueuedAdd: (tempId, fields) => findQueuedAdd(tempId).then(op => op && tx("outbox", "readwrite", o => o.put(Object.assign(op, fields)))),
+    updateQueuedEdit: (id, fields) => outbox().then(ops => {
+      const op = ops.find(o => o.type === "edit" && o.id === id);
+      return op ? tx("outbox", "readwrite", o => o.put(Object.assign(op, fields))).then(() => true) : false;
+    }),
+    dropQueuedAdd: (tempId) => findQueuedAdd(tempId).then(op => op && tx("outbox", "readwrite", o => o.delete(op.key))),
+    clear: () => tx(["notes", "meta", "outbox"], "readwrite", (n, m, o) => { n.clear(); m.clear(); o.clear(); }),
+    // A different account on this browser must never see the previous user's cache
+    claim: (username) => getMeta("username").then(owner => {
+      if (owner === username) return;
+      return tx(["notes", "meta", "outbox"], "readwrite", (n, m, o) => { n.clear(); m.clear(); o.clear(); m.put(username, "username"); });
+    })
+  };
+})();
+
+
 document.addEventListener("DOMContentLoaded", () => {
  const qsa = (s, el = document) => Array.from((el || document).querySelectorAll(s));
 
 
  // Auto-hide flashes after 3.8s
  setTimeout(() => {
-   qsa(".flash").forEach(el => {
+   qsa(".flash:not(#offline-banner)").forEach(el => {
      el.style.transition = "opacity .35s, transform .35s";
      el.style.opacity = "0";
      el.style.transform = "translateY(-8px)";
@@ -14,15 +95,602 @@ document.addEventListener("DOMContentLoaded", () => {
  }, 3800);
 
 
- // data-confirm attribute
- qsa("[data-confirm]").forEach(el => {
-   el.addEventListener("click", (e) => {
-     const msg = el.dataset.confirm || "Are you sure?";
-     if (!confirm(msg)) e.preventDefault();
-   });
+ // data-confirm attribute (delegated so cards inserted later are covered too)
+ document.addEventListener("click", (e) => {
+   const el = e.target.closest("[data-confirm]");
+   if (!el) return;
+   const msg = el.dataset.confirm || "Are you sure?";
+   if (!confirm(msg)) e.preventDefault();
  });
 
 
+ // Note grids on the home page (shared by the live feed and the offline cache)
+ const notesRoot = document.getElementById("notes");
+ const grids = notesRoot ? { active: document.getElementById("active-notes"), archived: document.getElementById("archived-notes") } : {};
+ const empties = notesRoot ? { active: document.getElementById("active-empty"), archived: document.getElementById("archived-empty") } : {};
+ const syncEmpty = () => Object.keys(grids).forEach(k => { empties[k].hidden = grids[k].children.length > 0; });
+ const removeCard = (id) => qsa(`.note-card[data-note-id="${id}"]`, notesRoot).forEach(el => el.remove());
+ // Same order as the server (ordering.OrderIndex): pinned first, then the page's sort field, then id
+ const sortBy = notesRoot ? notesRoot.dataset.sort || "created" : "created";
+ const sortDesc = notesRoot ? notesRoot.dataset.order === "desc" : false;
+ const cardKey = (card) => sortBy === "title" ? card.querySelector("h4").textContent.toLowerCase()
+   : Number(sortBy === "updated" ? card.dataset.updated : card.dataset.created) || 0;
+ const compareCards = (a, b) => {
+   const pa = a.classList.contains("pinned"), pb = b.classList.contains("pinned");
+   if (pa !== pb) return pa ? -1 : 1;
+   const ka = cardKey(a), kb = cardKey(b);
+   const cmp = ka < kb ? -1 : ka > kb ? 1 : Number(a.dataset.noteId) - Number(b.dataset.noteId);
+   return sortDesc ? -cmp : cmp;
+ };
+ const placeCard = (note, card) => {
+   const grid = grids[note.status];
+   const existing = notesRoot.querySelector(`.note-card[data-note-id="${note.id}"]`);
+   if (existing) existing.remove();
+   if (!grid) return;
+   const next = Array.from(grid.children).find(c => compareCards(card, c) < 0);
+   // The grid holds one page: a card that sorts past either end belongs to another page
+   if ((!next && grid.hasAttribute("data-more")) || (next === grid.firstElementChild && Number(grid.dataset.page) > 1)) return;
+   grid.insertBefore(card, next || null);
+ };
+ const cardFromHtml = (html) => {
+   const tpl = document.createElement("template");
+   tpl.innerHTML = html.trim();
+   return tpl.content.firstElementChild;
+ };
+ const noteUrl = (kind, id) => notesRoot.dataset[kind + "Url"].replace(/0$/, String(id));
+ const attachmentUrl = (kind, id, sha) => notesRoot.dataset[kind + "Url"].replace(/\/0\/_$/, `/${id}/${sha}`);
+
+
+ // Live note feed: patch the grids in place from the per-user SSE stream
+ if (notesRoot && notesRoot.dataset.eventsUrl && window.EventSource) {
+   const feed = new EventSource(notesRoot.dataset.eventsUrl);
+   ["added", "edited", "archived", "restored"].forEach(type => feed.addEventListener(type, (e) => {
+     const data = JSON.parse(e.data);
+     placeCard(data.note, cardFromHtml(data.html));
+     syncEmpty();
+     NoteCache.putNote(data.note).catch(() => {});
+   }));
+   feed.addEventListener("deleted", (e) => {
+     const id = JSON.parse(e.data).note.id;
+     removeCard(id);
+     syncEmpty();
+     NoteCache.deleteNote(id).catch(() => {});
+   });
+   feed.addEventListener("resync", () => { feed.close(); window.location.reload(); });
+   window.addEventListener("beforeunload", () => feed.close());
+ }
+
+
+ // In-page flash messages for note actions done without a reload
+ const showFlash = (msg, category) => {
+   const main = document.querySelector("main");
+   if (!main || !msg) return;
+   const el = document.createElement("div");
+   el.className = "flash " + (category || "info");
+   el.textContent = msg;
+   main.parentElement.insertBefore(el, main);
+   setTimeout(() => {
+     el.style.transition = "opacity .35s, transform .35s";
+     el.style.opacity = "0";
+     el.style.transform = "translateY(-8px)";
+     setTimeout(() => el.remove(), 420);
+   }, 3800);
+ };
+
+
+ // Note form: switches between "new" and "edit" in place instead of loading /edit_note
+ const noteForm = document.getElementById("note-form");
+ // The version being edited, as the server sent it: saves of large notes are diffed against it
+ let formBase = null;
+ const setFormMode = (note) => {
+   // Typing still waiting for its autosave belongs to the note being switched away from
+   if (drafts) drafts.flush();
+   formBase = note && typeof note.content === "string" ? { id: note.id, seq: note.seq || 0, content: note.content } : null;
+   const heading = document.getElementById("note-form-heading");
+   const title = noteForm.querySelector('[name="title"]');
+   const content = noteForm.querySelector('[name="content"]');
+   const tags = noteForm.querySelector('[name="tags"]');
+   const button = noteForm.querySelector('button[type="submit"]');
+   let base = noteForm.querySelector('[name="base_seq"]');
+   if (note) {
+     noteForm.dataset.noteId = note.id;
+     noteForm.action = noteUrl("edit", note.id);
+     if (!base) {
+       base = document.createElement("input");
+       base.type = "hidden";
+       base.name = "base_seq";
+       noteForm.prepend(base);
+     }
+     base.value = note.seq || 0;
+     title.value = note.title;
+     content.value = note.content || "";
+     if (tags) tags.value = (note.tags || []).join(", ");
+     if (heading) heading.textContent = "Edit Note";
+     button.textContent = "Save changes";
+     noteForm.setAttribute("onsubmit", "return confirm('Are you sure you want to save changes?')");
+     noteForm.scrollIntoView({ behavior: "smooth" });
+   } else {
+     delete noteForm.dataset.noteId;
+     noteForm.action = notesRoot.dataset.addUrl;
+     if (base) base.remove();
+     title.value = "";
+     content.value = "";
+     if (tags) tags.value = "";
+     if (heading) heading.textContent = "New Note";
+     button.textContent = "Add note";
+     noteForm.setAttribute("onsubmit", "return confirm('Add this note?')");
+     if (window.location.pathname !== new URL(notesRoot.dataset.homeUrl, window.location.href).pathname) {
+       window.history.replaceState(null, "", notesRoot.dataset.homeUrl);
+     }
+   }
+   // A draft made against another version must not be patched onto this one
+   if (drafts && drafts.restore(note) && formBase && base.value !== String(formBase.seq)) formBase = null;
+ };
+
+ const applyResult = (data) => {
+   // A note someone shared with us: not ours to list or cache
+   if (data.note.username && data.note.username !== notesRoot.dataset.username) return;
+   if (data.event === "deleted") {
+     removeCard(data.note.id);
+     NoteCache.deleteNote(data.note.id).catch(() => {});
+   } else {
+     placeCard(data.note, cardFromHtml(data.html));
+     NoteCache.putNote(data.note).catch(() => {});
+   }
+   syncEmpty();
+ };
+
+ const xhr = async (url, options) => {
+   const res = await fetch(url, Object.assign({ headers: { "X-Requested-With": "XMLHttpRequest" }, credentials: "same-origin" }, options));
+   if (res.status === 401) { window.location.href = notesRoot.dataset.loginUrl; throw new Error("logged out"); }
+   const data = await res.json();
+   return { res, data };
+ };
+
+
+ // Offline-first: mirror notes into IndexedDB, draw from it when the network is gone,
+ // and queue edits made offline for replay (stale edits are detected by note seq)
+ const offline = (notesRoot && NoteCache.supported) ? (() => {
+   const loginPath = new URL(notesRoot.dataset.loginUrl, window.location.href).pathname;
+   // Same cut as the server-rendered cards (models.PREVIEW_CHARS)
+   const preview = (text) => (text || "").length > 200 ? text.slice(0, 200).trimEnd() + "\u2026" : (text || "");
+
+   const buildCard = (note) => {
+     const card = document.createElement("div");
+     card.className = "note-card" + (note.status === "archived" ? " archived" : "") + (note.pinned ? " pinned" : "");
+     card.dataset.noteId = note.id;
+     card.dataset.seq = note.seq || 0;
+     card.dataset.created = note.created_at || 0;
+     card.dataset.updated = note.updated_at || 0;
+     const h4 = document.createElement("h4"); h4.textContent = note.title;
+     const p = document.createElement("p"); p.style.color = "var(--muted)"; p.textContent = preview(note.content);
+     const tagList = document.createElement("div"); tagList.className = "note-tags";
+     (note.tags || []).forEach(tag => {
+       const a = document.createElement("a"); a.className = "tag"; a.textContent = `#${tag}`;
+       a.href = `${notesRoot.dataset.homeUrl}?tag=${encodeURIComponent(tag)}`;
+       tagList.appendChild(a);
+     });
+     const files = document.createElement("ul"); files.className = "note-attachments";
+     (note.attachments || []).forEach(file => {
+       const li = document.createElement("li");
+       const a = document.createElement("a"); a.href = attachmentUrl("attachment", note.id, file.sha256); a.textContent = file.name;
+       const size = document.createElement("small"); size.textContent = `${Math.max(1, Math.round(file.size / 1024))} kB`;
+       li.append(a, " ", size);
+       files.appendChild(li);
+     });
+     const shares = document.createElement("ul"); shares.className = "note-shares";
+     Object.entries(note.shares || {}).forEach(([username, permission]) => {
+       const li = document.createElement("li");
+       const small = document.createElement("small"); small.textContent = `can ${permission}`;
+       li.append(username, " ", small);
+       shares.appendChild(li);
+     });
+     const small = document.createElement("small"); small.style.color = "var(--muted)"; small.textContent = note.timestamp || "";
+     const actions = document.createElement("div");
+     actions.style.cssText = "margin-top:10px;display:flex;gap:8px;";
+     const link = (cls, action, kind, text, confirmMsg) => {
+       const a = document.createElement("a");
+       a.className = "btn " + cls; a.dataset.action = action; a.href = noteUrl(kind, note.id); a.textContent = text;
+       if (confirmMsg) a.dataset.confirm = confirmMsg;
+       actions.appendChild(a);
+     };
+     if (note.status === "archived") {
+       link("btn-success", "restore", "restore", "Restore");
+       link("btn-danger", "delete", "delete", "Delete", "Permanently delete this note?");
+     } else {
+       link("btn-secondary", "edit", "edit", "Edit");
+       link("btn-secondary", "pin", "pin", note.pinned ? "Unpin" : "Pin");
+       link("btn-danger", "archive", "archive", "Archive", "Archive this note?");
+     }
+     card.append(h4, p);
+     if (tagList.children.length) card.append(tagList);
+     if (files.children.length) card.append(files);
+     if (shares.children.length) card.append(shares);
+     card.append(small, actions);
+     return card;
+   };
+
+   const renderFromCache = () => NoteCache.allNotes().then(notes => {
+     Object.values(grids).forEach(g => { g.innerHTML = ""; });
+     const cards = notes.filter(n => grids[n.status]).map(n => [n.status, buildCard(n)]);
+     cards.sort((a, b) => compareCards(a[1], b[1])).forEach(([status, card]) => grids[status].appendChild(card));
+     syncEmpty();
+   });
+
+   const showOffline = () => {
+     if (document.getElementById("offline-banner")) return;
+     const banner = document.createElement("div");
+     banner.id = "offline-banner";
+     banner.className = "flash info";
+     banner.textContent = "You are offline. Changes are saved on this device and will sync when you reconnect.";
+     notesRoot.parentElement.insertBefore(banner, notesRoot.parentElement.firstChild);
+   };
+
+   const sendOp = (op) => {
+     const headers = { "X-Requested-With": "XMLHttpRequest" };
+     if (op.type === "add" || op.type === "edit") {
+       const body = new FormData();
+       body.append("title", op.title);
+       body.append("content", op.content);
+       if (op.tags !== undefined) body.append("tags", op.tags);
+       if (op.type === "edit") body.append("base_seq", op.baseSeq);
+       return fetch(op.type === "add" ? notesRoot.dataset.addUrl : noteUrl("edit", op.id), { method: "POST", body, headers });
+     }
+     return fetch(`${noteUrl(op.type, op.id)}?base_seq=${op.baseSeq}`, { headers });
+   };
+
+   // What became of offline changes the server did not take as they were; shown after the reload
+   const NOTICES_KEY = "notepad-replay-notices";
+   const notices = JSON.parse(sessionStorage.getItem(NOTICES_KEY) || "[]");
+   sessionStorage.removeItem(NOTICES_KEY);
+   notices.forEach(msg => showFlash(msg, "error"));
+
+   const rejected = async (op, res) => {
+     const note = op.title ? op : await NoteCache.getNote(op.id).catch(() => null);
+     const name = note && note.title ? `"${note.title}"` : "a note";
+     if (res.status === 409) return `${name} was changed elsewhere while you were offline, so your ${op.type} was not applied. Check the latest version and try again.`;
+     let msg = "";
+     try { msg = (await res.json()).msg || ""; } catch (err) { msg = ""; }
+     return `Your offline ${op.type} of ${name} could not be applied${msg ? ": " + msg : "."}`;
+   };
+
+   // Returns true when queued work reached the server and the page should reload
+   const replay = async () => {
+     const ops = await NoteCache.outbox();
+     if (!ops.length) return false;
+     // Only the first queued op on a note is checked against the server's seq;
+     // the ones after it were made on top of it on this device
+     const applied = new Set();
+     const failed = [];
+     for (const op of ops) {
+       let res;
+       const send = applied.has(op.id) ? Object.assign({}, op, { baseSeq: "" }) : op;
+       try { res = await sendOp(send); } catch (err) { return false; }
+       if (res.status === 401 || (res.redirected && new URL(res.url).pathname === loginPath)) return false;
+       if (res.status === 409 && op.type === "edit") {
+         // Someone else changed the note meanwhile: keep both versions
+         try { await sendOp({ type: "add", title: `${op.title} (offline copy)`, content: op.content, tags: op.tags }); } catch (err) { return false; }
+         failed.push(`"${op.title}" was changed elsewhere while you were offline. Your version was saved as "${op.title} (offline copy)".`);
+       } else if (res.ok) {
+         applied.add(op.id);
+       } else {
+         failed.push(await rejected(op, res));
+       }
+       await NoteCache.dropOp(op.key);
+       // Kept as we go: a replay cut short still reports what it already dropped
+       if (failed.length) sessionStorage.setItem(NOTICES_KEY, JSON.stringify(failed));
+     }
+     return true;
+   };
+
+   const queue = async (op, note) => {
+     if (note) await NoteCache.putNote(note);
+     await NoteCache.queueOp(op);
+     await renderFromCache();
+     showOffline();
+   };
+
+   const queueForm = async () => {
+     const title = noteForm.querySelector('[name="title"]').value.trim();
+     const content = noteForm.querySelector('[name="content"]').value.trim();
+     const tagsField = noteForm.querySelector('[name="tags"]');
+     const tags = tagsField ? tagsField.value : undefined;
+     // Rough client-side mirror of models.parse_tags, for the local copy only; the server re-validates
+     const tagList = tags === undefined ? undefined : [...new Set(tags.split(/[,\s]+/).map(t => t.replace(/^#/, "").toLowerCase()).filter(Boolean))].sort();
+     if (!title) return;
+     const id = noteForm.dataset.noteId ? parseInt(noteForm.dataset.noteId, 10) : null;
+     const stamp = new Date().toISOString().slice(0, 19).replace("T", " ");
+     const epoch = Math.floor(Date.now() / 1000);
+     if (id === null) {
+       const tempId = -Date.now();
+       await queue({ type: "add", id: tempId, title, content, tags }, { id: tempId, title, content, tags: tagList, timestamp: stamp, created_at: epoch, updated_at: epoch, status: "active", seq: 0 });
+     } else if (id < 0) {
+       // Not on the server yet: fold the edit into the pending add
+       await NoteCache.updateQueuedAdd(id, { title, content, tags });
+       await queue(null, { id, title, content, tags: tagList, timestamp: stamp, created_at: epoch, updated_at: epoch, status: "active", seq: 0 });
+     } else {
+       const current = await NoteCache.getNote(id);
+       const baseSeq = current ? (current.seq || 0) : parseInt((noteForm.querySelector('[name="base_seq"]') || {}).value || "0", 10);
+       const local = Object.assign({}, current, { id, title, content, timestamp: stamp, updated_at: epoch }, tagList ? { tags: tagList } : {});
+       if (await NoteCache.updateQueuedEdit(id, { title, content, tags })) await queue(null, local);
+       else await queue({ type: "edit", id, title, content, tags, baseSeq }, local);
+     }
+     setFormMode(null);
+   };
+
+   const queueAction = async (action, id) => {
+     const note = await NoteCache.getNote(id);
+     if (!note) return;
+     if (action === "edit") { setFormMode(note); return; }
+     if (action === "detach") { showFlash("Attachments can only be changed while online.", "error"); return; }
+     if (action === "unshare") { showFlash("Sharing can only be changed while online.", "error"); return; }
+     if (id < 0) {
+       if (action !== "delete" && action !== "archive") return;
+       // Never reached the server: just forget it
+       await NoteCache.dropQueuedAdd(id);
+       await NoteCache.deleteNote(id);
+       await renderFromCache();
+       return;
+     }
+     const op = { type: action, id, baseSeq: note.seq || 0 };
+     if (action === "delete") {
+       await NoteCache.deleteNote(id);
+       await queue(op, null);
+     } else if (action === "pin") {
+       await queue(op, Object.assign({}, note, { pinned: !note.pinned }));
+     } else {
+       await queue(op, Object.assign({}, note, { status: action === "archive" ? "archived" : "active" }));
+     }
+   };
+
+   const start = () => replay().then(replayed => {
+     if (replayed) { window.location.reload(); return; }
+     return NoteCache.sync(notesRoot.dataset.changesUrl).then(renderFromCache);
+   }).catch(() => renderFromCache().then(showOffline));
+
+   if (notesRoot.hasAttribute("data-shell")) {
+     // The offline shell does not know who is signed in: show this device's copy, and
+     // only sync (and claim the cache) from the real page once the network is back
+     renderFromCache().then(showOffline).catch(() => {});
+     window.addEventListener("online", () => window.location.reload());
+     return { queueForm, queueAction };
+   }
+
+   NoteCache.claim(notesRoot.dataset.username).then(() => {
+     if (navigator.onLine) start();
+     else renderFromCache().then(showOffline);
+   }).catch(() => {});
+   window.addEventListener("online", start);
+   window.addEventListener("offline", showOffline);
+
+   // Forget the local copy on logout
+   document.addEventListener("click", (e) => {
+     const link = e.target.closest('a[href$="/logout"]');
+     if (!link || e.defaultPrevented) return;
+     NoteCache.clear().catch(() => {});
+     if (navigator.serviceWorker && navigator.serviceWorker.controller) navigator.serviceWorker.controller.postMessage("clear");
+   });
+
+   if ("serviceWorker" in navigator && notesRoot.dataset.swUrl) {
+     navigator.serviceWorker.register(notesRoot.dataset.swUrl, { scope: "/" }).catch(() => {});
+   }
+
+   return { queueForm, queueAction };
+ })() : null;
+
+
+ // Autosave: the form goes to the draft store a second after typing stops. The note itself is
+ // only written on submit, and a successful submit drops its draft on the server.
+ const DRAFT_DELAY_MS = 1000;
+ const drafts = (notesRoot && noteForm && notesRoot.dataset.draftsUrl) ? (() => {
+   const status = document.getElementById("draft-status");
+   const field = (name) => noteForm.querySelector(`[name="${name}"]`);
+   const key = () => noteForm.dataset.noteId || "new";
+   const url = (k) => `${notesRoot.dataset.draftsUrl}/${k}`;
+   const headers = { "X-Requested-With": "XMLHttpRequest", "Content-Type": "application/json" };
+   let timer = null, saving = Promise.resolve(), held = {}, touched = false;
+   const current = () => ({
+     title: field("title").value, content: field("content").value, tags: field("tags") ? field("tags").value : "",
+     base_seq: field("base_seq") ? parseInt(field("base_seq").value || "0", 10) : null, client_ts: Date.now()
+   });
+   const setStatus = (text) => { if (status) status.textContent = text; };
+
+   const save = () => {
+     timer = null;
+     const k = key();
+     if (k.startsWith("-")) return saving;
+     const draft = current();
+     held[k] = draft;
+     saving = saving.then(() => fetch(url(k), { method: "PUT", credentials: "same-origin", headers, body: JSON.stringify(draft) }))
+       .then(res => { if (res.ok) setStatus("Draft saved"); })
+       .catch(() => {});
+     return saving;
+   };
+
+   noteForm.addEventListener("input", () => {
+     touched = true;
+     setStatus("");
+     clearTimeout(timer);
+     timer = setTimeout(save, DRAFT_DELAY_MS);
+   });
+   // Leaving the page: hand over what is pending without waiting for the debounce
+   window.addEventListener("pagehide", () => {
+     if (!timer || key().startsWith("-")) return;
+     clearTimeout(timer);
+     timer = null;
+     navigator.sendBeacon(url(key()), new Blob([JSON.stringify(current())], { type: "application/json" }));
+   });
+
+   // Before a submit: no autosave may land after the note is saved and bring its draft back
+   const settle = () => { clearTimeout(timer); timer = null; return saving; };
+   const flush = () => { if (timer) { clearTimeout(timer); save(); } };
+   const forget = (k) => { delete held[k]; setStatus(""); };
+   // Puts a held draft into the form; for an edit it keeps the seq the draft was made against,
+   // so saving it over a newer version is still caught as a conflict
+   const restore = (note) => {
+     const draft = held[note ? String(note.id) : "new"];
+     if (!draft) return false;
+     field("title").value = draft.title;
+     field("content").value = draft.content;
+     if (field("tags")) field("tags").value = draft.tags;
+     if (note && draft.base_seq !== null && field("base_seq")) field("base_seq").value = draft.base_seq;
+     setStatus("Unsaved draft restored");
+     return true;
+   };
+
+   fetch(notesRoot.dataset.draftsUrl, { credentials: "same-origin", headers })
+     .then(res => res.ok ? res.json() : null)
+     .then(data => {
+       if (!data || !data.success) return;
+       held = Object.assign(data.drafts, held);
+       if (!touched && restore(noteForm.dataset.noteId ? { id: noteForm.dataset.noteId } : null)) formBase = null;
+     })
+     .catch(() => {});
+
+   return { key, settle, flush, forget, restore };
+ })() : null;
+
+
+ // Edits of large notes send a patch: the one changed range, with offsets in code points
+ // (what the server indexes by), instead of the whole body
+ const PATCH_MIN_CHARS = 4096;
+ const codePoints = (s) => {
+   let n = 0;
+   for (let i = 0; i < s.length; i++) { const c = s.charCodeAt(i); if (c < 0xDC00 || c > 0xDFFF) n++; }
+   return n;
+ };
+ const contentPatch = (base, text) => {
+   const max = Math.min(base.length, text.length);
+   let start = 0, end = 0;
+   while (start < max && base.charCodeAt(start) === text.charCodeAt(start)) start++;
+   while (end < max - start && base.charCodeAt(base.length - 1 - end) === text.charCodeAt(text.length - 1 - end)) end++;
+   // Never cut a surrogate pair in half
+   if (start > 0 && (base.charCodeAt(start - 1) & 0xFC00) === 0xD800) start--;
+   if (end > 0 && (base.charCodeAt(base.length - end) & 0xFC00) === 0xDC00) end--;
+   const from = codePoints(base.slice(0, start));
+   return [from, from + codePoints(base.slice(start, base.length - end)), text.slice(start, text.length - end)];
+ };
+ const patchRequest = () => {
+   if (!formBase || String(formBase.id) !== noteForm.dataset.noteId || formBase.content.length < PATCH_MIN_CHARS) return null;
+   // What posting the form would store: CRLF line breaks (form encoding), trimmed (main.note_form)
+   const text = noteForm.querySelector('[name="content"]').value.replace(/\r\n|\r|\n/g, "\r\n").trim();
+   const tags = noteForm.querySelector('[name="tags"]');
+   const body = {
+     base_seq: formBase.seq, length: codePoints(formBase.content), patches: [contentPatch(formBase.content, text)],
+     title: noteForm.querySelector('[name="title"]').value
+   };
+   if (tags) body.tags = tags.value;
+   return { body, text };
+ };
+
+
+ // AJAX note mutations: update the grid in place; the plain form/link flow stays as the fallback
+ if (notesRoot && noteForm) {
+   noteForm.addEventListener("submit", async (e) => {
+     if (e.defaultPrevented) return;
+     e.preventDefault();
+     if (drafts) await drafts.settle();
+     if (!navigator.onLine && offline) { await offline.queueForm(); return; }
+     const draftKey = drafts ? drafts.key() : null;
+     try {
+       const patch = patchRequest();
+       let sent = patch ? await xhr(noteUrl("patch", formBase.id), {
+         method: "POST", body: JSON.stringify(patch.body),
+         headers: { "X-Requested-With": "XMLHttpRequest", "Content-Type": "application/json" }
+       }) : null;
+       // 422: the patch did not fit the server's copy, so send the whole note instead
+       if (sent && sent.res.status === 422) sent = null;
+       if (sent && sent.data.success) sent.data.note.content = patch.text;
+       const { res, data } = sent || await xhr(noteForm.action, { method: "POST", body: new FormData(noteForm) });
+       if (res.status === 409) {
+         // Show the other device's version; the next save overwrites it deliberately
+         applyResult(Object.assign({ event: "edited" }, data));
+         noteForm.querySelector('[name="base_seq"]').value = data.note.seq || 0;
+         formBase = { id: data.note.id, seq: data.note.seq || 0, content: data.note.content || "" };
+         showFlash("This note was changed elsewhere. The latest version is shown below; save again to overwrite it.", "error");
+         return;
+       }
+       if (!data.success) { showFlash(data.msg, "error"); return; }
+       if (drafts) drafts.forget(draftKey);
+       applyResult(data);
+       setFormMode(null);
+       showFlash(data.msg, data.category);
+     } catch (err) {
+       if (!navigator.onLine && offline) await offline.queueForm();
+       else noteForm.submit();
+     }
+   });
+ }
+
+ if (notesRoot) {
+   // Attachments go up as the raw request body, which the server streams straight into its store
+   document.addEventListener("submit", async (e) => {
+     const form = e.target.closest(".attach-form");
+     if (!form || e.defaultPrevented) return;
+     const file = form.querySelector('[name="file"]').files[0];
+     if (!file) return;
+     e.preventDefault();
+     if (!navigator.onLine) { showFlash("Attachments can only be added while online.", "error"); return; }
+     try {
+       const { data } = await xhr(`${form.action}?name=${encodeURIComponent(file.name)}`, {
+         method: "POST", body: file,
+         headers: { "X-Requested-With": "XMLHttpRequest", "Content-Type": file.type || "application/octet-stream" }
+       });
+       if (!data.success) { showFlash(data.msg, "error"); return; }
+       applyResult(data);
+       showFlash(data.msg, data.category);
+     } catch (err) {
+       form.submit();
+     }
+   });
+
+   document.addEventListener("submit", async (e) => {
+     const form = e.target.closest(".share-form");
+     if (!form || e.defaultPrevented) return;
+     e.preventDefault();
+     if (!navigator.onLine) { showFlash("Sharing can only be changed while online.", "error"); return; }
+     try {
+       const { data } = await xhr(form.action, { method: "POST", body: new FormData(form) });
+       if (!data.success) { showFlash(data.msg, "error"); return; }
+       applyResult(data);
+       showFlash(data.msg, data.category);
+     } catch (err) {
+       form.submit();
+     }
+   });
+
+   // Registered on document after the confirm handlers so a cancelled confirm wins
+   document.addEventListener("click", async (e) => {
+     const link = e.target.closest("a[data-action]");
+     if (!link || !notesRoot.contains(link) || e.defaultPrevented) return;
+     e.preventDefault();
+     const card = link.closest(".note-card");
+     const id = parseInt(card.dataset.noteId, 10);
+     const action = link.dataset.action;
+     if (offline && (!navigator.onLine || id < 0)) { await offline.queueAction(action, id); return; }
+     try {
+       if (action === "edit") {
+         const { data } = await xhr(link.href);
+         if (data.success && noteForm) setFormMode(data.note);
+         else showFlash(data.msg, "error");
+         return;
+       }
+       const { res, data } = await xhr(`${link.href}?base_seq=${card.dataset.seq || 0}`);
+       if (res.status === 409) {
+         applyResult(Object.assign({ event: "edited" }, data));
+         showFlash("This note was changed elsewhere. Check the latest version and try again.", "error");
+         return;
+       }
+       if (!data.success) { showFlash(data.msg, "error"); return; }
+       applyResult(data);
+       showFlash(data.msg, data.category);
+     } catch (err) {
+       window.location.href = link.href;
+     }
+   });
+ }
+
+
  // UNIVERSAL PASSWORD TOGGLE - REPLACED ALL INDIVIDUAL TOGGLE FUNCTIONS
  function initializeAllPasswordToggles() {
      qsa(".eye-btn").forEach(btn => {
@@ -265,10 +933,9 @@ document.addEventListener("DOMContentLoaded", () => {
      }
      const data = await res.json();
      if (data.success) {
-       // show OTP on-screen (demo mode) and countdown
-       otpInput.value = data.otp || "";
+       // The code goes to the account's email; just count down
        startOtpCountdown(data.expiry || 30);
-       alert("OTP shown on screen (demo). It will expire in " + (data.expiry || 30) + " seconds.");
+       alert("OTP sent to the email on your account. It expires in " + (data.expiry || 30) + " seconds.");
      } else {
        alert(data.msg || "Failed to request OTP.");
      }
@@ -313,18 +980,14 @@ document.addEventListener("DOMContentLoaded", () => {
 });
 
 // Add confirmation for restore actions
-document.addEventListener('DOMContentLoaded', function() {
-    // Select all restore buttons and add confirmation
-    const restoreButtons = document.querySelectorAll('a.btn-success[href*="restore_note"]');
-    
-    restoreButtons.forEach(button => {
-        button.addEventListener('click', function(e) {
-            const noteTitle = this.closest('.note-card').querySelector('h4').textContent;
-            if (!confirm(`Are you sure you want to restore "${noteTitle}"?`)) {
-                e.preventDefault();
-            }
-        });
-    });
+document.addEventListener('click', function(e) {
+    // Delegated so restore buttons on cards added by the live feed are covered too
+    const button = e.target.closest('a.btn-success[href*="restore_note"]');
+    if (!button) return;
+    const noteTitle = button.closest('.note-card').querySelector('h4').textContent;
+    if (!confirm(`Are you sure you want to restore "${noteTitle}"?`)) {
+        e.preventDefault();
+    }
 });
 
 function validateEditForm(noteId) {
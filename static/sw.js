@@ -0,0 +1,83 @@
+// static/sw.js
+// v1 kept the server-rendered /home, notes and all: activating v2 deletes it
+const SHELL_CACHE = "notepad-shell-v2";
+const HOME_PATH = "/home";
+// home.html without any notes or user details; offline, the page draws the notes from IndexedDB
+const SHELL_PATH = "/home/shell";
+const NAV_TIMEOUT_MS = 3000;
+
+
+const refreshShell = () => caches.open(SHELL_CACHE).then(cache => cache.add(SHELL_PATH)).catch(() => {});
+
+self.addEventListener("install", (event) => {
+  event.waitUntil(refreshShell());
+  self.skipWaiting();
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(keys.filter(k => k !== SHELL_CACHE).map(k => caches.delete(k))))
+      .then(() => self.clients.claim())
+  );
+});
+
+
+// Page asks us to forget everything (logout)
+self.addEventListener("message", (event) => {
+  if (event.data === "clear") event.waitUntil(caches.delete(SHELL_CACHE));
+});
+
+
+const withTimeout = (promise, ms) => new Promise((resolve, reject) => {
+  const t = setTimeout(() => reject(new Error("timeout")), ms);
+  promise.then(r => { clearTimeout(t); resolve(r); }, e => { clearTimeout(t); reject(e); });
+});
+
+
+self.addEventListener("fetch", (event) => {
+  const req = event.request;
+  if (req.method !== "GET") return;
+  const url = new URL(req.url);
+  if (url.origin !== self.location.origin) return;
+
+  // Fingerprinted bundles never change: cache-first forever
+  if (url.pathname.startsWith("/assets/")) {
+    event.respondWith(caches.open(SHELL_CACHE).then(cache =>
+      cache.match(req).then(hit => hit || fetch(req).then(res => {
+        if (res.ok) cache.put(req, res.clone());
+        return res;
+      }))
+    ));
+    return;
+  }
+
+  // Unbuilt static files: serve the cached copy, refresh it in the background
+  if (url.pathname.startsWith("/static/")) {
+    event.respondWith(caches.open(SHELL_CACHE).then(cache =>
+      cache.match(req).then(hit => {
+        const network = fetch(req).then(res => {
+          if (res.ok) cache.put(req, res.clone());
+          return res;
+        });
+        return hit || network;
+      })
+    ));
+    return;
+  }
+
+  // Navigations: network first so flashes and redirects stay correct, falling back to the
+  // data-free shell. Pages with notes in them are never cached: they are no-store, and
+  // whoever uses this browser next must not see them.
+  const offlineCapable = url.pathname === "/" || url.pathname === HOME_PATH || url.pathname.startsWith("/edit_note/");
+  if (req.mode === "navigate" && offlineCapable) {
+    const network = fetch(req).then(res => {
+      // Keep the shell's asset URLs in step with the deployed bundles
+      if (res.ok && !res.redirected && url.pathname === HOME_PATH) refreshShell();
+      return res;
+    });
+    event.respondWith(withTimeout(network, NAV_TIMEOUT_MS).catch(() =>
+      caches.match(SHELL_PATH).then(hit => hit || network)
+    ));
+  }
+});
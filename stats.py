@@ -0,0 +1,158 @@
+# stats.py
+import logging
+from datetime import date, datetime, timedelta
+
+import state
+
+log = logging.getLogger(__name__)
+
+COUNTED = ('active', 'archived')
+EVENTS = ('signups', 'added', 'edited', 'archived', 'restored', 'deleted')
+# Daily rollups are kept a little over a year
+DAY_TTL = 400 * 24 * 3600
+DEFAULT_DAYS = 30
+# Buckets up to 2**24 notes per user
+MAX_BUCKET = 24
+
+# Aggregates live in the state backend so every node adds to the same numbers, and a
+# read is a fixed number of lookups whatever the size of the data:
+#   stats:users, stats:notes:<status>       totals
+#   stats:user_notes:<username>             notes per user (active + archived)
+#   stats:bucket:<n>                        users with 2**(n-1) .. 2**n - 1 notes
+#   stats:day:<YYYY-MM-DD>:<event>          daily rollups
+# The mutation paths move them by deltas; seed() sets them from one full scan, once per
+# backend (or when an admin asks for a recount).
+
+def day_key(day, event):
+    return state.key("stats", "day", day.isoformat(), event)
+
+def bucket_of(count):
+    return count.bit_length()
+
+def bucket_label(bucket):
+    low, high = 1 << (bucket - 1), (1 << bucket) - 1
+    return str(low) if low == high else f"{low}-{high}"
+
+def _incr(name, amount=1, ttl=None):
+    try:
+        return state.backend.incr(name, amount, ttl=ttl)
+    except (state.StateError, OSError, ConnectionError):
+        # Stats must never fail a save; a recount repairs what was missed
+        log.exception("Failed to update %s", name)
+        return None
+
+def record_signup(today=None):
+    _incr(state.key("stats", "users"))
+    _incr(day_key(today or date.today(), "signups"), ttl=DAY_TTL)
+
+def note_event(event, username, old_status, new_status, today=None):
+    # old_status is None for a new note, new_status 'deleted' for a permanent delete
+    if event in EVENTS:
+        _incr(day_key(today or date.today(), event), ttl=DAY_TTL)
+    if old_status == new_status:
+        return
+    if old_status in COUNTED:
+        _incr(state.key("stats", "notes", old_status), -1)
+    if new_status in COUNTED:
+        _incr(state.key("stats", "notes", new_status), 1)
+    delta = (new_status in COUNTED) - (old_status in COUNTED)
+    if delta:
+        count = _incr(state.key("stats", "user_notes", username), delta)
+        if count is not None:
+            old_bucket, new_bucket = bucket_of(count - delta), bucket_of(count)
+            if old_bucket != new_bucket:
+                if old_bucket:
+                    _incr(state.key("stats", "bucket", old_bucket), -1)
+                if new_bucket:
+                    _incr(state.key("stats", "bucket", new_bucket), 1)
+
+def _created_day(value):
+    # users.json keeps created_at as an ISO string, notes as an epoch
+    try:
+        if isinstance(value, str):
+            return datetime.fromisoformat(value).date()
+        if isinstance(value, int) and value > 0:
+            return datetime.fromtimestamp(value).date()
+    except (ValueError, OverflowError, OSError):
+        pass
+    return None
+
+def seed(users, store):
+    # The one full scan: sets every aggregate from the data. Signups and added notes per
+    # day are rebuilt from created_at; edits, archives and deletes only exist as counted live.
+    backend = state.backend
+    with store.lock:
+        notes = store.load()
+        totals = {status: 0 for status in COUNTED}
+        per_user, added = {}, {}
+        for n in notes:
+            if n.status in COUNTED:
+                totals[n.status] += 1
+                per_user[n.username] = per_user.get(n.username, 0) + 1
+            day = _created_day(n.created_at)
+            if day is not None:
+                added[day] = added.get(day, 0) + 1
+        signups = {}
+        for u in users:
+            day = _created_day(u.get('created_at'))
+            if day is not None:
+                signups[day] = signups.get(day, 0) + 1
+        buckets = {}
+        for count in per_user.values():
+            buckets[bucket_of(count)] = buckets.get(bucket_of(count), 0) + 1
+        for pattern in ("user_notes:*", "bucket:*"):
+            for name in backend.keys(state.key("stats", pattern)):
+                backend.delete(name)
+        backend.set(state.key("stats", "users"), str(len(users)))
+        for status, count in totals.items():
+            backend.set(state.key("stats", "notes", status), str(count))
+        for username, count in per_user.items():
+            backend.set(state.key("stats", "user_notes", username), str(count))
+        for bucket, count in buckets.items():
+            backend.set(state.key("stats", "bucket", bucket), str(count))
+        cutoff = date.today() - timedelta(seconds=DAY_TTL)
+        for event, days in (("signups", signups), ("added", added)):
+            for day, count in days.items():
+                if day >= cutoff:
+                    backend.set(day_key(day, event), str(count), ttl=DAY_TTL)
+        backend.set(state.key("stats", "seeded"), datetime.now().isoformat(timespec='seconds'))
+    log.info("Seeded stats: %d users, %d notes", len(users), sum(totals.values()))
+
+def is_seeded():
+    return state.backend.get(state.key("stats", "seeded")) is not None
+
+def snapshot(days=DEFAULT_DAYS, today=None):
+    # Constant work: a fixed set of keys, whatever the number of users or notes, fetched in one batch
+    today = today or date.today()
+    dates = [today - timedelta(days=i) for i in range(days - 1, -1, -1)]
+    names = ([state.key("stats", "users"), state.key("stats", "seeded")]
+             + [state.key("stats", "notes", status) for status in COUNTED]
+             + [state.key("stats", "bucket", bucket) for bucket in range(1, MAX_BUCKET + 1)]
+             + [day_key(day, event) for day in dates for event in EVENTS])
+    raw = dict(zip(names, state.backend.get_many(names)))
+
+    def count(name):
+        return int(raw[name] or 0)
+
+    users = count(state.key("stats", "users"))
+    notes = {status: count(state.key("stats", "notes", status)) for status in COUNTED}
+    buckets = []
+    for bucket in range(1, MAX_BUCKET + 1):
+        users_in_bucket = count(state.key("stats", "bucket", bucket))
+        if users_in_bucket:
+            buckets.append({"notes": bucket_label(bucket), "users": users_in_bucket})
+    with_notes = sum(b["users"] for b in buckets)
+    daily = []
+    for day in dates:
+        row = {"day": day.isoformat()}
+        row.update({event: count(day_key(day, event)) for event in EVENTS})
+        daily.append(row)
+    return {
+        "users": users,
+        "notes": dict(notes, total=sum(notes.values())),
+        "notes_per_user": round(sum(notes.values()) / users, 2) if users else 0,
+        "users_without_notes": max(users - with_notes, 0),
+        "distribution": buckets,
+        "daily": daily,
+        "seeded_at": raw[state.key("stats", "seeded")],
+    }
@@ -0,0 +1,390 @@
+# store.py
+import os
+import re
+import sys
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the lock only serialises threads of this process
+    fcntl = None
+
+import schema
+import serializers
+from blobs import BlobFile, copy_live
+from models import InvalidNote, InvalidUser, note_from_dict, user_from_dict
+
+log = logging.getLogger(__name__)
+
+# The live data files; snapshots and the maintenance commands resolve them the same way
+NOTES_FILE = os.environ.get("NOTEPAD_NOTES_FILE", os.path.join(os.path.dirname(__file__), "notes.json"))
+USERS_FILE = os.environ.get("NOTEPAD_USERS_FILE", os.path.join(os.path.dirname(__file__), "users.json"))
+
+# Compact once dead bodies take up at least this much and more than half the blob file
+COMPACT_MIN_BYTES = 1 << 20
+COMPACT_RATIO = 0.5
+
+class StoreError(Exception):
+    pass
+
+def blob_path(path, gen):
+    # notes.json -> notes-<gen>.blob next to it
+    return f"{os.path.splitext(path)[0]}-{gen}.blob"
+
+def referenced_gens(records):
+    gens = set()
+    for raw in records:
+        body = raw.get('body') if isinstance(raw, dict) else None
+        if isinstance(body, list) and body and isinstance(body[0], int):
+            gens.add(body[0])
+    return gens
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    # Saves replace the file, so the inode changes even when mtime and size come out equal
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+class FileLock:
+    # Re-entrant lock shared by the threads of this process and, through an exclusive
+    # flock on <path>, by every other worker process. Only the outermost acquire takes
+    # the flock. The file is reopened after a fork: a descriptor inherited from the
+    # parent shares its flock and would not exclude the parent.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+        self._pid = None
+
+    def _file(self):
+        if self._pid != os.getpid():
+            if self._fd is not None:
+                os.close(self._fd)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        return self._fd
+
+    def acquire(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                fcntl.flock(self._file(), fcntl.LOCK_EX)
+            except BaseException:
+                self._lock.release()
+                raise
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+class NoteStore:
+    # Parsed, validated notes kept in memory and re-read only when the file changes on disk.
+    # Records that fail validation are kept verbatim so a save never drops them, and a
+    # file that cannot be read at all is never overwritten.
+    # Bodies go to an append-only <name>-<gen>.blob next to the file; compaction
+    # writes the live bodies to the next generation and only then repoints the records.
+    # self.lock is held across processes: callers take it around load, mutate and save,
+    # and save refuses to replace a file that changed since it was loaded.
+    def __init__(self, path):
+        self.path = path
+        self.lock = FileLock(path + ".lock")
+        self._notes = None
+        self._invalid = []
+        self._signature = None
+        self._saved_from = None
+        self._read_error = None
+        self._blobs = {}
+        self._gen = 0
+        root, _ = os.path.splitext(path)
+        self._blob_prefix = root + "-"
+
+    def _blob_path(self, gen):
+        return blob_path(self.path, gen)
+
+    def _blob(self, gen):
+        blob = self._blobs.get(gen)
+        if blob is None:
+            blob = self._blobs[gen] = BlobFile(self._blob_path(gen), gen)
+        return blob
+
+    def _disk_gens(self):
+        directory = os.path.dirname(self._blob_prefix) or "."
+        pattern = re.compile(re.escape(os.path.basename(self._blob_prefix)) + r"(\d+)\.blob$")
+        return {int(m.group(1)) for m in map(pattern.match, os.listdir(directory)) if m}
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return [], False
+        return schema.read(self.path, 'notes')
+
+    def load(self):
+        with self.lock:
+            signature = file_signature(self.path)
+            if self._notes is None or signature != self._signature:
+                try:
+                    records, migrated = self._read()
+                except (serializers.SerializationError, schema.SchemaError, PermissionError) as e:
+                    log.exception("Failed to read %s", self.path)
+                    self._read_error = e
+                    return []
+                self._read_error = None
+                gens = referenced_gens(records)
+                blobs = {g: self._blob(g) for g in gens if os.path.exists(self._blob_path(g))}
+                notes, invalid = [], []
+                for raw in records:
+                    try:
+                        notes.append(note_from_dict(raw, blobs))
+                    except InvalidNote as e:
+                        log.warning("Skipping invalid note record: %s", e)
+                        invalid.append(raw)
+                self._notes, self._invalid, self._signature = notes, invalid, signature
+                # Appends go to the newest generation on disk, even when no record points there yet
+                self._gen = max(gens | self._disk_gens(), default=self._gen)
+                if migrated or any(not n.is_stored and not n.is_tombstone for n in notes):
+                    # Write the upgrade back once; older files also keep bodies inline
+                    try:
+                        self.save(notes)
+                    except OSError:
+                        log.exception("Failed to migrate %s", self.path)
+                return notes
+            return self._notes
+
+    def _store_bodies(self, notes):
+        blob = self._blob(self._gen)
+        pending = [n for n in notes if not n.is_stored and not n.is_tombstone]
+        for n in pending:
+            n.set_body(blob, *blob.append(n._content))
+        if pending:
+            blob.flush()
+
+    def save(self, notes):
+        with self.lock:
+            if self._read_error is not None:
+                raise StoreError(f"{self.path} could not be read ({self._read_error}); refusing to overwrite it")
+            # The file this save replaces, as found on disk: anyone's write since our last load shows up here
+            saved_from = file_signature(self.path)
+            if saved_from != self._signature:
+                # Written by another process (or never loaded): saving would drop its changes
+                self.invalidate()
+                raise StoreError(f"{self.path} changed on disk since it was loaded; refusing to overwrite it")
+            try:
+                self._store_bodies(notes)
+                serializers.save(self.path, [n.to_record() for n in notes] + self._invalid, schema=schema.VERSIONS['notes'])
+            except Exception:
+                # Callers may already have mutated cached objects: force a re-read from disk
+                self.invalidate()
+                raise
+            self._notes = notes
+            self._signature = file_signature(self.path)
+            self._saved_from = saved_from
+        if self.should_compact():
+            try:
+                self.compact()
+            except OSError:
+                log.exception("Failed to compact %s", self._blob_path(self._gen))
+
+    def live_bytes(self):
+        return sum(n.length for n in self.load() if n.is_stored and not n.is_tombstone)
+
+    def should_compact(self):
+        with self.lock:
+            total = self._blob(self._gen).size()
+            dead = total - self.live_bytes()
+            return dead >= COMPACT_MIN_BYTES and dead > total * COMPACT_RATIO
+
+    def compact(self):
+        with self.lock:
+            notes = self.load()
+            live = [n for n in notes if n.is_stored and not n.is_tombstone]
+            old_gen, new_gen = self._gen, self._gen + 1
+            # Generations the notes.json being replaced points into
+            previous = {old_gen} | {n.blob.gen for n in live} | referenced_gens(self._invalid)
+            target = self._blob(new_gen)
+            if os.path.exists(target.path):
+                os.remove(target.path)
+            before = self._blob(old_gen).size()
+            offsets = dict(zip((id(n) for n in live), copy_live([(n.blob, n.offset, n.length) for n in live], target)))
+            records = []
+            for n in notes:
+                record = n.to_record()
+                if id(n) in offsets:
+                    record["body"] = [new_gen, offsets[id(n)], n.length]
+                records.append(record)
+            serializers.save(self.path, records + self._invalid, schema=schema.VERSIONS['notes'])
+            # Notes already handed out keep pointing at the old mapping; the next load picks up the new generation
+            self.invalidate()
+            self._saved_from = None
+            self._gen = new_gen
+            # Only generations older than the replaced file go: a worker that read it just
+            # before this compaction can still open the ones it references
+            self._drop_blobs(keep={new_gen} | previous)
+            log.info("Compacted %s: %d -> %d bytes", self.path, before, target.size())
+            return before, target.size()
+
+    def _drop_blobs(self, keep):
+        for gen in self._disk_gens() - keep:
+            blob = self._blobs.pop(gen, None)
+            if blob is not None:
+                blob.close()
+            try:
+                os.remove(self._blob_path(gen))
+            except OSError:
+                log.warning("Could not remove old blob file %s", self._blob_path(gen))
+
+    def max_id(self):
+        # Ids of records we could not parse are still taken
+        with self.lock:
+            ids = [n.id for n in self.load()]
+            ids.extend(r['id'] for r in self._invalid if isinstance(r, dict) and isinstance(r.get('id'), int))
+            return max(ids, default=0)
+
+    def invalidate(self):
+        with self.lock:
+            self._notes = None
+            self._signature = None
+
+    @property
+    def signature(self):
+        return self._signature
+
+    @property
+    def saved_from(self):
+        # Signature of the file our last save overwrote; None after a compaction
+        return self._saved_from
+
+    def __len__(self):
+        return len(self.load())
+
+class StoreIndex:
+    # Base of the in-memory indexes over a NoteStore (sync.SeqIndex, tags.TagIndex, ...).
+    # ensure() rebuilds whenever the file is not the one the index was built from.
+    # apply() patches in the note of one of our own saves, but only if the index was
+    # current as of the file that save replaced: when another process wrote in between,
+    # patching would hide its changes, so the index is rebuilt from the new file instead.
+    # Subclasses provide _rebuild(notes) and _patch(note), both called under self._lock.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._signature = None
+
+    @staticmethod
+    def _current(store):
+        # The notes and the signature of the file they came from, read together
+        with store.lock:
+            return store.load(), store.signature
+
+    def ensure(self, store):
+        notes, signature = self._current(store)
+        with self._lock:
+            if self._signature is None or signature != self._signature:
+                self._rebuild(notes)
+                self._signature = signature
+
+    def apply(self, store, note):
+        # Called under the store lock right after our own save. The store lock is taken
+        # before ours everywhere, so the load below never waits while holding self._lock.
+        with store.lock:
+            notes, saved_from, signature = store.load(), store.saved_from, store.signature
+            with self._lock:
+                if self._signature is None:
+                    return
+                if saved_from is None or saved_from != self._signature:
+                    self._rebuild(notes)
+                else:
+                    self._patch(note)
+                self._signature = signature
+
+class UserStore:
+    # users.json read, migrated and validated once per change on disk instead of on every
+    # request. Users stay plain dicts (handlers update and save them) with every profile
+    # field present; records that fail validation are kept aside like NoteStore does.
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self._users = None
+        self._by_name = {}
+        self._invalid = []
+        self._signature = None
+        self._read_error = None
+
+    def load(self):
+        with self.lock:
+            signature = file_signature(self.path)
+            if self._users is not None and signature == self._signature:
+                return self._users
+            try:
+                records, migrated = schema.read(self.path, 'users') if os.path.exists(self.path) else ([], False)
+            except (serializers.SerializationError, schema.SchemaError, PermissionError) as e:
+                log.exception("Failed to read %s", self.path)
+                self._read_error = e
+                return []
+            self._read_error = None
+            users, invalid = [], []
+            for raw in records:
+                try:
+                    users.append(user_from_dict(raw))
+                except InvalidUser as e:
+                    log.warning("Skipping invalid user record: %s", e)
+                    invalid.append(raw)
+            self._users, self._invalid, self._signature = users, invalid, signature
+            self._by_name = {u['username']: u for u in users}
+            if migrated:
+                try:
+                    self.save(users)
+                except OSError:
+                    log.exception("Failed to migrate %s", self.path)
+            return users
+
+    def get(self, username):
+        with self.lock:
+            self.load()
+            return self._by_name.get(username)
+
+    def save(self, users):
+        with self.lock:
+            if self._read_error is not None:
+                raise StoreError(f"{self.path} could not be read ({self._read_error}); refusing to overwrite it")
+            try:
+                serializers.save(self.path, users + self._invalid, schema=schema.VERSIONS['users'])
+            except Exception:
+                self.invalidate()
+                raise
+            self._users = users
+            self._by_name = {u['username']: u for u in users}
+            self._signature = file_signature(self.path)
+
+    def invalidate(self):
+        with self.lock:
+            self._users = None
+            self._signature = None
+
+    def __len__(self):
+        return len(self.load())
+
+def main(argv):
+    if len(argv) == 2 and argv[0] == 'compact':
+        notes_store = NoteStore(argv[1])
+        notes_store.load()
+        before, after = notes_store.compact()
+        print(f"{argv[1]}: blob {before} -> {after} bytes")
+        return 0
+    print("usage: python store.py compact NOTES_FILE")
+    return 2
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,76 @@
+# sync.py
+import bisect
+
+import state
+from models import Note, now_epoch
+from store import StoreIndex
+
+TOMBSTONE_STATUS = "deleted"
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+def next_seq(notes, username):
+    # Allocated from the shared state backend so two nodes never hand out the same seq;
+    # the store maximum (tombstones included) is the floor if the counter was lost
+    floor = max((n.seq for n in notes if n.username == username), default=0)
+    return state.next_version(state.key("seq", username), floor)
+
+def stamp(note, notes, username):
+    note.seq = next_seq(notes, username)
+    return note
+
+def make_tombstone(note, seq):
+    return Note(note.id, note.username, status=TOMBSTONE_STATUS, seq=seq, updated_at=now_epoch())
+
+def change_record(note):
+    if note.is_tombstone:
+        return {"id": note.id, "seq": note.seq, "deleted": True}
+    # Always carry seq, even a legacy note's 0: clients page on it
+    return dict(note.to_dict(), seq=note.seq)
+
+class SeqIndex(StoreIndex):
+    def __init__(self):
+        super().__init__()
+        self._by_user = {}
+        self._seq_of = {}
+
+    def _rebuild(self, notes):
+        by_user = {}
+        for n in notes:
+            by_user.setdefault(n.username, []).append(n)
+        self._by_user = {}
+        self._seq_of = {}
+        for username, records in by_user.items():
+            records.sort(key=lambda n: n.seq)
+            self._by_user[username] = ([n.seq for n in records], records)
+            for n in records:
+                self._seq_of[(username, n.id)] = n.seq
+
+    def _patch(self, note):
+        # After our own save: keep the index warm instead of rebuilding from disk
+        username, seq = note.username, note.seq
+        seqs, records = self._by_user.setdefault(username, ([], []))
+        old_seq = self._seq_of.get((username, note.id))
+        if old_seq is not None:
+            i = bisect.bisect_left(seqs, old_seq)
+            while i < len(seqs) and seqs[i] == old_seq:
+                if records[i].id == note.id:
+                    del seqs[i]
+                    del records[i]
+                    break
+                i += 1
+        pos = bisect.bisect_right(seqs, seq)
+        seqs.insert(pos, seq)
+        records.insert(pos, note)
+        self._seq_of[(username, note.id)] = seq
+
+    def changes_since(self, username, since, limit=DEFAULT_PAGE_SIZE):
+        with self._lock:
+            seqs, records = self._by_user.get(username, ([], []))
+            latest = seqs[-1] if seqs else 0
+            start = 0 if since is None else bisect.bisect_right(seqs, since)
+            page = records[start:start + limit]
+            has_more = start + limit < len(records)
+        return [change_record(n) for n in page], latest, has_more
+
+seq_index = SeqIndex()
@@ -0,0 +1,82 @@
+# tags.py
+from models import parse_tags, InvalidNote
+from store import StoreIndex
+
+MODES = ('and', 'or')
+
+class TagIndex(StoreIndex):
+    # Per user: tag -> set of note ids, plus the tagged notes themselves so a
+    # filter is answered from the sets alone. Kept in step with the store by
+    # StoreIndex: rebuilt when the file changes, patched after our own saves.
+    def __init__(self):
+        super().__init__()
+        self._by_user = {}
+        self._notes = {}
+        self._tags_of = {}
+
+    def _add(self, note):
+        tags = self._by_user.setdefault(note.username, {})
+        for tag in note.tags:
+            tags.setdefault(tag, set()).add(note.id)
+        self._notes[note.id] = note
+        self._tags_of[note.id] = note.tags
+
+    def _remove(self, username, note_id):
+        old = self._tags_of.pop(note_id, ())
+        self._notes.pop(note_id, None)
+        tags = self._by_user.get(username, {})
+        for tag in old:
+            ids = tags.get(tag)
+            if ids is not None:
+                ids.discard(note_id)
+                if not ids:
+                    del tags[tag]
+
+    def _rebuild(self, notes):
+        self._by_user, self._notes, self._tags_of = {}, {}, {}
+        for n in notes:
+            if n.tags and not n.is_tombstone:
+                self._add(n)
+
+    def _patch(self, note):
+        self._remove(note.username, note.id)
+        if note.tags and not note.is_tombstone:
+            self._add(note)
+
+    def ids(self, username, tags, mode='and'):
+        with self._lock:
+            index = self._by_user.get(username, {})
+            sets = [index.get(tag, set()) for tag in tags]
+            if not sets:
+                return set()
+            if mode == 'or':
+                return set().union(*sets)
+            # Intersect smallest first so the work is bounded by the rarest tag
+            sets.sort(key=len)
+            result = set(sets[0])
+            for ids in sets[1:]:
+                result &= ids
+                if not result:
+                    break
+            return result
+
+    def notes(self, username, tags, mode='and'):
+        ids = self.ids(username, tags, mode)
+        with self._lock:
+            return sorted((self._notes[i] for i in ids if i in self._notes), key=lambda n: n.id)
+
+    def counts(self, username):
+        with self._lock:
+            return {tag: len(ids) for tag, ids in sorted(self._by_user.get(username, {}).items())}
+
+tag_index = TagIndex()
+
+def parse_filter(args):
+    # ?tag=a&tag=b or ?tags=a,b plus ?mode=and|or
+    raw = args.getlist('tag') + [t for v in args.getlist('tags') for t in v.split(',')]
+    try:
+        tags = parse_tags(raw)
+    except InvalidNote:
+        tags = ()
+    mode = args.get('mode', 'and').lower()
+    return tags, mode if mode in MODES else 'and'
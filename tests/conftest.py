@@ -0,0 +1,82 @@
+# conftest.py
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Read when auth, main and friends are imported: keep every module off the repo's own data
+_scratch = tempfile.mkdtemp(prefix="notepad-tests-")
+os.environ.update(NOTEPAD_NOTES_FILE=os.path.join(_scratch, "notes.json"),
+                  NOTEPAD_USERS_FILE=os.path.join(_scratch, "users.json"),
+                  NOTEPAD_DRAFTS_DIR=os.path.join(_scratch, "drafts"),
+                  NOTEPAD_ATTACHMENT_DIR=os.path.join(_scratch, "attachments"),
+                  NOTEPAD_WARMUP="0")
+
+import admin
+import auth
+import main
+from app import create_app
+from duplicates import duplicate_index
+from ordering import order_index
+from quotas import usage_index
+from sharing import share_index
+from store import NoteStore, UserStore
+from sync import seq_index
+from tags import tag_index
+
+INDEXES = (seq_index, tag_index, order_index, usage_index, duplicate_index, share_index)
+USERS = ("alice", "bob", "carol")
+
+def write_json(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # Fresh stores on per-test files; the module-level singletons point at them
+    notes_store = NoteStore(str(tmp_path / "notes.json"))
+    users_store = UserStore(str(tmp_path / "users.json"))
+    write_json(notes_store.path, [])
+    write_json(users_store.path, [{"username": u, "password": "x", "email": f"{u}@example.com"} for u in USERS])
+    for module in (main, admin):
+        monkeypatch.setattr(module, "notes_store", notes_store)
+        monkeypatch.setattr(module, "users_store", users_store)
+    monkeypatch.setattr(auth, "users_store", users_store)
+    monkeypatch.setattr("app.notes_store", notes_store)
+    for index in INDEXES:
+        monkeypatch.setattr(index, "_signature", None)
+    return tmp_path
+
+@pytest.fixture
+def app(data_dir):
+    return create_app({"TESTING": True, "START_WORKERS": False, "WARMUP": False,
+                       "OTP_TRANSPORT": "file:" + str(data_dir / "outbox"), "OTP_OUTBOX_FILE": str(data_dir / "otp_outbox.jsonl"),
+                       "DRAFTS_DIR": str(data_dir / "drafts"), "ATTACHMENT_DIR": str(data_dir / "attachments"),
+                       "PROFILE_DIR": str(data_dir / "profiles")})
+
+@pytest.fixture
+def notes_store(app):
+    return main.notes_store
+
+def login(client, username):
+    with client.session_transaction() as s:
+        s['username'] = username
+    return client
+
+@pytest.fixture
+def client(app):
+    return login(app.test_client(), "alice")
+
+def api(client, method, url, **kwargs):
+    kwargs.setdefault("headers", {})["X-Requested-With"] = "XMLHttpRequest"
+    return getattr(client, method)(url, **kwargs)
+
+def add_note(client, title, content="", **fields):
+    response = api(client, "post", "/add_note", data=dict(fields, title=title, content=content))
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()["note"]
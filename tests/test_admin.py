@@ -0,0 +1,35 @@
+import state
+import stats
+from conftest import add_note, api, login
+
+def test_admin_pages_are_hidden(client, app):
+    app.config.update(ADMIN_USERS="bob")
+    assert client.get("/admin/stats").status_code == 404
+    assert client.get("/admin/api/stats").status_code == 404
+    assert client.post("/admin/stats/recount").status_code == 404
+
+def test_counts_follow_note_events(client, app):
+    app.config.update(ADMIN_USERS="alice, bob")
+    # Seeded while empty: from here on only the per-event counters move
+    assert client.get("/admin/api/stats").get_json()["stats"]["notes"]["total"] == 0
+    first = add_note(client, "one")
+    add_note(client, "two")
+    api(client, "get", f"/delete_note/{first['id']}")
+    body = client.get("/admin/api/stats").get_json()["stats"]
+    assert body["users"] == 3
+    assert body["notes"] == {"active": 1, "archived": 1, "total": 2}
+    assert body["distribution"] == [{"notes": stats.bucket_label(stats.bucket_of(2)), "users": 1}]
+    assert body["users_without_notes"] == 2
+    today = body["daily"][-1]
+    assert today["added"] == 2 and today["archived"] == 1
+    assert b"Statistics" in login(app.test_client(), "bob").get("/admin/stats").data
+
+def test_recount_repairs_counters(client, app, notes_store):
+    app.config.update(ADMIN_USERS=["alice"])
+    add_note(client, "one")
+    client.get("/admin/api/stats")
+    state.backend.set(state.key("stats", "notes", "active"), "40")
+    assert client.get("/admin/api/stats").get_json()["stats"]["notes"]["active"] == 40
+    body = api(client, "post", "/admin/stats/recount").get_json()
+    assert body["stats"]["notes"]["active"] == 1
+    assert client.post("/admin/stats/recount").status_code == 302
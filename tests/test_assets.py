@@ -0,0 +1,41 @@
+import os
+import subprocess
+import shutil
+
+import pytest
+
+import assets
+
+def test_js_keeps_url_strings_and_drops_comments():
+    src = 'const api = "http://example.com/api"; // where notes sync\n    let s = \'//cdn\';\n'
+    assert assets.minify_js(src) == 'const api = "http://example.com/api";\nlet s = \'//cdn\';\n'
+
+def test_js_template_literal_is_copied_verbatim():
+    template = '`\n  <pre>\n\n  // not a comment\n  ${ items.map(i => `<li>${i}</li>`).join("") }\n  </pre>`'
+    src = f'function card(items) {{\n    // build it\n    return {template};\n}}\n'
+    assert assets.minify_js(src) == f'function card(items) {{\nreturn {template};\n}}\n'
+
+def test_js_regex_and_division():
+    src = 'const re = /\\/\\/|"/g;\nconst half = total / 2 / n; /* note */\nif (ok) return /a+b/i.test(s);\n'
+    assert assets.minify_js(src) == 'const re = /\\/\\/|"/g;\nconst half = total / 2 / n;\nif (ok) return /a+b/i.test(s);\n'
+
+def test_css_strings_survive():
+    src = 'a  {  background: url("https://example.com/a  b.png") ; /* gone */ content: "/* kept */  " ; }\n'
+    assert assets.minify_css(src) == 'a{background:url("https://example.com/a  b.png");content:"/* kept */  "}'
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+@pytest.mark.parametrize("name", [n for n in assets.BUNDLES if n.endswith(".js")])
+def test_minified_bundles_still_parse(tmp_path, name):
+    with open(os.path.join(assets.STATIC_DIR, name), encoding="utf-8") as f:
+        out = tmp_path / "bundle.js"
+        out.write_text(assets.minify_js(f.read()), encoding="utf-8")
+    assert subprocess.run(["node", "--check", str(out)], capture_output=True).returncode == 0
+
+def test_only_built_assets_are_served(app):
+    assert app.test_client().get("/assets/not-built.js").status_code == 404
+
+def test_service_worker_is_served_from_root(app):
+    response = app.test_client().get("/sw.js")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "no-cache" and response.headers["Service-Worker-Allowed"] == "/"
+    response.close()
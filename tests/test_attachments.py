@@ -0,0 +1,73 @@
+import hashlib
+import subprocess
+import sys
+
+from attachments import AttachmentStore
+from conftest import ROOT, add_note, api, login
+
+DATA = b"attachment body\n" * 100
+SHA = hashlib.sha256(DATA).hexdigest()
+
+def upload(client, note_id, data=DATA, name="a.txt"):
+    return api(client, "post", f"/add_attachment/{note_id}?name={name}", data=data, content_type="text/plain")
+
+def test_upload_and_download(client, app):
+    note = add_note(client, "files")
+    body = upload(client, note["id"]).get_json()
+    assert body["success"] and body["note"]["attachments"][0]["sha256"] == SHA
+    response = client.get(f"/attachment/{note['id']}/{SHA}")
+    assert response.status_code == 200 and response.data == DATA
+    assert response.headers["ETag"] == f'"{SHA}"' and response.headers["Cache-Control"] == "private, no-cache"
+    assert "a.txt" in response.headers["Content-Disposition"]
+    cached = client.get(f"/attachment/{note['id']}/{SHA}", headers={"If-None-Match": f'"{SHA}"'})
+    assert cached.status_code == 304
+    partial = client.get(f"/attachment/{note['id']}/{SHA}", headers={"Range": "bytes=0-9"})
+    assert partial.status_code == 206 and partial.data == DATA[:10]
+    assert api(login(app.test_client(), "bob"), "get", f"/attachment/{note['id']}/{SHA}").status_code == 404
+
+def test_same_file_is_stored_once(client, app):
+    first, second = add_note(client, "one"), add_note(client, "two")
+    upload(client, first["id"])
+    upload(client, second["id"])
+    assert upload(client, first["id"]).status_code == 409
+    assert app.extensions['attachments'].stats() == {"objects": 1, "bytes": len(DATA), "references": 2}
+
+def test_remove_and_delete_release_the_file(client, app):
+    store = app.extensions['attachments']
+    first, second = add_note(client, "one"), add_note(client, "two")
+    upload(client, first["id"])
+    upload(client, second["id"])
+    assert "attachments" not in api(client, "get", f"/remove_attachment/{first['id']}/{SHA}").get_json()["note"]
+    assert store.stats()["references"] == 1
+    assert api(client, "get", f"/attachment/{first['id']}/{SHA}").status_code == 404
+    api(client, "get", f"/delete_note/{second['id']}")
+    # Archived notes keep their files; only the permanent delete lets go of them
+    assert store.stats()["objects"] == 1
+    api(client, "get", f"/permanent_delete/{second['id']}")
+    assert store.stats() == {"objects": 0, "bytes": 0, "references": 0}
+
+def test_attachments_count_against_the_quota(client, app):
+    note = add_note(client, "files")
+    app.config.update(QUOTA_MAX_BYTES=len(DATA))
+    assert upload(client, note["id"]).status_code == 403
+    assert app.extensions['attachments'].stats()["objects"] == 0
+
+REFERRER = """
+import io
+import sys
+from attachments import AttachmentStore
+store = AttachmentStore(sys.argv[1])
+for i in range(100):
+    sha, _ = store.put_stream(io.BytesIO(b"shared"))
+    if i % 2:
+        store.decref(sha)
+"""
+
+def test_reference_counts_survive_two_processes(tmp_path):
+    root = str(tmp_path / "attachments")
+    procs = [subprocess.Popen([sys.executable, "-c", REFERRER, root], cwd=ROOT) for _ in range(2)]
+    for proc in procs:
+        assert proc.wait(timeout=120) == 0
+    store = AttachmentStore(root)
+    assert store.stats() == {"objects": 1, "bytes": 6, "references": 100}
+    assert store.exists(hashlib.sha256(b"shared").hexdigest())
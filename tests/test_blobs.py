@@ -0,0 +1,82 @@
+import subprocess
+import sys
+
+import pytest
+
+from blobs import BlobFile
+from models import Note
+from store import NoteStore, StoreError
+
+from conftest import ROOT, write_json
+
+WRITER = """
+import sys
+from blobs import BlobFile
+blob = BlobFile(sys.argv[1], 0)
+tag = sys.argv[2].encode()
+for i in range(300):
+    data = tag * (1 + i % 7)
+    offset, length = blob.append_bytes(data)
+    print(offset, length, data.decode())
+"""
+
+STORE_WRITER = """
+import sys
+import store
+from models import Note
+store.COMPACT_MIN_BYTES = 1
+notes_store = store.NoteStore(sys.argv[1])
+tag = sys.argv[2]
+for i in range(60):
+    with notes_store.lock:
+        notes = notes_store.load()
+        # Rewrite our scratch note each round so both processes keep compacting
+        notes = [n for n in notes if n.title != tag + "-scratch"]
+        notes.append(Note(notes_store.max_id() + 1, "alice", tag + "-scratch", tag * 200 + str(i)))
+        notes.append(Note(notes_store.max_id() + 2, "alice", tag + str(i), tag + " body " + str(i)))
+        notes_store.save(notes)
+"""
+
+def test_saves_and_compactions_from_two_processes_keep_every_note(tmp_path):
+    path = str(tmp_path / "notes.json")
+    write_json(path, [])
+    procs = [subprocess.Popen([sys.executable, "-c", STORE_WRITER, path, tag], cwd=ROOT) for tag in "ab"]
+    for proc in procs:
+        assert proc.wait(timeout=120) == 0
+    notes = {n.title: n.content for n in NoteStore(path).load()}
+    for tag in "ab":
+        assert all(notes[f"{tag}{i}"] == f"{tag} body {i}" for i in range(60))
+        assert notes[f"{tag}-scratch"] == tag * 200 + "59"
+
+def test_save_refuses_a_file_changed_since_load(tmp_path):
+    path = str(tmp_path / "notes.json")
+    write_json(path, [])
+    ours, theirs = NoteStore(path), NoteStore(path)
+    notes = ours.load()
+    theirs.save(theirs.load() + [Note(1, "alice", "theirs", "b")])
+    with pytest.raises(StoreError):
+        ours.save(notes + [Note(2, "alice", "ours", "a")])
+    # A fresh load sees their note and the retried save keeps it
+    ours.save(ours.load() + [Note(2, "alice", "ours", "a")])
+    assert sorted(n.title for n in NoteStore(path).load()) == ["ours", "theirs"]
+
+def test_appends_from_two_processes_never_overlap(tmp_path):
+    path = str(tmp_path / "notes-0.blob")
+    procs = [subprocess.Popen([sys.executable, "-c", WRITER, path, tag], cwd=ROOT, stdout=subprocess.PIPE, text=True)
+             for tag in "ab"]
+    ranges = []
+    for proc in procs:
+        out, _ = proc.communicate(timeout=60)
+        assert proc.returncode == 0
+        ranges += [(int(o), int(n), text) for o, n, text in (line.split() for line in out.splitlines())]
+    blob = BlobFile(path, 0)
+    # Every append reads back as written, and together they tile the file exactly
+    assert all(blob.read(o, n) == text for o, n, text in ranges)
+    assert sum(n for _, n, _ in ranges) == blob.size()
+
+def test_append_then_read(tmp_path):
+    blob = BlobFile(str(tmp_path / "notes-0.blob"), 0)
+    first = blob.append("héllo")
+    second = blob.append("world")
+    assert blob.read(*first) == "héllo" and blob.read(*second) == "world"
+    assert blob.preview(*first, limit=2) == ("h", True)
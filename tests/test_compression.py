@@ -0,0 +1,15 @@
+import gzip
+
+from conftest import add_note, api
+
+def test_large_responses_are_compressed(client, app):
+    add_note(client, "big", "lorem ipsum " * 200)
+    response = api(client, "get", "/api/notes", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip" and "Accept-Encoding" in response.headers["Vary"]
+    plain = api(client, "get", "/api/notes")
+    assert "Content-Encoding" not in plain.headers
+    assert gzip.decompress(response.data) == plain.data
+    # Small bodies are not worth it
+    assert "Content-Encoding" not in client.get("/healthz", headers={"Accept-Encoding": "gzip"}).headers
+    app.config.update(COMPRESS_ENABLED=False)
+    assert "Content-Encoding" not in api(client, "get", "/api/notes", headers={"Accept-Encoding": "gzip"}).headers
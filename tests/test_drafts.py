@@ -0,0 +1,47 @@
+import os
+
+from conftest import add_note, api, login
+
+def draft(content, client_ts, **fields):
+    return dict(fields, title="t", content=content, tags="", client_ts=client_ts)
+
+def test_drafts_round_trip(client):
+    assert api(client, "put", "/api/drafts/new", json=draft("typing", 1)).get_json() == {"success": True, "stale": False}
+    drafts = api(client, "get", "/api/drafts").get_json()["drafts"]
+    assert list(drafts) == ["new"] and drafts["new"]["content"] == "typing"
+    api(client, "delete", "/api/drafts/new")
+    assert api(client, "get", "/api/drafts").get_json()["drafts"] == {}
+
+def test_older_draft_does_not_win(client):
+    api(client, "put", "/api/drafts/new", json=draft("newer", 5))
+    # A beacon that arrives late, carrying an older keystroke
+    assert api(client, "post", "/api/drafts/new", json=draft("older", 3)).get_json()["stale"] is True
+    assert api(client, "get", "/api/drafts").get_json()["drafts"]["new"]["content"] == "newer"
+
+def test_bad_drafts_are_rejected(client):
+    assert api(client, "put", "/api/drafts/new", json={"title": 1}).status_code == 400
+    assert api(client, "put", "/api/drafts/new", json=draft("x", -1)).status_code == 400
+    assert api(client, "put", "/api/drafts/abc", json=draft("x", 1)).status_code == 400
+
+def test_drafts_are_per_user(client, app):
+    api(client, "put", "/api/drafts/new", json=draft("alice's", 1))
+    bob = login(app.test_client(), "bob")
+    assert api(bob, "get", "/api/drafts").get_json()["drafts"] == {}
+
+def test_flush_writes_and_reloads(client, app, data_dir):
+    store = app.extensions['drafts']
+    api(client, "put", "/api/drafts/new", json=draft("kept", 1))
+    assert not os.path.exists(data_dir / "drafts")
+    store.flush()
+    assert len(os.listdir(data_dir / "drafts")) == 1
+    reloaded = type(store)(store.directory)
+    assert reloaded.get("alice", "new")["content"] == "kept"
+    # Once the last draft is gone the file goes too
+    api(client, "delete", "/api/drafts/new")
+    store.flush()
+    assert os.listdir(data_dir / "drafts") == []
+
+def test_saving_the_note_drops_its_draft(client):
+    api(client, "put", "/api/drafts/new", json=draft("body", 1))
+    add_note(client, "t", "body")
+    assert api(client, "get", "/api/drafts").get_json()["drafts"] == {}
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+from duplicates import minhash
+
+from conftest import ROOT, add_note, api, login
+
+TEXT = ("the quarterly report covers revenue growth across every region and the outlook for next year. "
+        "sales in the north rose on the back of the new product line while the south held steady despite "
+        "higher shipping costs. the board expects margins to improve once the warehouse move is complete "
+        "and asks every team lead to send their hiring plans before the end of the month")
+
+def test_copies_are_grouped(client):
+    first = add_note(client, "report", TEXT)
+    for i in range(6):
+        add_note(client, f"filler {i}", f"note number {i}")
+    second = add_note(client, "report copy", TEXT)
+    third = add_note(client, "report again", "  " + TEXT.upper())
+    pair = [add_note(client, "list", "milk eggs bread"), add_note(client, "list copy", "milk  eggs bread")]
+    groups = api(client, "get", "/api/duplicates").get_json()["groups"]
+    assert sorted(sorted(n["id"] for n in group) for group in groups) == [
+        [first["id"], second["id"], third["id"]], [n["id"] for n in pair]]
+
+def test_signatures_are_the_same_in_every_process():
+    code = "import sys, duplicates; print(duplicates.minhash(sys.argv[1]))"
+    outputs = {subprocess.run([sys.executable, "-c", code, TEXT], cwd=ROOT, capture_output=True, text=True, check=True,
+                              env=dict(os.environ, PYTHONHASHSEED=seed)).stdout
+               for seed in ("1", "2", "3")}
+    assert len(outputs) == 1 and outputs.pop().strip() == str(minhash(TEXT))
+
+def test_near_duplicate_is_reported_on_save(client):
+    first = add_note(client, "report", TEXT)
+    # One word changed out of ~60: well above the similarity threshold, whatever the hash salt
+    response = api(client, "post", "/add_note", data={"title": "report v2", "content": TEXT.replace("steady", "firm")})
+    assert [d["id"] for d in response.get_json()["duplicates"]] == [first["id"]]
+
+def test_duplicates_are_per_user(client, app):
+    add_note(client, "report", TEXT)
+    other = login(app.test_client(), "bob")
+    assert add_note(other, "report", TEXT)
+    assert api(client, "get", "/api/duplicates").get_json()["groups"] == []
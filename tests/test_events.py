@@ -0,0 +1,18 @@
+import events
+
+def test_events_reach_subscribers(monkeypatch):
+    monkeypatch.setattr(events, "MAX_QUEUE_SIZE", 2)
+    assert events.publish("dave", "added", {}) == 0
+    q = events.subscribe("dave")
+    try:
+        assert events.has_subscribers("dave") and not events.has_subscribers("erin")
+        assert events.publish("dave", "added", {"id": 1}) == 1
+        event_id, event_type, payload = q.get_nowait()
+        assert events.format_sse(event_id, event_type, payload) == f'id: {event_id}\nevent: added\ndata: {{"id": 1}}\n\n'
+        # A consumer that falls behind gets one resync instead of a blocked writer
+        for i in range(3):
+            events.publish("dave", "edited", {"id": i})
+        assert q.get_nowait()[1] == "resync" and q.empty()
+    finally:
+        events.unsubscribe("dave", q)
+    assert not events.has_subscribers("dave")
@@ -0,0 +1,16 @@
+import state
+
+class DownBackend(state.MemoryBackend):
+    def ping(self):
+        return False
+
+def test_health_and_readiness(app, monkeypatch):
+    client = app.test_client()
+    assert client.get("/healthz").get_json() == {"status": "ok"}
+    ready = client.get("/readyz")
+    assert ready.status_code == 200 and ready.get_json()["state_backend"] == {"name": "memory", "ok": True}
+    monkeypatch.setattr(state, "backend", DownBackend())
+    assert client.get("/readyz").status_code == 503
+    monkeypatch.setitem(app.extensions, 'warmup', {"ready": False})
+    monkeypatch.setattr(state, "backend", state.MemoryBackend())
+    assert client.get("/readyz").status_code == 503
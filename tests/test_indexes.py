@@ -0,0 +1,49 @@
+from models import Note
+from sharing import ShareIndex
+from store import NoteStore
+from sync import SeqIndex
+from tags import TagIndex
+
+from conftest import write_json
+
+def two_stores(tmp_path):
+    # Two processes on one notes file
+    path = str(tmp_path / "notes.json")
+    write_json(path, [])
+    return NoteStore(path), NoteStore(path)
+
+def save_note(store, note):
+    notes = [n for n in store.load() if n.id != note.id] + [note]
+    store.save(notes)
+    return note
+
+def test_apply_rebuilds_after_another_process_wrote(tmp_path):
+    ours, theirs = two_stores(tmp_path)
+    index = TagIndex()
+    index.ensure(ours)
+    save_note(theirs, Note(1, "alice", "theirs", "b", tags=("x",)))
+    index.apply(ours, save_note(ours, Note(2, "alice", "ours", "a", tags=("x",))))
+    assert index.ids("alice", ("x",)) == {1, 2}
+    # And it is current again: the next own save is patched in
+    index.apply(ours, save_note(ours, Note(3, "alice", "more", "c", tags=("x",))))
+    assert index.ids("alice", ("x",)) == {1, 2, 3}
+
+def test_apply_patches_when_nobody_else_wrote(tmp_path, monkeypatch):
+    ours, _ = two_stores(tmp_path)
+    index = SeqIndex()
+    index.ensure(ours)
+    def rebuild(notes):
+        raise AssertionError("rebuilt instead of patched")
+    monkeypatch.setattr(index, "_rebuild", rebuild)
+    index.apply(ours, save_note(ours, Note(1, "alice", "a", "a", seq=1)))
+    assert [c["id"] for c in index.changes_since("alice", None)[0]] == [1]
+
+def test_shared_note_is_not_stale_after_foreign_write(tmp_path):
+    ours, theirs = two_stores(tmp_path)
+    index = ShareIndex()
+    save_note(ours, Note(1, "alice", "plan", "v1", shares=(("bob", "edit"),)))
+    index.ensure(ours)
+    # The grantee's edit lands through the other process
+    save_note(theirs, Note(1, "alice", "plan", "v2 by bob", shares=(("bob", "edit"),)))
+    index.apply(ours, save_note(ours, Note(2, "alice", "other", "x")))
+    assert index.note("bob", 1, "edit").content == "v2 by bob"
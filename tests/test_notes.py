@@ -0,0 +1,37 @@
+from conftest import add_note, api, login
+
+def test_mutations_answer_in_place(client):
+    note = add_note(client, "first", "body")
+    assert note["seq"] == 1
+    pinned = api(client, "get", f"/pin_note/{note['id']}").get_json()
+    assert pinned["note"]["pinned"] and 'data-note-id="1"' in pinned["html"]
+    archived = api(client, "get", f"/delete_note/{note['id']}").get_json()
+    assert archived["event"] == "archived" and archived["note"]["status"] == "archived"
+    restored = api(client, "get", f"/restore_note/{note['id']}").get_json()
+    assert restored["event"] == "restored" and restored["note"]["seq"] == 4
+    # Without the AJAX header the same routes still redirect
+    assert client.get(f"/pin_note/{note['id']}").status_code == 302
+
+def test_stale_edit_is_a_conflict(client):
+    note = add_note(client, "first", "body")
+    api(client, "post", f"/edit_note/{note['id']}", data={"title": "first", "content": "newer"})
+    response = api(client, "post", f"/edit_note/{note['id']}",
+                   data={"title": "first", "content": "older", "base_seq": note["seq"]})
+    assert response.status_code == 409 and response.get_json()["note"]["content"] == "newer"
+
+def test_other_users_notes_are_not_found(client, app):
+    note = add_note(client, "mine", "secret")
+    bob = login(app.test_client(), "bob")
+    assert api(bob, "get", f"/edit_note/{note['id']}").status_code == 404
+    assert api(bob, "get", f"/delete_note/{note['id']}").status_code == 404
+
+def test_offline_shell_holds_no_user_data(client):
+    add_note(client, "private title", "private body")
+    with client.session_transaction() as s:
+        s['_flashes'] = [("info", "left for the next page")]
+    response = client.get("/home/shell")
+    page = response.get_data(as_text=True)
+    assert response.status_code == 200 and "no-store" in response.headers["Cache-Control"]
+    assert "data-shell" in page and "private" not in page and "alice" not in page
+    # Fetched in the background by the service worker: the page's flashes are left alone
+    assert "left for the next page" in client.get("/home").get_data(as_text=True)
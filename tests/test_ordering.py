@@ -0,0 +1,46 @@
+import re
+import time
+
+import main
+
+from conftest import add_note, api
+
+def ids(response):
+    return [n["id"] for n in response.get_json()["notes"]]
+
+def test_sorted_pages(client, notes_store):
+    for title in ("banana", "apple", "cherry"):
+        add_note(client, title)
+    assert ids(api(client, "get", "/api/notes", query_string={"sort": "title"})) == [2, 1, 3]
+    assert ids(api(client, "get", "/api/notes", query_string={"sort": "created", "order": "desc"})) == [3, 2, 1]
+    page = api(client, "get", "/api/notes", query_string={"sort": "title", "limit": 2}).get_json()
+    assert [n["id"] for n in page["notes"]] == [2, 1] and page["total"] == 3 and page["next_offset"] == 2
+    # Pinned notes lead their status group, archived ones come after the active ones
+    api(client, "get", "/pin_note/3")
+    api(client, "get", "/delete_note/2")
+    assert ids(api(client, "get", "/api/notes", query_string={"sort": "title"})) == [3, 1, 2]
+    assert ids(api(client, "get", "/api/notes", query_string={"sort": "title", "status": "archived"})) == [2]
+
+def test_date_range_filter(client):
+    add_note(client, "today")
+    today = time.strftime("%Y-%m-%d")
+    assert ids(api(client, "get", "/api/notes", query_string={"from": today, "to": today})) == [1]
+    assert ids(api(client, "get", "/api/notes", query_string={"to": "2000-01-01"})) == []
+
+def test_home_shows_one_page_per_list(client, monkeypatch):
+    monkeypatch.setattr(main, "HOME_PAGE_SIZE", 2)
+    for title in ("d", "b", "e", "a", "c"):
+        add_note(client, title)
+    api(client, "get", "/delete_note/5")
+    page = client.get("/home", query_string={"sort": "title", "page": 2}).get_data(as_text=True)
+    assert re.findall(r'data-note-id="(\d+)"', page.split('id="archived-notes"')[0]) == ["1", "3"]
+    assert "Page 2 of 2" in page and "sort=title" in page and "page=1" in page
+    # The archived list pages on its own
+    assert re.findall(r'data-note-id="(\d+)"', page.split('id="archived-notes"')[1]) == ["5"]
+
+def test_edit_page_shows_the_first_page(client, monkeypatch):
+    monkeypatch.setattr(main, "HOME_PAGE_SIZE", 2)
+    for title in ("a", "b", "c"):
+        add_note(client, title)
+    page = client.get("/edit_note/3").get_data(as_text=True)
+    assert 'data-note-id="3"' in page and "Page 1 of 2" in page
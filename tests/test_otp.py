@@ -0,0 +1,82 @@
+import re
+import json
+import time
+
+import otp_delivery
+from auth import get_otp_session
+from otp_delivery import OtpDelivery
+from state import MemoryBackend
+
+from conftest import login
+
+class Recorder:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+def test_otp_status_answers_only_for_own_reset(app):
+    client = app.test_client()
+    assert client.post("/forgot", data={"username": "alice"}).status_code == 302
+    assert client.get("/otp_status/alice").get_json()["status"] in ("pending", "sending", "sent")
+    # Existing and unknown users look the same to anyone else
+    for username in ("bob", "nobody"):
+        assert client.get(f"/otp_status/{username}").get_json() == {"status": "unknown"}
+    assert app.test_client().get("/otp_status/alice").get_json() == {"status": "unknown"}
+
+def test_otp_status_for_signed_in_user(app):
+    client = login(app.test_client(), "bob")
+    assert client.get("/otp_status/alice").get_json() == {"status": "unknown"}
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+def test_workers_sharing_a_backend_send_each_code_once():
+    backend, transport = MemoryBackend(), Recorder()
+    # Two processes' worth of workers on one queue
+    deliveries = [OtpDelivery(transport, backend, workers=2) for _ in range(2)]
+    for delivery in deliveries:
+        delivery.start()
+    try:
+        ids = [deliveries[i % 2].enqueue("alice", "alice@example.com", str(i), "password_reset") for i in range(20)]
+        wait_for(lambda: deliveries[0].counts() == {"sent": 20})
+    finally:
+        for delivery in deliveries:
+            delivery.stop()
+    assert sorted(re.search(r"code is (\d+)", m.get_content()).group(1) for m in transport.sent) == sorted(map(str, range(20)))
+    # Any process answers for any job, and finished jobs no longer hold the code
+    assert all(deliveries[1].status(i)["status"] == "sent" for i in ids)
+    assert all(json.loads(backend.get(f"notepad:otp_job:{i}"))["otp"] is None for i in ids)
+    assert backend.keys("notepad:otp_pending:*") == []
+
+def test_send_abandoned_mid_way_is_retried(monkeypatch):
+    monkeypatch.setattr(otp_delivery, "SEND_TIMEOUT", 0)
+    backend, transport = MemoryBackend(), Recorder()
+    dead = OtpDelivery(None, backend)
+    job_id = dead.enqueue("alice", "alice@example.com", "123456", "password_reset")
+    # Claimed, then the process died before recording the result
+    assert dead._claim()[0]["id"] == job_id
+    delivery = OtpDelivery(transport, backend, workers=1)
+    delivery.start()
+    try:
+        wait_for(lambda: delivery.status(job_id)["status"] == "sent")
+    finally:
+        delivery.stop()
+    assert len(transport.sent) == 1 and delivery.status(job_id)["attempts"] == 2
+
+def test_old_outbox_files_are_removed(data_dir):
+    outbox = data_dir / "otp_outbox.jsonl"
+    outbox.write_text(json.dumps({"id": "a", "otp": "123456", "status": "pending"}) + "\n")
+    otp_delivery.discard_outbox(str(outbox))
+    assert not outbox.exists()
+
+def test_codes_are_never_shown(app):
+    client = app.test_client()
+    response = client.post("/forgot", data={"username": "alice"}, follow_redirects=True)
+    code = get_otp_session("alice")["otp"]
+    assert response.status_code == 200 and code not in response.get_data(as_text=True)
+    profile = login(app.test_client(), "alice").post("/request_profile_otp").get_json()
+    assert profile["success"] and "otp" not in profile
@@ -0,0 +1,18 @@
+from conftest import add_note, api
+
+def test_patch_applies_changed_ranges(client):
+    note = add_note(client, "doc", "hello world")
+    response = api(client, "post", f"/patch_note/{note['id']}",
+                   json={"base_seq": note["seq"], "length": 11, "patches": [[0, 5, "goodbye"], [11, 11, "!"]]})
+    body = response.get_json()
+    assert response.status_code == 200 and "content" not in body["note"]
+    fetched = api(client, "get", f"/edit_note/{note['id']}").get_json()["note"]
+    assert fetched["content"] == "goodbye world!" and fetched["seq"] == body["note"]["seq"]
+
+def test_patch_rejects_stale_or_misfit_patches(client):
+    note = add_note(client, "doc", "hello world")
+    url = f"/patch_note/{note['id']}"
+    assert api(client, "post", url, json={"base_seq": note["seq"] + 1, "patches": [[0, 0, "x"]]}).status_code == 409
+    assert api(client, "post", url, json={"base_seq": note["seq"], "length": 3, "patches": [[0, 0, "x"]]}).status_code == 422
+    assert api(client, "post", url, json={"base_seq": note["seq"], "patches": [[5, 2, "x"]]}).status_code == 400
+    assert api(client, "post", url, json={"patches": [[0, 0, "x"]]}).status_code == 400
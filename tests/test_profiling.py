@@ -0,0 +1,13 @@
+import os
+
+import profiling
+
+def test_profile_toggle_needs_a_token(app, data_dir):
+    client = app.test_client()
+    assert client.post("/debug/profile?rate=1").status_code == 403
+    assert client.get("/debug/profile", headers={profiling.TOKEN_HEADER: "forged"}).status_code == 403
+    headers = {profiling.TOKEN_HEADER: profiling.make_token(app.secret_key)}
+    assert client.post("/debug/profile?rate=0.5&seconds=60", headers=headers).get_json()["rate"] == 0.5
+    assert client.post("/debug/profile?rate=0", headers=headers).get_json()["override"] is False
+    # The token also profiles the request that carries it
+    assert os.listdir(data_dir / "profiles")
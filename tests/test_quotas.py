@@ -0,0 +1,40 @@
+from conftest import add_note, api
+from quotas import note_bytes, usage_index
+
+def test_usage_follows_saves(client, notes_store):
+    assert api(client, "get", "/api/usage").get_json()["usage"]["notes"] == 0
+    note = add_note(client, "title", "content")
+    usage = api(client, "get", "/api/usage").get_json()["usage"]
+    assert usage["notes"] == 1 and usage["bytes"] == note_bytes(notes_store.load()[0])
+    api(client, "get", f"/delete_note/{note['id']}")
+    # Archived notes still take up space; only a permanent delete frees it
+    assert api(client, "get", "/api/usage").get_json()["usage"]["notes"] == 1
+    api(client, "get", f"/permanent_delete/{note['id']}")
+    assert api(client, "get", "/api/usage").get_json()["usage"] == dict(usage, notes=0, bytes=0)
+
+def test_note_limit(client, app):
+    app.config.update(QUOTA_MAX_NOTES=1)
+    note = add_note(client, "one")
+    response = api(client, "post", "/add_note", data={"title": "two", "content": ""})
+    assert response.status_code == 403 and "limit" in response.get_json()["msg"]
+    # Edits that do not add a note still go through
+    response = api(client, "post", f"/edit_note/{note['id']}", data={"title": "one", "content": "more"})
+    assert response.status_code == 200
+
+def test_byte_limit(client, app):
+    app.config.update(QUOTA_MAX_BYTES=20)
+    note = add_note(client, "short")
+    response = api(client, "post", f"/edit_note/{note['id']}", data={"title": "short", "content": "x" * 50})
+    assert response.status_code == 403
+    # Shrinking is always allowed, even over the limit
+    app.config.update(QUOTA_MAX_BYTES=1)
+    assert api(client, "post", f"/edit_note/{note['id']}", data={"title": "s", "content": ""}).status_code == 200
+
+def test_reconcile_repairs_drift(client, notes_store):
+    add_note(client, "title", "content")
+    with usage_index._lock:
+        usage_index._usage["alice"][0] += 5
+    drift = usage_index.reconcile(notes_store)
+    assert drift["alice"][0][0] == 6 and drift["alice"][1][0] == 1
+    assert usage_index.usage("alice")[0] == 1
+    assert usage_index.reconcile(notes_store) == {}
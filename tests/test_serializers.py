@@ -0,0 +1,28 @@
+import pytest
+
+import serializers
+
+RECORDS = [{"id": 1, "title": "a"}, {"id": 2, "title": "b"}]
+
+@pytest.mark.parametrize("fmt", serializers.FORMATS)
+def test_save_keeps_the_existing_format(tmp_path, monkeypatch, fmt):
+    path = str(tmp_path / "notes.json")
+    serializers.save(path, RECORDS, fmt, schema=1)
+    for default in serializers.FORMATS:
+        monkeypatch.setattr(serializers, "DEFAULT_FORMAT", default)
+        serializers.save(path, RECORDS + [{"id": 3}], schema=1)
+        assert serializers.file_format(path) == fmt
+        assert serializers.load_records(path) == (1, RECORDS + [{"id": 3}])
+
+def test_new_files_use_the_default_format(tmp_path, monkeypatch):
+    monkeypatch.setattr(serializers, "DEFAULT_FORMAT", "binary")
+    path = str(tmp_path / "notes.json")
+    serializers.save(path, RECORDS)
+    assert serializers.file_format(path) == "binary"
+
+def test_explicit_format_converts(tmp_path):
+    path = str(tmp_path / "notes.json")
+    serializers.save(path, RECORDS, "json-pretty")
+    assert serializers.main(["convert", path, "binary"]) == 0
+    assert serializers.file_format(path) == "binary"
+    assert serializers.load(path) == RECORDS
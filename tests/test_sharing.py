@@ -0,0 +1,46 @@
+from conftest import add_note, api, login
+
+def share(client, note_id, username, permission):
+    response = api(client, "post", f"/share_note/{note_id}", data={"username": username, "permission": permission})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()["note"]
+
+def test_owner_sees_shares(client):
+    note = add_note(client, "plan", "draft")
+    assert share(client, note["id"], "bob", "edit")["shares"] == {"bob": "edit"}
+
+def test_grantee_never_sees_the_acl(client, app):
+    note = add_note(client, "plan", "draft")
+    share(client, note["id"], "bob", "edit")
+    share(client, note["id"], "carol", "read")
+    bob = login(app.test_client(), "bob")
+
+    fetched = api(bob, "get", f"/edit_note/{note['id']}").get_json()["note"]
+    assert "shares" not in fetched and fetched["permission"] == "edit"
+
+    edited = api(bob, "post", f"/edit_note/{note['id']}", data={"title": "plan", "content": "by bob"}).get_json()
+    assert "shares" not in edited["note"] and "html" not in edited
+
+    patched = api(bob, "post", f"/patch_note/{note['id']}",
+                  json={"base_seq": edited["note"]["seq"], "patches": [[0, 0, "edited "]]}).get_json()
+    assert patched["success"] and "shares" not in patched["note"] and "html" not in patched
+
+    conflict = api(bob, "post", f"/edit_note/{note['id']}", data={"title": "plan", "content": "x", "base_seq": 1})
+    assert conflict.status_code == 409 and "shares" not in conflict.get_json()["note"]
+
+    shared = api(bob, "get", "/api/notes/shared").get_json()["notes"]
+    assert [n["id"] for n in shared] == [note["id"]] and "shares" not in shared[0]
+
+def test_read_grant_cannot_edit(client, app):
+    note = add_note(client, "plan", "draft")
+    share(client, note["id"], "carol", "read")
+    carol = login(app.test_client(), "carol")
+    assert api(carol, "get", f"/shared/{note['id']}").get_json()["note"]["content"] == "draft"
+    assert api(carol, "post", f"/edit_note/{note['id']}", data={"title": "t", "content": "c"}).status_code == 404
+
+def test_unshare_revokes_access(client, app):
+    note = add_note(client, "plan", "draft")
+    share(client, note["id"], "bob", "read")
+    api(client, "get", f"/unshare_note/{note['id']}/bob")
+    bob = login(app.test_client(), "bob")
+    assert api(bob, "get", f"/shared/{note['id']}").status_code == 404
@@ -0,0 +1,54 @@
+import hashlib
+import os
+
+import main
+import snapshot
+from store import NoteStore
+
+from conftest import add_note, api
+
+def attach(client, note_id, name, data):
+    response = api(client, "post", f"/add_attachment/{note_id}", query_string={"name": name}, data=data,
+                   content_type="text/plain")
+    assert response.status_code == 200, response.get_json()
+    return hashlib.sha256(data).hexdigest()
+
+def test_snapshot_restores_attachments(client, data_dir, tmp_path):
+    note = add_note(client, "with files", "see attached")
+    shas = [attach(client, note["id"], f"{i}.txt", f"file {i}".encode()) for i in range(2)]
+    backups = str(tmp_path / "backups")
+    manifest = snapshot.create(backup_dir=backups, data_dir=str(data_dir))
+    assert sorted(manifest["attachments"]) == sorted(shas)
+    assert snapshot.ATTACHMENT_INDEX in manifest["files"]
+
+    target = str(tmp_path / "restored")
+    snapshot.restore(manifest["id"], target, backup_dir=backups)
+    for i, sha in enumerate(shas):
+        with open(snapshot.attachment_path(snapshot.layout(target)[1], sha), 'rb') as f:
+            assert f.read() == f"file {i}".encode()
+    assert os.path.exists(os.path.join(target, snapshot.ATTACHMENT_INDEX))
+
+def test_unchanged_attachments_are_not_copied_again(client, data_dir, tmp_path):
+    note = add_note(client, "with files", "see attached")
+    attach(client, note["id"], "a.txt", b"x" * 1000)
+    backups = str(tmp_path / "backups")
+    snapshot.create(backup_dir=backups, data_dir=str(data_dir))
+    again = snapshot.create(backup_dir=backups, data_dir=str(data_dir))
+    assert again["copied_bytes"] == 0 and len(again["attachments"]) == 1
+
+def test_live_snapshot_uses_the_configured_files(client, app, data_dir, tmp_path, monkeypatch):
+    # The data files live wherever the NOTEPAD_* settings put them, not next to the code
+    monkeypatch.setattr(snapshot, "NOTES_FILE", main.notes_store.path)
+    monkeypatch.setattr(snapshot, "USERS_FILE", str(data_dir / "users.json"))
+    monkeypatch.setattr(snapshot, "ATTACHMENT_DIR", app.extensions['attachments'].root)
+    note = add_note(client, "kept", "body " * 100)
+    sha = attach(client, note["id"], "a.txt", b"attached")
+    backups = str(tmp_path / "backups")
+    manifest = snapshot.create(backup_dir=backups)
+    assert set(manifest["files"]) == set(snapshot.SOURCES) and manifest["attachments"] == [sha]
+    assert manifest["blobs"] and all(b["source"] == "notes.json" for b in manifest["blobs"].values())
+
+    target = str(tmp_path / "restored")
+    snapshot.restore(manifest["id"], target, backup_dir=backups)
+    assert NoteStore(os.path.join(target, "notes.json")).load()[0].content == note["content"]
+    assert os.path.exists(snapshot.attachment_path(snapshot.layout(target)[1], sha))
@@ -0,0 +1,65 @@
+import socket
+
+import pytest
+
+import state
+import stats
+
+def test_next_version_never_goes_back(monkeypatch):
+    monkeypatch.setattr(state, "backend", state.MemoryBackend())
+    name = state.key("seq", "alice")
+    assert state.next_version(name) == 1
+    # After the backend was emptied, the floor taken from the notes keeps seqs growing
+    monkeypatch.setattr(state, "backend", state.MemoryBackend())
+    assert state.next_version(name, floor=7) == 8
+    assert state.next_version(name, floor=7) == 9
+
+class CountingClient:
+    # Just enough of Redis for RedisBackend, counting round trips
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    def _run(self, command, *args):
+        if command == 'SET':
+            if 'NX' in args and args[0] in self.data:
+                return None
+            self.data[args[0]] = str(args[1]).encode()
+            return b"OK"
+        if command == 'INCRBY':
+            self.data[args[0]] = str(int(self.data.get(args[0], 0)) + args[1]).encode()
+            return int(self.data[args[0]])
+        if command == 'MGET':
+            return [self.data.get(k) for k in args]
+        raise AssertionError(command)
+
+    def execute_command(self, *args):
+        self.round_trips += 1
+        return self._run(*args)
+
+    def execute_many(self, commands):
+        self.round_trips += 1
+        return [self._run(*args) for args in commands]
+
+def test_stats_read_and_window_counters_are_one_round_trip(monkeypatch):
+    client = CountingClient()
+    monkeypatch.setattr(state, "backend", state.RedisBackend(client))
+    assert state.hit(state.key("throttle", "alice"), 60) == 1
+    assert state.hit(state.key("throttle", "alice"), 60) == 2 and client.round_trips == 2
+    client.round_trips = 0
+    snapshot = stats.snapshot(365)
+    assert len(snapshot["daily"]) == 365 and client.round_trips == 1
+
+def test_resp_pipeline_keeps_the_connection_in_step():
+    client = state.RespClient()
+    ours, server = socket.socketpair()
+    server.sendall(b"+OK\r\n-ERR wrong type\r\n:7\r\n$2\r\nhi\r\n")
+    client._local.conn = (ours, ours.makefile('rb'))
+    with pytest.raises(state.StateError):
+        client.execute_many([('SET', 'a', 1), ('INCRBY', 'b', 1), ('INCRBY', 'c', 7)])
+    # The replies after the error were consumed with it
+    assert client.execute_command('GET', 'd') == b"hi"
+    sent = server.recv(4096)
+    assert sent.count(b"*") == 4
+    ours.close()
+    server.close()
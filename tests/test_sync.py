@@ -0,0 +1,60 @@
+import json
+
+import schema
+
+from conftest import add_note, api, write_json
+
+def changes(client, since=None, limit=None):
+    args = {k: v for k, v in (("since", since), ("limit", limit)) if v is not None}
+    response = api(client, "get", "/api/notes/changes", query_string=args)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_changes_pages_across_legacy_note(client, notes_store):
+    # Written before seqs existed: no seq on disk
+    write_json(notes_store.path, [{"id": 1, "username": "alice", "title": "old", "content": "legacy",
+                                   "timestamp": "2025-10-24 17:36:46", "status": "active"}])
+    notes_store.invalidate()
+    add_note(client, "one")
+    add_note(client, "two")
+    seen, since = [], None
+    while True:
+        page = changes(client, since, limit=1)
+        seen += [c["id"] for c in page["changes"]]
+        assert all("seq" in c for c in page["changes"])
+        since = page["next"]
+        if not page["has_more"]:
+            break
+    assert sorted(seen) == [1, 2, 3]
+    assert changes(client, since)["changes"] == []
+
+def test_changes_report_deletions(client):
+    note = add_note(client, "gone")
+    api(client, "get", f"/delete_note/{note['id']}")
+    api(client, "get", f"/permanent_delete/{note['id']}")
+    latest = changes(client)["changes"]
+    assert latest[-1] == {"id": note["id"], "seq": latest[-1]["seq"], "deleted": True}
+
+def test_legacy_notes_get_their_own_seqs(client, notes_store):
+    legacy = [{"id": i, "username": "alice", "title": f"old {i}", "content": "legacy",
+               "timestamp": f"2025-10-24 17:3{i}:00", "status": "active"} for i in (1, 2, 3)]
+    write_json(notes_store.path, legacy + [{"id": 4, "username": "bob", "title": "b", "content": "",
+                                            "timestamp": "2025-10-24 17:30:00", "status": "active"}])
+    notes_store.invalidate()
+    seqs = {n.id: n.seq for n in notes_store.load()}
+    assert seqs == {1: 1, 2: 2, 3: 3, 4: 1}
+    seen, since = [], None
+    for _ in range(5):
+        page = changes(client, since, limit=1)
+        seen += [c["id"] for c in page["changes"]]
+        since = page["next"]
+    assert seen == [1, 2, 3]
+    # Written back at the current schema, so the numbering is stable
+    with open(notes_store.path, encoding="utf-8") as f:
+        assert [r.get("seq") for r in json.load(f)["records"]] == [1, 2, 3, 1]
+
+def test_legacy_seqs_go_above_existing_ones():
+    records = [{"id": 1, "username": "alice", "seq": 5, "updated_at": 10},
+               {"id": 2, "username": "alice", "updated_at": 30},
+               {"id": 3, "username": "alice", "seq": 0, "updated_at": 20}]
+    assert [r["seq"] for r in schema.upgrade("notes", 1, records)] == [5, 7, 6]
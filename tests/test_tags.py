@@ -0,0 +1,14 @@
+from conftest import add_note, api
+
+def ids(response):
+    return [n["id"] for n in response.get_json()["notes"]]
+
+def test_tag_filters_and_counts(client):
+    a = add_note(client, "a", tags="work, urgent")
+    b = add_note(client, "b", tags="work")
+    add_note(client, "c", tags="home")
+    assert ids(api(client, "get", "/api/notes", query_string={"tag": ["work", "urgent"]})) == [a["id"]]
+    assert ids(api(client, "get", "/api/notes", query_string={"tags": "urgent,home", "mode": "or"})) == [a["id"], 3]
+    assert api(client, "get", "/api/tags").get_json()["tags"] == {"home": 1, "urgent": 1, "work": 2}
+    api(client, "post", f"/edit_note/{b['id']}", data={"title": "b", "content": "", "tags": ""})
+    assert api(client, "get", "/api/tags").get_json()["tags"] == {"home": 1, "urgent": 1, "work": 1}
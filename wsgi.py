@@ -0,0 +1,6 @@
+# wsgi.py
+# Entry point for WSGI servers, e.g. gunicorn wsgi:app. Importing app.py itself has no side
+# effects; the app, its background workers and the warmup only start here.
+from app import create_app
+
+app = create_app()